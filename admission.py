@@ -0,0 +1,221 @@
+"""
+Load-aware admission control for the RPAL grader
+Program runs pass through an AdmissionController, a semaphore whose limit a
+sampling thread moves between a floor and a ceiling. Each sample looks at
+the load average, available memory and the CPU and resident memory of the
+grader's descendant processes (the student programs and their builds):
+
+- under pressure (load above max_load_per_cpu per core, or available memory
+  below min_free_memory) the limit drops by a quarter at once;
+- when every slot is busy, the children leave CPU idle and there is room
+  for one more child of the current average size, it grows by one.
+
+Launches that fail for lack of resources (fork EAGAIN, ENOMEM, file-table
+exhaustion, a JVM that can't reserve memory or threads) are retried with
+backoff by the grader instead of being scored; see is_resource_failure.
+Child statistics come from /proc, so elsewhere only the load average is used.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("rpal_grader")
+
+_RESOURCE_FAILURE_RE = re.compile(
+    r'\[Errno (?:11|12|23|24)\]|Resource temporarily unavailable|fork: retry|'
+    r'unable to create (?:new )?native thread|Could not reserve enough space|'
+    r'insufficient memory for the Java Runtime Environment')
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def is_resource_failure(stderr: str, return_code: int, under_pressure: bool = False) -> bool:
+    """
+    Whether a failed run says more about the machine than about the program
+    A SIGKILL only counts while memory was short (the OOM killer, not a timeout)
+    """
+    if _RESOURCE_FAILURE_RE.search(stderr or ''):
+        return True
+    return under_pressure and return_code in (-9, 137)
+
+
+def available_memory() -> Optional[int]:
+    """MemAvailable in bytes, None if unknown"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def descendant_usage(root_pid: Optional[int] = None) -> Tuple[int, float, int]:
+    """(process count, CPU seconds so far, resident bytes) of every descendant of root_pid"""
+    root_pid = root_pid or os.getpid()
+    stats: Dict[int, Tuple[int, float, int]] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return 0, 0.0, 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                fields = f.read().rpartition(')')[2].split()
+        except OSError:
+            continue
+        # Fields after the command: state ppid ... utime(12) stime(13) ... rss(22)
+        stats[int(entry)] = (int(fields[1]), (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+                             int(fields[21]) * _PAGE_SIZE)
+
+    children: Dict[int, list] = {}
+    for pid, (ppid, _, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+    count, cpu, rss = 0, 0.0, 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        count += 1
+        cpu += stats[pid][1]
+        rss += stats[pid][2]
+        stack.extend(children.get(pid, []))
+    return count, cpu, rss
+
+
+class AdmissionController:
+    def __init__(self, initial: int, max_limit: int, min_limit: int = 1, interval: float = 1.0,
+                 min_free_memory: int = 512 << 20, max_load_per_cpu: float = 1.25):
+        """
+        Args:
+            initial: Concurrent runs admitted at start
+            max_limit: Ceiling for the limit
+            min_limit: Floor for the limit
+            interval: Seconds between samples
+            min_free_memory: Available memory (bytes) below which concurrency is cut
+            max_load_per_cpu: 1-minute load average per core above which concurrency is cut
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.interval = interval
+        self.min_free_memory = min_free_memory
+        self.max_load_per_cpu = max_load_per_cpu
+        self.cpus = os.cpu_count() or 1
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.resource_failures = 0
+        self.last_pressure = 0.0
+        self._saturated = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_cpu: Optional[Tuple[float, float]] = None
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one run slot for the duration of the block"""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._saturated = True
+                self._cond.wait()
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def set_limit(self, limit: int, reason: str = ''):
+        with self._cond:
+            limit = min(max(limit, self.min_limit), self.max_limit)
+            if limit == self.limit:
+                return
+            logger.info("Concurrency %d -> %d%s", self.limit, limit, f" ({reason})" if reason else '')
+            self.limit = limit
+            self.peak_limit = max(self.peak_limit, limit)
+            self._cond.notify_all()
+
+    def under_pressure(self, window: float = 10.0) -> bool:
+        """Whether resources were short within the last `window` seconds"""
+        return time.time() - self.last_pressure < window
+
+    def resource_failure(self):
+        """A launch failed for lack of resources: halve concurrency right away"""
+        self.resource_failures += 1
+        self.last_pressure = time.time()
+        self.set_limit(self.limit // 2, "resource failure")
+
+    def sample(self) -> Dict:
+        """Current load, available memory and descendant CPU (cores in use) and RSS"""
+        try:
+            load = os.getloadavg()[0]
+        except (OSError, AttributeError):
+            load = None
+        count, cpu_seconds, rss = descendant_usage()
+        now = time.monotonic()
+        cores = None
+        if self._last_cpu is not None and now > self._last_cpu[0]:
+            # Exited children drop out of the sum, so clamp at zero
+            cores = max(0.0, (cpu_seconds - self._last_cpu[1]) / (now - self._last_cpu[0]))
+        self._last_cpu = (now, cpu_seconds)
+        return {'load': load, 'free_memory': available_memory(), 'children': count,
+                'child_cores': cores, 'child_rss': rss}
+
+    def adjust(self, sample: Dict):
+        """Apply one sample to the limit"""
+        load, free = sample['load'], sample['free_memory']
+        if free is not None and free < self.min_free_memory:
+            self.last_pressure = time.time()
+            self.set_limit(self.limit - max(1, self.limit // 4), f"{free >> 20} MB free")
+            return
+        if load is not None and load > self.cpus * self.max_load_per_cpu:
+            self.last_pressure = time.time()
+            self.set_limit(self.limit - max(1, self.limit // 4), f"load {load:.1f}")
+            return
+
+        with self._cond:
+            saturated, self._saturated = self._saturated, self.in_flight >= self.limit
+        if not saturated:
+            return
+        cores = sample['child_cores']
+        if cores is not None and cores >= self.cpus * 0.9:
+            return
+        if free is not None and sample['children']:
+            # Room for one more child of the current average size
+            if free - sample['child_rss'] / sample['children'] < self.min_free_memory:
+                return
+        self.set_limit(self.limit + 1, "headroom")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.adjust(self.sample())
+                except Exception:
+                    logger.exception("Admission sampling failed")
+
+        self._thread = threading.Thread(target=run, name='admission', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Multi-workspace batch grading for the RPAL grader
+Grades several workspaces (sections, or assignment variants with their own
+manifests) in one process. The submissions of every workspace are
+interleaved onto one worker pool, and every program launch passes through
+one shared AdmissionController, so the concurrency limit (fixed, or
+adaptive with --adaptive) holds for the whole batch. A worker takes a whole
+submission (staging and builds are per submission), so the pool is balanced
+per submission while launches are balanced per run. They also share the
+compiled-object cache, spilled output blobs, the toolchain probe, the
+entry-point cache and the storage index, all kept under --shared-dir.
+Each workspace keeps its own results store, CSV report and (with --archive)
+run archive.
+
+Workspaces are given as paths, or in a JSON config:
+
+    {"workspaces": [
+        {"path": "sec1"},
+        {"path": "sec1", "name": "b", "manifest": "variant_b.json", "tests": ["t9", "towers"],
+         "label": "fall-b", "results_db": "sec1/variant_b.sqlite3"}
+    ]}
+
+Grading options (--canary, --no-stage, --opt-level, ...) apply to every
+workspace. Paths in a config are relative to the config file. When one workspace appears
+more than once, each entry's report is named grading_results_strict_<name>.csv.
+
+    python3 batch_grading.py sec1 sec2 sec3 --workers 8 --shared-dir batch_cache
+    python3 batch_grading.py --config batch.json --adaptive
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from admission import AdmissionController
+from entry_points import EntryPointCache
+from grading_records import BlobStore
+from program_builder import ProgramBuilder
+from rpal_grader import RPALGrader, ThreadLocalStdout, setup_logging
+from storage_manager import StorageManager, format_size, parse_size
+from suite_manifest import ManifestError
+from toolchain import Toolchains
+
+
+class BatchEntry:
+    """One workspace (or assignment variant) of a batch with its grader and report name"""
+    __slots__ = ('name', 'grader', 'report', 'submissions', 'graded')
+
+    def __init__(self, name: str, grader: RPALGrader, report: str):
+        self.name = name
+        self.grader = grader
+        self.report = report
+        self.submissions: List[Path] = []
+        self.graded = 0
+
+
+def load_config(config_path: Path) -> List[Dict]:
+    """Workspace entries of a batch config, with paths made absolute against its folder"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    base = config_path.parent
+    entries = []
+    for entry in data.get('workspaces', []):
+        if 'path' not in entry:
+            raise ManifestError(f"{config_path}: every workspace needs a 'path'")
+        entry = dict(entry)
+        for key in ('path', 'manifest', 'results_db'):
+            if entry.get(key):
+                entry[key] = str((base / entry[key]).resolve())
+        entries.append(entry)
+    if not entries:
+        raise ManifestError(f"{config_path} lists no workspaces")
+    return entries
+
+
+class BatchGrader:
+    def __init__(self, entries: List[Dict], shared_dir: Path, workers: int = 4, adaptive: bool = False,
+                 max_workers: Optional[int] = None, archive: bool = False, label: str = '',
+                 storage_budget: Optional[int] = None, build_cache: bool = True, build_jobs: Optional[int] = None,
+                 opt_level: Optional[str] = None, spill_threshold: int = 64 * 1024,
+                 grader_options: Optional[Dict] = None):
+        """
+        Args:
+            entries: Workspace specs: path, and optionally name, manifest, tests, label, results_db
+            shared_dir: Folder for the shared build cache, output blobs, toolchain and entry-point caches
+            workers: Concurrent program runs across the batch (the starting point with adaptive)
+            adaptive: Adjust the shared concurrency from load, memory and child usage (see admission)
+            max_workers: Ceiling for adaptive concurrency (default: twice the CPU count)
+            archive: Archive every workspace's run (see run_archive)
+            label: Run label for entries without their own
+            storage_budget: Bytes the shared caches may use; LRU entries are evicted after the batch
+            build_cache: Share compiled objects across the batch via <shared_dir>/build_cache
+            build_jobs: Translation units compiled in parallel per build (default: CPU count)
+            opt_level: gcc/g++ optimization level, None for the compiler default
+            spill_threshold: Retained outputs above this many bytes are spilled to the shared blobs
+            grader_options: Further RPALGrader keyword arguments for every workspace (stage, canary, ...)
+        """
+        self.shared_dir = Path(shared_dir)
+        self.shared_dir.mkdir(parents=True, exist_ok=True)
+        self.storage_budget = storage_budget
+        workers = max(1, workers)
+        self.adaptive = adaptive
+
+        # One of each, handed to every workspace's grader
+        self.storage = StorageManager(self.shared_dir)
+        self.builder = ProgramBuilder(self.shared_dir / "build_cache" if build_cache else None, build_jobs,
+                                      opt_level, self.storage)
+        self.blobs = BlobStore(self.shared_dir / "output_blobs", spill_threshold, self.storage)
+        self.toolchains = Toolchains(self.shared_dir / "toolchains.json")
+        self.entry_points = EntryPointCache(self.shared_dir / "entry_points.json")
+        ceiling = (max_workers or 2 * (os.cpu_count() or 1)) if adaptive else workers
+        self.admission = AdmissionController(workers, ceiling)
+        shared = {'storage': self.storage, 'builder': self.builder, 'blobs': self.blobs,
+                  'toolchains': self.toolchains, 'entry_points': self.entry_points, 'admission': self.admission}
+
+        paths = [str(Path(entry['path']).resolve()) for entry in entries]
+        self.entries: List[BatchEntry] = []
+        for entry, path in zip(entries, paths):
+            name = entry.get('name') or Path(path).name
+            report = f"grading_results_strict_{name}.csv" if paths.count(path) > 1 else "grading_results_strict.csv"
+            grader = RPALGrader(entry['path'], results_db=entry.get('results_db'),
+                                run_label=entry.get('label', label), manifest_path=entry.get('manifest'),
+                                tests=entry.get('tests'), workers=workers, archive=archive,
+                                **dict(grader_options or {}, **shared))
+            self.entries.append(BatchEntry(name, grader, report))
+
+    def prepare(self) -> List[BatchEntry]:
+        """Check every workspace and open its run; returns the entries that can be graded"""
+        ready = []
+        for entry in self.entries:
+            grader = entry.grader
+            if not grader.submissions_path.exists():
+                print(f"[{entry.name}] Skipped: {grader.submissions_path} not found")
+                continue
+            try:
+                missing_files = grader.suite.missing_files()
+                if grader.canary is not None:
+                    grader.canary_case()
+            except ManifestError as e:
+                print(f"[{entry.name}] Skipped: {e}")
+                continue
+            if missing_files:
+                print(f"[{entry.name}] Warning: missing test case files: {missing_files}")
+            entry.submissions = sorted(f for f in grader.submissions_path.iterdir() if f.is_dir())
+            grader.open_store()
+            if grader.canary is not None and entry.submissions:
+                canary_results = grader.run_canary(entry.submissions)
+                entry.submissions.sort(key=lambda f: canary_results[f.name].error_class != 'pass')
+            if grader.archive_runs:
+                grader.open_archive()
+            print(f"[{entry.name}] {len(entry.submissions)} submissions, {len(grader.suite)} tests "
+                  f"(run {grader.run_id})")
+            ready.append(entry)
+        return ready
+
+    def jobs(self, entries: List[BatchEntry]) -> List[Tuple[BatchEntry, Path]]:
+        """(entry, submission) pairs interleaved across workspaces, so all of them progress together"""
+        rounds = itertools.zip_longest(*[[(entry, folder) for folder in entry.submissions] for entry in entries])
+        return [job for round_ in rounds for job in round_ if job is not None]
+
+    def grade(self, entries: List[BatchEntry]):
+        """Grade every queued submission on the shared pool, streaming results into each workspace's store"""
+        jobs = self.jobs(entries)
+        previous_stdout = sys.stdout
+        stdout = previous_stdout if isinstance(previous_stdout, ThreadLocalStdout) else ThreadLocalStdout(previous_stdout)
+        sys.stdout = stdout
+
+        def run(position: int, entry: BatchEntry, folder: Path):
+            with stdout.capture():
+                print(f"\n[{position}/{len(jobs)}] [{entry.name}] ", end="")
+                return entry, entry.grader.grade_and_record(folder)
+
+        if self.adaptive:
+            self.admission.start()
+        try:
+            # Runs are gated by the admission controller, so the pool only needs a thread per slot
+            with ThreadPoolExecutor(max_workers=self.admission.max_limit) as pool:
+                futures = [pool.submit(run, i, entry, folder) for i, (entry, folder) in enumerate(jobs, 1)]
+                for future in as_completed(futures):
+                    entry, result = future.result()
+                    entry.graded += 1
+                    result.drop_outputs()
+        finally:
+            sys.stdout = previous_stdout
+            if self.adaptive:
+                self.admission.stop()
+                print(f"\nAdaptive concurrency: peak {self.admission.peak_limit}, final {self.admission.limit}, "
+                      f"{self.admission.resource_failures} resource failure(s)")
+
+    def finish(self, entries: List[BatchEntry]):
+        """Close each workspace's run and write its own report"""
+        for entry in entries:
+            grader = entry.grader
+            grader.store.finish_run(grader.run_id)
+            grader.events.emit('on_batch_done', entry.graded, grader.run_id)
+            if grader.archive:
+                grader.close_archive()
+            grader.generate_csv_report(grader.store.iter_results(grader.run_id), entry.report)
+
+    def run(self):
+        print(f"Batch grading {len(self.entries)} workspace(s); shared caches in {self.shared_dir}")
+        self.entries[0].grader.preflight()
+        print("=" * 80)
+        entries = self.prepare()
+        if not entries:
+            return
+        try:
+            self.grade(entries)
+        except BaseException:
+            for entry in entries:
+                if entry.grader.archive:
+                    entry.grader.archive.abort()
+            raise
+        print("\n" + "=" * 80)
+        self.finish(entries)
+        if self.storage_budget is not None:
+            count, freed = self.storage.evict(self.storage_budget)
+            if count:
+                print(f"Storage budget {format_size(self.storage_budget)}: evicted {count} least recently used "
+                      f"artifacts ({format_size(freed)})")
+
+        print("\n" + "=" * 80)
+        print("BATCH SUMMARY")
+        print("=" * 80)
+        for entry in entries:
+            results = list(entry.grader.store.iter_results(entry.grader.run_id, with_tests=False))
+            mean = sum(r.algorithm_score for r in results) / len(results) if results else 0.0
+            # Each workspace's own suite total (algorithm scores are capped at 70)
+            out_of = min(70.0, entry.grader.suite.total_points)
+            print(f"  {entry.name}: {len(results)} submissions, average {mean:.1f}/{out_of:g} -> "
+                  f"{entry.grader.workspace_path / entry.report}")
+
+    def close(self):
+        self.entry_points.flush()
+        for entry in self.entries:
+            entry.grader.events.close()
+        self.storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade several RPAL workspaces on one shared pool and cache")
+    parser.add_argument('workspaces', nargs='*', help="Workspace folders (each with submissions/ and test_cases/)")
+    parser.add_argument('--config', help="JSON batch config listing workspaces and per-workspace options")
+    parser.add_argument('--shared-dir', default='batch_cache',
+                        help="Folder for the shared caches (default: ./batch_cache)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Program runs admitted at once across the batch, the starting limit with --adaptive "
+                             "(default: CPU count)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Adjust concurrency on the fly from system load, free memory and the programs' CPU/RSS")
+    parser.add_argument('--max-workers', type=int, help="With --adaptive: concurrency ceiling (default: twice the CPU count)")
+    parser.add_argument('--archive', action='store_true', help="Archive every workspace's run (see run_archive.py)")
+    parser.add_argument('--run-label', default='', help="Label for runs whose config entry has none")
+    parser.add_argument('--storage-budget', type=parse_size, metavar='SIZE',
+                        help="Disk budget for the shared caches, e.g. 2G")
+    parser.add_argument('--batch-protocol', action='store_true',
+                        help="Run all inputs through one process per mode for submissions that support it")
+    parser.add_argument('--canary', nargs='?', const='', metavar='TEST',
+                        help="Pre-screen each workspace with one test (default: its first) in run mode, "
+                             "then grade canary passes first")
+    parser.add_argument('--canary-timeout', type=float, default=5, help="Canary run timeout in seconds (default: 5)")
+    parser.add_argument('--no-stage', action='store_true',
+                        help="Run submissions in place instead of from a private staged copy")
+    parser.add_argument('--stage-dir', help="Where staged submission copies are created "
+                                            "(default: /dev/shm if writable, else the temp folder)")
+    parser.add_argument('--build-jobs', type=int, help="C/C++ units compiled in parallel per build (default: CPU count)")
+    parser.add_argument('--opt-level', default='none', choices=['0', '1', '2', '3', 's', 'fast', 'none'],
+                        help="gcc/g++ optimization level for compiled submissions (default: none)")
+    parser.add_argument('--compile-timeout', type=float, default=30,
+                        help="Seconds a Java/C/C++ build may take (default: 30)")
+    parser.add_argument('--java-cds', action='store_true',
+                        help="Speed up Java start-up with an AppCDS archive per build (JDK 13+)")
+    parser.add_argument('--no-build-cache', action='store_true',
+                        help="Don't share compiled objects across submissions")
+    parser.add_argument('--resource-retries', type=int, default=4,
+                        help="Retries for runs that fail for lack of resources (default: 4)")
+    parser.add_argument('--probe-candidates', type=int, default=3,
+                        help="Likely entry points probed with the canary input (default: 3; 0 = static ranking only)")
+    parser.add_argument('--keep-outputs', action='store_true',
+                        help="Retain raw stdout/stderr of every run (also recorded in the stores for --rescore)")
+    parser.add_argument('--spill-threshold', type=int, default=64 * 1024,
+                        help="Retained outputs larger than this many bytes are spilled to disk (default: 65536)")
+    parser.add_argument('--log-output-limit', type=int, default=200,
+                        help="Max characters of program output echoed into logs, 0 for no cap (default: 200)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Echo debug details to the console")
+    args = parser.parse_args()
+
+    try:
+        entries = load_config(Path(args.config)) if args.config else []
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    entries += [{'path': str(Path(path).resolve())} for path in args.workspaces]
+    if not entries:
+        parser.error("give workspace folders or --config")
+
+    setup_logging(args.verbose)
+    grader_options = {'batch_protocol': args.batch_protocol, 'canary': args.canary,
+                      'canary_timeout': args.canary_timeout, 'stage': not args.no_stage, 'stage_root': args.stage_dir,
+                      'compile_timeout': args.compile_timeout, 'java_cds': args.java_cds,
+                      'resource_retries': args.resource_retries, 'probe_candidates': args.probe_candidates,
+                      'keep_outputs': args.keep_outputs, 'log_output_limit': args.log_output_limit}
+    batch = BatchGrader(entries, Path(args.shared_dir), args.workers, args.adaptive, args.max_workers,
+                        args.archive, args.run_label, args.storage_budget, not args.no_build_cache, args.build_jobs,
+                        None if args.opt_level == 'none' else args.opt_level, args.spill_threshold, grader_options)
+    try:
+        batch.run()
+    finally:
+        batch.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,47 @@
+import argparse
 import os
+from pathlib import Path
+
+from storage_manager import KINDS, StorageManager, format_size, path_size
+
+
+def delete_archives(workspace, kinds=('archive',), reindex=False):
+    """
+    Delete the workspace's submission .zip/.pdf files and any other artifact kinds
+    Submission files are found by walking submissions/ every time (archives extracted by
+    hand are never indexed); other kinds come from the storage index
+    """
+    manager = StorageManager(Path(workspace))
+    try:
+        if reindex or not manager.index_path.exists():
+            print(f"🔎 Indexed {manager.reindex()} existing artifacts")
+        deleted_files, freed = 0, 0
+        indexed_kinds = [kind for kind in kinds if kind != 'archive']
+        if indexed_kinds:
+            deleted_files, freed = manager.clean(indexed_kinds)
+        if 'archive' in kinds:
+            rows = []
+            for root, _, files in os.walk(Path(workspace) / "submissions"):
+                for name in files:
+                    if name.endswith((".zip", ".pdf")):
+                        path = Path(root, name).absolute()
+                        rows.append((str(path), path_size(path)))
+            count, size = manager.delete(rows)
+            deleted_files += count
+            freed += size
+            if count < len(rows):
+                print(f"⚠️ {len(rows) - count} file(s) could not be deleted")
+    finally:
+        manager.close()
+    print(f"\n✅ Done! Total artifacts deleted: {deleted_files} ({format_size(freed)})")
 
-def delete_zip_and_pdf_files(base_folder):
-    deleted_files = 0
-    for root, dirs, files in os.walk(base_folder):
-        for file in files:
-            if file.endswith(".zip") or file.endswith(".pdf"):
-                file_path = os.path.join(root, file)
-                try:
-                    os.remove(file_path)
-                    print(f"🗑️ Deleted: {file_path}")
-                    deleted_files += 1
-                except Exception as e:
-                    print(f"⚠️ Error deleting {file_path}: {e}")
-    print(f"\n✅ Done! Total files deleted: {deleted_files}")
 
 if __name__ == "__main__":
-    base_path = "/home/oshadi/SISR-Final_Year_Project/envs/grading_workspace/submissions"
-    delete_zip_and_pdf_files(base_path)
+    parser = argparse.ArgumentParser(description="Delete grading-workspace artifacts (default: submission archives)")
+    parser.add_argument('workspace', help="Path to grading_workspace")
+    parser.add_argument('--kinds', default='archive',
+                        help=f"Comma-separated kinds ({', '.join(KINDS)}); archive = every .zip/.pdf under submissions/")
+    parser.add_argument('--reindex', action='store_true',
+                        help="Index the workspace first, picking up build and output artifacts created before the index")
+    args = parser.parse_args()
+    delete_archives(args.workspace, args.kinds.split(','), args.reindex)
@@ -0,0 +1,168 @@
+"""
+Entry-point ranking for the RPAL grader
+When a submission has several source files of its language and no myrpal.py,
+the first file found is often a helper module. Candidates are scored
+statically instead: a __main__ guard, sys.argv or argparse use and a main()
+function for Python; a main method reading args for Java; main(argc, argv)
+for C/C++. Modules imported by other candidates, tests and package
+__init__ files are marked down.
+
+If more than one candidate shows entry-point signals, the grader probes the
+top ones in parallel with the canary input and keeps the best answer. Each
+decision is cached in <workspace>/entry_points.json under a hash of the
+candidates' paths and contents, so re-grades skip straight to the winner;
+new decisions are kept in memory and written once when the run ends (flush).
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Score at which a candidate looks like an entry point on its own
+ENTRY_SIGNAL = 10
+
+# (pattern, points, reason) per language, matched against the source text
+_SIGNALS = {
+    'python': (
+        (re.compile(r'''__name__\s*==\s*['"]__main__['"]'''), 10, "__main__ guard"),
+        (re.compile(r'\bsys\.argv\b'), 4, "reads sys.argv"),
+        (re.compile(r'\bargparse\b'), 3, "uses argparse"),
+        (re.compile(r'^def main\s*\(', re.MULTILINE), 2, "defines main()"),
+        (re.compile(r'\bopen\s*\('), 1, "opens files"),
+    ),
+    'java': (
+        (re.compile(r'\bpublic\s+static\s+(?:final\s+)?void\s+main\s*\('), 10, "main method"),
+        (re.compile(r'\bargs\s*\[|\bargs\.length\b'), 4, "reads args"),
+    ),
+    'native': (
+        (re.compile(r'\b(?:int|void)\s+main\s*\('), 10, "main function"),
+        (re.compile(r'\bargv\b'), 4, "reads argv"),
+    ),
+}
+
+_LANGUAGES = {'.py': 'python', '.java': 'java', '.c': 'native', '.cpp': 'native', '.cxx': 'native', '.cc': 'native'}
+
+_NON_ENTRY_RE = re.compile(r'^(?:test_.*|.*_test|tests?|setup|conftest|__init__)$', re.IGNORECASE)
+
+
+class EntryCandidate:
+    """One possible program file with its static score and the reasons for it"""
+    __slots__ = ('path', 'score', 'reasons')
+
+    def __init__(self, path: Path, score: int = 0, reasons: Optional[List[str]] = None):
+        self.path = path
+        self.score = score
+        self.reasons = reasons or []
+
+
+def _read(path: Path) -> str:
+    try:
+        return path.read_text(encoding='utf-8', errors='ignore')
+    except OSError:
+        return ''
+
+
+def rank_candidates(files: Sequence[Path]) -> List[EntryCandidate]:
+    """Candidates by static score, best first (ties keep discovery order)"""
+    sources = {path: _read(path) for path in files}
+    candidates = []
+    for path, text in sources.items():
+        candidate = EntryCandidate(path)
+        for pattern, points, reason in _SIGNALS.get(_LANGUAGES.get(path.suffix.lower(), ''), ()):
+            if pattern.search(text):
+                candidate.score += points
+                candidate.reasons.append(reason)
+        stem = path.stem
+        if 'main' in stem.lower() or 'rpal' in stem.lower():
+            candidate.score += 2
+            candidate.reasons.append("named like an entry point")
+        if _NON_ENTRY_RE.match(stem):
+            candidate.score -= 8
+            candidate.reasons.append("test/package file")
+        if path.suffix == '.py':
+            imported = re.compile(rf'^\s*(?:from|import)\s+(?:\S+\.)?{re.escape(stem)}\b', re.MULTILINE)
+            if any(imported.search(other) for other_path, other in sources.items() if other_path != path):
+                candidate.score -= 6
+                candidate.reasons.append("imported by another file")
+        candidates.append(candidate)
+    return sorted(candidates, key=lambda c: -c.score)
+
+
+def submission_key(folder: Path, files: Sequence[Path]) -> str:
+    """Hash of the candidates' paths (relative to folder) and contents; the same for every staged copy"""
+    digest = hashlib.sha256()
+    for path in sorted(files, key=lambda p: os.path.relpath(p, folder)):
+        digest.update(os.path.relpath(path, folder).encode('utf-8') + b'\0')
+        try:
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def probe_candidates(candidates: Sequence[EntryCandidate],
+                     probe: Callable[[Path], Optional[float]]) -> Optional[EntryCandidate]:
+    """
+    Run probe (path -> similarity to the expected output, None on failure) on every
+    candidate in parallel, under the caller's context variables, and return the best-answering one (static score breaks ties),
+    or None if all of them fail
+    """
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        # Each probe runs in a copy of the caller's context (staged workspace, submission tag)
+        futures = [pool.submit(contextvars.copy_context().run, probe, c.path) for c in candidates]
+        results = [future.result() for future in futures]
+    answered = [(similarity, candidate) for similarity, candidate in zip(results, candidates) if similarity is not None]
+    if not answered:
+        return None
+    return max(answered, key=lambda pair: (pair[0], pair[1].score))[1]
+
+
+class EntryPointCache:
+    def __init__(self, path: Optional[Path]):
+        """
+        Args:
+            path: JSON file mapping submission keys to the chosen entry point (None = don't cache)
+        """
+        self.path = Path(path) if path else None
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._dirty = False
+        self.lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and self.path.exists():
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError):
+                    pass
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        """{'entry': path relative to the submission, 'method': 'static'|'probe', 'candidates': n} or None"""
+        with self.lock:
+            return self._load().get(key)
+
+    def put(self, key: str, entry: str, method: str, candidates: int):
+        with self.lock:
+            entries = self._load()
+            entries[key] = {'entry': entry, 'method': method, 'candidates': candidates}
+            self._dirty = True
+
+    def flush(self):
+        """Write the decisions made since the last flush, if any"""
+        with self.lock:
+            if not self._dirty or not self.path:
+                return
+            tmp_path = self.path.with_suffix(f'.tmp{os.getpid()}')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
@@ -1,7 +1,8 @@
 import os
 import zipfile
 
-def extract_nested_zipfiles(base_folder):
+def extract_nested_zipfiles(base_folder, storage=None):
+    """Extract every .zip under base_folder in place; storage (a StorageManager) records them as archives"""
     for root, dirs, files in os.walk(base_folder):
         for file in files:
             if file.endswith(".zip"):
@@ -11,6 +12,8 @@ def extract_nested_zipfiles(base_folder):
                     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                         zip_ref.extractall(extract_to)
                     print(f"✅ Extracted '{zip_path}' to '{extract_to}'")
+                    if storage is not None:
+                        storage.track(zip_path, 'archive')
                 except zipfile.BadZipFile:
                     print(f"❌ Failed to extract '{zip_path}': Bad ZIP file")
 
@@ -0,0 +1,309 @@
+"""
+Per-student feedback reports for the RPAL grader
+Renders one HTML and/or Markdown report per graded submission from a
+recorded run: the score, notes, and per test and mode the error class,
+timing and a side-by-side diff of the normalized expected and actual output
+(diffs need a run graded with --keep-outputs).
+
+Reports are rendered in a process pool from jobs streamed out of the results
+store, with only a bounded number in flight, so large cohorts never hold
+every diff in memory. Each report's content hash (its recorded results and
+outputs, the expected outputs, normalization rules and formats) is kept in
+<output dir>/.index.json, and submissions whose hash is unchanged are skipped.
+"""
+
+import difflib
+import hashlib
+import html
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from grading_records import MODES, SubmissionResult
+from output_normalizer import OutputNormalizer
+
+logger = logging.getLogger("rpal_grader")
+
+FORMATS = ('html', 'md')
+
+# Bump when the report layout changes so every report is re-rendered
+RENDERER_VERSION = 1
+
+_HTML_STYLE = """body { font-family: sans-serif; margin: 2em; }
+table.summary td, table.summary th { border: 1px solid #ccc; padding: 2px 8px; }
+table.summary { border-collapse: collapse; }
+table.diff { font-family: monospace; border-collapse: collapse; margin-bottom: 1em; }
+table.diff td { padding: 0 4px; white-space: pre-wrap; vertical-align: top; }
+.diff_header { background: #eee; color: #888; }
+.diff_next { background: #eee; }
+.diff_add { background: #afa; }
+.diff_chg { background: #ff8; }
+.diff_sub { background: #faa; }
+.pass { color: #070; } .fail { color: #a00; }"""
+
+
+def build_job(result: SubmissionResult, outputs: Dict[Tuple[str, str], Tuple[Optional[int], str, str]],
+              test_names: Sequence[str]) -> Dict:
+    """
+    Plain (picklable, hashable as JSON) description of one report
+
+    Args:
+        result: The submission's recorded result, with tests
+        outputs: Recorded (return code, stdout, stderr) keyed by (test, mode); empty if none were kept
+        test_names: Tests in suite order
+    """
+    runs = []
+    for test in test_names:
+        test_result = result.tests.get(test)
+        if test_result is None:
+            continue
+        for mode in sorted(test_result.modes, key=lambda m: MODES.index(m) if m in MODES else len(MODES)):
+            mode_result = test_result.modes[mode]
+            recorded = outputs.get((test, mode))
+            if recorded is None and mode == 'st':
+                # ST graded as a copy of the AST run
+                recorded = outputs.get((test, 'ast'))
+            runs.append({
+                'test': test, 'mode': mode, 'score': mode_result.score, 'similarity': mode_result.similarity,
+                'error_class': mode_result.error_class, 'error': mode_result.error,
+                'duration': mode_result.duration,
+                'stdout': recorded[1] if recorded else None, 'stderr': recorded[2] if recorded else None,
+            })
+    return {
+        'submission': result.submission, 'algorithm_score': result.algorithm_score,
+        'max_algorithm_score': result.max_algorithm_score, 'notes': result.notes,
+        'execution_method': result.execution_method, 'program_file': result.program_file_location,
+        'runs': runs,
+    }
+
+
+def side_by_side(left: List[str], right: List[str], width: int = 48, context: int = 2) -> List[str]:
+    """Plain-text two-column diff; '!' changed, '-' only expected, '+' only actual"""
+    def clip(line: str) -> str:
+        return line if len(line) <= width else line[:width - 1] + '~'
+
+    rows = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, left, right, autojunk=False).get_opcodes():
+        if tag == 'equal' and i2 - i1 > 2 * context + 1:
+            rows.extend(f"  {clip(left[i]):<{width}} | {clip(left[i])}" for i in range(i1, i1 + context))
+            rows.append(f"  ... {i2 - i1 - 2 * context} unchanged lines ...")
+            rows.extend(f"  {clip(left[i]):<{width}} | {clip(left[i])}" for i in range(i2 - context, i2))
+            continue
+        marker = {'equal': ' ', 'replace': '!', 'delete': '-', 'insert': '+'}[tag]
+        for k in range(max(i2 - i1, j2 - j1)):
+            expected = left[i1 + k] if i1 + k < i2 else ''
+            actual = right[j1 + k] if j1 + k < j2 else ''
+            rows.append(f"{marker} {clip(expected):<{width}} | {clip(actual)}".rstrip())
+    return rows
+
+
+class _Worker:
+    """Per-process rendering state, set up once by the pool initializer"""
+    normalizer: OutputNormalizer
+    expected: Dict[Tuple[str, str], str]
+    expected_lines: Dict[Tuple[str, str], List[str]]
+    output_dir: Path
+    formats: Tuple[str, ...]
+    max_diff_lines: int
+
+
+def _init_worker(output_dir: str, expected: Dict[Tuple[str, str], str], normalization: Dict,
+                 formats: Tuple[str, ...], max_diff_lines: int):
+    _Worker.normalizer = OutputNormalizer.from_config(normalization)
+    _Worker.expected = expected
+    _Worker.output_dir = Path(output_dir)
+    _Worker.formats = formats
+    _Worker.max_diff_lines = max_diff_lines
+    _Worker.expected_lines = {}
+
+
+def _normalized_lines(text: str, is_ast: bool) -> List[str]:
+    lines = _Worker.normalizer.normalize(text, is_ast=is_ast).text.split('\n')
+    if len(lines) > _Worker.max_diff_lines:
+        lines = lines[:_Worker.max_diff_lines] + [f"... {len(lines) - _Worker.max_diff_lines} more lines"]
+    return lines
+
+
+def _diff_inputs(run: Dict) -> Optional[Tuple[List[str], List[str]]]:
+    """Normalized (expected, actual) lines of a failed run, None if there's nothing to diff"""
+    key = (run['test'], run['mode'])
+    if run['error_class'] == 'pass' or run['stdout'] is None or key not in _Worker.expected:
+        return None
+    is_ast = run['mode'] != 'run'
+    expected = _Worker.expected_lines.get(key)
+    if expected is None:
+        expected = _Worker.expected_lines[key] = _normalized_lines(_Worker.expected[key], is_ast)
+    return expected, _normalized_lines(run['stdout'], is_ast)
+
+
+def _duration(run: Dict) -> str:
+    return f"{run['duration']:.2f}s" if run['duration'] is not None else '-'
+
+
+def render_markdown(job: Dict) -> str:
+    out = [f"# Feedback: {job['submission']}", '',
+           f"**Algorithm score:** {job['algorithm_score']:.2f} / {job['max_algorithm_score']}  ",
+           f"**Execution:** {job['execution_method']}" +
+           (f" (`{job['program_file']}`)" if job['program_file'] else ''), '']
+    if job['notes']:
+        out += ['## Notes', ''] + [f"- {note}" for note in job['notes']] + ['']
+    out += ['## Results', '', '| Test | Mode | Score | Status | Time | Detail |', '|---|---|---|---|---|---|']
+    for run in job['runs']:
+        detail = run['error'].replace('|', '\\|') if run['error'] else ''
+        out.append(f"| {run['test']} | {run['mode']} | {run['score']:.2f} | {run['error_class']} | "
+                   f"{_duration(run)} | {detail} |")
+    out.append('')
+    for run in job['runs']:
+        if run['error_class'] == 'pass':
+            continue
+        out += [f"### {run['test']} / {run['mode']}: {run['error_class']}", '']
+        diff = _diff_inputs(run)
+        if diff is not None:
+            out += ['Normalized expected (left) vs your output (right):', '', '```']
+            out += side_by_side(*diff) + ['```', '']
+        elif run['stdout'] is None:
+            out += ['_Output was not recorded for this run._', '']
+        if run['stderr']:
+            out += ['stderr:', '', '```'] + run['stderr'].strip().split('\n')[-20:] + ['```', '']
+    return '\n'.join(out) + '\n'
+
+
+def render_html(job: Dict) -> str:
+    name = html.escape(job['submission'])
+    out = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Feedback: {name}</title>",
+           f"<style>{_HTML_STYLE}</style></head><body>", f"<h1>Feedback: {name}</h1>",
+           f"<p><b>Algorithm score:</b> {job['algorithm_score']:.2f} / {job['max_algorithm_score']}<br>",
+           f"<b>Execution:</b> {html.escape(job['execution_method'])}"
+           f"{' (<code>' + html.escape(job['program_file']) + '</code>)' if job['program_file'] else ''}</p>"]
+    if job['notes']:
+        out.append('<h2>Notes</h2><ul>' + ''.join(f"<li>{html.escape(n)}</li>" for n in job['notes']) + '</ul>')
+    out.append("<h2>Results</h2><table class='summary'><tr><th>Test</th><th>Mode</th><th>Score</th>"
+               "<th>Status</th><th>Time</th><th>Detail</th></tr>")
+    for run in job['runs']:
+        status = 'pass' if run['error_class'] == 'pass' else 'fail'
+        out.append(f"<tr><td>{html.escape(run['test'])}</td><td>{run['mode']}</td><td>{run['score']:.2f}</td>"
+                   f"<td class='{status}'>{html.escape(run['error_class'])}</td><td>{_duration(run)}</td>"
+                   f"<td>{html.escape(run['error'] or '')}</td></tr>")
+    out.append('</table>')
+    differ = difflib.HtmlDiff(wrapcolumn=80)
+    for run in job['runs']:
+        if run['error_class'] == 'pass':
+            continue
+        out.append(f"<h3>{html.escape(run['test'])} / {run['mode']}: {html.escape(run['error_class'])}</h3>")
+        diff = _diff_inputs(run)
+        if diff is not None:
+            out.append(differ.make_table(diff[0], diff[1], 'Expected (normalized)', 'Your output (normalized)',
+                                         context=True, numlines=2))
+        elif run['stdout'] is None:
+            out.append('<p><i>Output was not recorded for this run.</i></p>')
+        if run['stderr']:
+            out.append('<p>stderr:</p><pre>' + html.escape('\n'.join(run['stderr'].strip().split('\n')[-20:])) +
+                       '</pre>')
+    out.append('</body></html>')
+    return '\n'.join(out) + '\n'
+
+
+def _render(job: Dict) -> str:
+    """Write one submission's reports (runs in a pool worker)"""
+    renderers = {'html': render_html, 'md': render_markdown}
+    for fmt in _Worker.formats:
+        path = _Worker.output_dir / f"{job['submission']}.{fmt}"
+        tmp_path = path.with_suffix(f'.tmp{os.getpid()}')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(renderers[fmt](job))
+        os.replace(tmp_path, path)
+    return job['submission']
+
+
+class FeedbackRenderer:
+    def __init__(self, output_dir: Path, expected: Dict[Tuple[str, str], str], normalization: Optional[Dict] = None,
+                 formats: Sequence[str] = FORMATS, workers: Optional[int] = None, max_diff_lines: int = 400):
+        """
+        Args:
+            output_dir: Folder for <submission>.html/.md and the hash index
+            expected: Expected output text keyed by (test, mode)
+            normalization: Normalization rule overrides (a manifest's "normalization" section)
+            formats: Any of 'html', 'md'
+            workers: Rendering processes (default: CPU count; 1 renders in-process)
+            max_diff_lines: Normalized lines per side kept for a diff
+        """
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown feedback formats: {sorted(unknown)} (available: {', '.join(FORMATS)})")
+        self.output_dir = Path(output_dir)
+        self.formats = tuple(formats)
+        self.workers = workers or os.cpu_count() or 1
+        self.index_path = self.output_dir / ".index.json"
+        self._initargs = (str(self.output_dir), dict(expected), normalization or {}, self.formats, max_diff_lines)
+        context = json.dumps([RENDERER_VERSION, self.formats, normalization or {}, max_diff_lines,
+                              sorted((f"{test}/{mode}", text) for (test, mode), text in expected.items())])
+        self._context_digest = hashlib.sha256(context.encode('utf-8')).hexdigest()
+
+    def digest(self, job: Dict) -> str:
+        data = self._context_digest + json.dumps(job, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _load_index(self) -> Dict[str, str]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _is_current(self, index: Dict[str, str], submission: str, digest: str) -> bool:
+        return index.get(submission) == digest and \
+            all((self.output_dir / f"{submission}.{fmt}").exists() for fmt in self.formats)
+
+    def render_all(self, jobs: Iterable[Dict]) -> Tuple[int, int]:
+        """Render every job whose report changed; returns (rendered, skipped)"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        index = self._load_index()
+        rendered = skipped = 0
+
+        if self.workers <= 1:
+            _init_worker(*self._initargs)
+            for job in jobs:
+                digest = self.digest(job)
+                if self._is_current(index, job['submission'], digest):
+                    skipped += 1
+                    continue
+                _render(job)
+                index[job['submission']] = digest
+                rendered += 1
+        else:
+            # Bounded window of in-flight jobs keeps memory flat for any cohort size
+            window = self.workers * 2
+            pending = {}
+
+            def collect(futures):
+                nonlocal rendered
+                for future in futures:
+                    submission, digest = pending.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        logger.exception("Rendering feedback for %s failed", submission)
+                        continue
+                    index[submission] = digest
+                    rendered += 1
+
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=self._initargs) as pool:
+                for job in jobs:
+                    digest = self.digest(job)
+                    if self._is_current(index, job['submission'], digest):
+                        skipped += 1
+                        continue
+                    pending[pool.submit(_render, job)] = (job['submission'], digest)
+                    if len(pending) >= window:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                collect(list(pending))
+
+        tmp_path = self.index_path.with_suffix(f'.tmp{os.getpid()}')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+        return rendered, skipped
@@ -0,0 +1,155 @@
+"""
+Grading event hooks for the RPAL grader
+Consumers (an LMS uploader, a dashboard, a database feeder) subscribe to
+events and receive them on a background thread as grading proceeds:
+
+    on_submission_start(submission)
+    on_run_complete(submission, test, mode, mode_result)
+    on_submission_graded(result)              # a SubmissionResult
+    on_batch_done(graded, run_id)
+
+A subscriber is any object defining some of these methods, or a single
+callable registered for one event. With --canary, each submission's canary
+run is also announced by on_submission_start and on_submission_graded, the
+latter with a provisional result holding only the canary test; the full
+grading follows with its own pair. Progress events are queued without blocking the
+grader; if a slow consumer lets the bounded queue fill up, further ones
+are dropped (and counted) rather than stalling grading. Terminal events
+(on_submission_graded, on_batch_done) are never dropped: they wait for room
+in the queue. Captured outputs on
+the result records may already be released by the time a consumer sees them
+unless --keep-outputs is set.
+"""
+
+import importlib
+import json
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("rpal_grader")
+
+EVENTS = ('on_submission_start', 'on_run_complete', 'on_submission_graded', 'on_batch_done')
+
+# Delivered even when the queue is full, waiting for consumers if need be
+TERMINAL_EVENTS = ('on_submission_graded', 'on_batch_done')
+
+_STOP = object()
+
+
+class EventBus:
+    def __init__(self, max_queued: int = 10000):
+        """
+        Args:
+            max_queued: Events held for delivery before progress events are dropped
+        """
+        self.max_queued = max_queued
+        self.dropped = 0
+        self._hooks: Dict[str, List[Callable]] = {event: [] for event in EVENTS}
+        self._subscribers: List = []
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber, event: Optional[str] = None):
+        """Register an object's on_* methods, or a callable for one event"""
+        if event is not None:
+            if event not in self._hooks:
+                raise ValueError(f"Unknown event '{event}' (available: {', '.join(EVENTS)})")
+            self._hooks[event].append(subscriber)
+        else:
+            methods = [name for name in EVENTS if callable(getattr(subscriber, name, None))]
+            if not methods:
+                raise ValueError(f"{subscriber!r} defines none of {', '.join(EVENTS)}")
+            for name in methods:
+                self._hooks[name].append(getattr(subscriber, name))
+            self._subscribers.append(subscriber)
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue(self.max_queued)
+                self._thread = threading.Thread(target=self._deliver, name='grading-events', daemon=True)
+                self._thread.start()
+
+    def emit(self, event: str, *args):
+        """Queue an event for delivery; only terminal events wait for a full queue"""
+        if self._thread is None or not self._hooks[event]:
+            return
+        if event in TERMINAL_EVENTS:
+            self._queue.put((event, args))
+            return
+        try:
+            self._queue.put_nowait((event, args))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if self.dropped == 1:
+                    logger.warning("Event queue full (%d), dropping events until consumers catch up", self.max_queued)
+
+    def _deliver(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            event, args = item
+            for hook in self._hooks[event]:
+                try:
+                    hook(*args)
+                except Exception:
+                    logger.exception("Event hook %r failed on %s", hook, event)
+
+    def close(self):
+        """Deliver everything still queued, stop the delivery thread and close subscribers"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self.dropped:
+            logger.warning("%d grading events were dropped", self.dropped)
+        for subscriber in self._subscribers:
+            if callable(getattr(subscriber, 'close', None)):
+                subscriber.close()
+
+
+def load_subscriber(spec: str):
+    """Import a "module:attribute" subscriber; classes are instantiated without arguments"""
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Hook must look like module:attribute, got '{spec}'")
+    subscriber = getattr(importlib.import_module(module_name), attribute)
+    return subscriber() if isinstance(subscriber, type) else subscriber
+
+
+class JsonLinesSink:
+    def __init__(self, path: Path):
+        """Append one JSON object per event to a file (tail -f friendly)"""
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, record: Dict):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def on_submission_start(self, submission: str):
+        self._write({'event': 'submission_start', 'submission': submission})
+
+    def on_run_complete(self, submission: str, test: str, mode: str, mode_result):
+        self._write({'event': 'run_complete', 'submission': submission, 'test': test, 'mode': mode,
+                     'score': round(mode_result.score, 2), 'error_class': mode_result.error_class,
+                     'duration_s': mode_result.duration})
+
+    def on_submission_graded(self, result):
+        self._write({'event': 'submission_graded', 'submission': result.submission,
+                     'algorithm_score': result.algorithm_score,
+                     'tests': {name: test.total for name, test in result.tests.items()},
+                     'notes': result.notes})
+
+    def on_batch_done(self, graded: int, run_id: Optional[int]):
+        self._write({'event': 'batch_done', 'graded': graded, 'run_id': run_id})
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,156 @@
+"""
+Typed, slotted result records for the RPAL grader
+One SubmissionResult per graded folder, holding a TestResult per test case,
+which in turn holds a ModeResult per mode (run/ast/st). Errors live only on
+ModeResult; captured outputs can be spilled to content-addressed blobs on disk.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MODES = ('run', 'ast', 'st')
+
+
+class CapturedOutput:
+    """Raw stdout/stderr text, held in memory or in a blob file on disk"""
+    __slots__ = ('_text', 'blob_path', 'size')
+
+    def __init__(self, text: Optional[str] = None, blob_path: Optional[Path] = None, size: int = 0):
+        self._text = text
+        self.blob_path = blob_path
+        self.size = size
+
+    @property
+    def text(self) -> str:
+        if self._text is not None:
+            return self._text
+        with open(self.blob_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._text is None
+
+
+class BlobStore:
+    def __init__(self, root: Path, spill_threshold: int = 64 * 1024, storage=None):
+        """
+        Content-addressed storage for large captured outputs
+
+        Args:
+            root: Directory for blob files (created on first spill)
+            spill_threshold: Outputs larger than this many bytes are written to disk
+            storage: StorageManager tracking the blob files (see storage_manager)
+        """
+        self.root = Path(root)
+        self.spill_threshold = spill_threshold
+        self.storage = storage
+
+    def capture(self, text: str) -> CapturedOutput:
+        """Keep small outputs in memory, spill large ones to a blob file"""
+        data = text.encode('utf-8')
+        if len(data) <= self.spill_threshold:
+            return CapturedOutput(text=text, size=len(data))
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self.root / digest[:2] / digest
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix(f'.tmp{os.getpid()}')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+            if self.storage is not None:
+                self.storage.track(blob_path, 'blob')
+        elif self.storage is not None:
+            self.storage.touch(blob_path)
+        return CapturedOutput(blob_path=blob_path, size=len(data))
+
+
+class ModeResult:
+    """Outcome of one (test, mode) execution"""
+    __slots__ = ('score', 'similarity', 'error', 'error_class', 'duration', 'return_code', 'stdout', 'stderr')
+
+    def __init__(self, score: float = 0, similarity: Optional[float] = 0.0, error: str = '',
+                 error_class: str = 'pass', duration: Optional[float] = None, return_code: Optional[int] = None,
+                 stdout: Optional[CapturedOutput] = None, stderr: Optional[CapturedOutput] = None):
+        self.score = score
+        self.similarity = similarity
+        self.error = error
+        self.error_class = error_class
+        self.duration = duration
+        self.return_code = return_code
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def copy(self) -> 'ModeResult':
+        """Shallow copy; captured outputs are shared, not duplicated"""
+        return ModeResult(self.score, self.similarity, self.error, self.error_class,
+                          self.duration, self.return_code, self.stdout, self.stderr)
+
+
+class TestResult:
+    """Per-mode results of one test case"""
+    __test__ = False  # not a pytest class
+    __slots__ = ('name', 'modes')
+
+    def __init__(self, name: str, modes: Optional[Dict[str, ModeResult]] = None):
+        self.name = name
+        self.modes = modes if modes is not None else {}
+
+    @classmethod
+    def failed(cls, name: str, error: str, error_class: str) -> 'TestResult':
+        """A test where every mode failed the same way (e.g. missing input)"""
+        return cls(name, {mode: ModeResult(error=error, error_class=error_class, similarity=None) for mode in MODES})
+
+    @property
+    def total(self) -> float:
+        return round(sum(mode.score for mode in self.modes.values()), 2)
+
+    def score(self, mode: str) -> float:
+        return round(self.modes[mode].score, 2) if mode in self.modes else 0
+
+    def error(self, mode: str) -> str:
+        return self.modes[mode].error if mode in self.modes else ''
+
+
+class SubmissionResult:
+    """Everything recorded about one graded submission"""
+    __slots__ = ('submission', 'algorithm_score', 'comments_score', 'report_score', 'total_score',
+                 'max_algorithm_score', 'tests', 'notes', 'has_makefile', 'has_program_file',
+                 'execution_method', 'makefile_location', 'program_file_location')
+
+    def __init__(self, submission: str, algorithm_score: float = 0, comments_score: float = 0,
+                 report_score: float = 0, total_score: float = 0, max_algorithm_score: int = 70,
+                 tests: Optional[Dict[str, TestResult]] = None, notes: Optional[List[str]] = None,
+                 has_makefile: str = 'No', has_program_file: str = 'No', execution_method: str = 'None',
+                 makefile_location: str = '', program_file_location: str = ''):
+        self.submission = submission
+        self.algorithm_score = algorithm_score
+        self.comments_score = comments_score
+        self.report_score = report_score
+        self.total_score = total_score
+        self.max_algorithm_score = max_algorithm_score
+        self.tests = tests if tests is not None else {}
+        self.notes = notes if notes is not None else []
+        self.has_makefile = has_makefile
+        self.has_program_file = has_program_file
+        self.execution_method = execution_method
+        self.makefile_location = makefile_location
+        self.program_file_location = program_file_location
+
+    @classmethod
+    def grading_error(cls, submission: str, message: str) -> 'SubmissionResult':
+        """Placeholder result for a submission the grader itself failed on"""
+        return cls(submission, notes=[f"Grading error: {message}"], has_makefile='Error',
+                   has_program_file='Error', execution_method='Error',
+                   makefile_location='N/A', program_file_location='N/A')
+
+    def drop_outputs(self):
+        """Release captured outputs once they are no longer needed"""
+        for test in self.tests.values():
+            for mode in test.modes.values():
+                mode.stdout = None
+                mode.stderr = None
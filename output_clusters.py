@@ -0,0 +1,172 @@
+"""
+Cohort-level output clustering for the RPAL grader
+Groups the normalized outputs of one (test, mode) across all submissions so
+shared bugs, or a wrong expected file, show up as a handful of clusters
+instead of hundreds of diffs. Identical outputs are grouped by hash; the
+distinct outputs are then compared with MinHash signatures over token
+shingles, banded (LSH) so only likely-similar pairs are checked, and merged
+when their estimated Jaccard similarity reaches the threshold.
+
+Signatures are computed with NumPy when it is installed and in pure Python
+otherwise; both give identical clusters.
+"""
+
+import hashlib
+import random
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Mersenne prime for the (a*x + b) mod p permutations; small enough that a*x fits in uint64
+_PRIME = (1 << 31) - 1
+
+
+class OutputCluster:
+    """Submissions whose outputs are identical or near-identical"""
+    __slots__ = ('representative', 'members', 'distinct', 'matches_expected')
+
+    def __init__(self, representative: str, members: List[str], distinct: int, matches_expected: bool):
+        self.representative = representative
+        self.members = members
+        self.distinct = distinct
+        self.matches_expected = matches_expected
+
+    @property
+    def size(self) -> int:
+        return len(self.members)
+
+
+def shingles(text: str, k: int = 3) -> List[int]:
+    """Hashed k-token shingles of a normalized output (the whole output if it is shorter)"""
+    tokens = text.split()
+    if len(tokens) <= k:
+        grams = [' '.join(tokens)]
+    else:
+        grams = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    return sorted({zlib.crc32(gram.encode('utf-8')) for gram in grams})
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        """
+        Args:
+            num_perm: Signature length
+            bands: LSH bands (num_perm / bands rows each); more bands find less similar pairs
+            seed: Seed for the permutation coefficients
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+
+    def signatures(self, shingle_sets: Sequence[List[int]]) -> List[Tuple[int, ...]]:
+        if np is not None:
+            return self._signatures_numpy(shingle_sets)
+        coefficients = list(zip(self.a, self.b))
+        return [tuple(min((a * (h % _PRIME) + b) % _PRIME for h in hashes) for a, b in coefficients)
+                for hashes in shingle_sets]
+
+    def _signatures_numpy(self, shingle_sets: Sequence[List[int]], chunk: int = 1 << 16) -> List[Tuple[int, ...]]:
+        """All permutations of a chunk of outputs at once, min-reduced per output"""
+        a = np.array(self.a, dtype=np.uint64)[:, None]
+        b = np.array(self.b, dtype=np.uint64)[:, None]
+        result = []
+        start = 0
+        while start < len(shingle_sets):
+            # Bound the (num_perm x shingles) matrix by the number of shingles per chunk
+            end, total = start, 0
+            while end < len(shingle_sets) and (end == start or total + len(shingle_sets[end]) <= chunk):
+                total += len(shingle_sets[end])
+                end += 1
+            batch = shingle_sets[start:end]
+            flat = np.fromiter((h for hashes in batch for h in hashes), dtype=np.uint64, count=total) % _PRIME
+            offsets = np.cumsum([0] + [len(hashes) for hashes in batch[:-1]])
+            minima = np.minimum.reduceat((a * flat[None, :] + b) % _PRIME, offsets, axis=1)
+            result.extend(tuple(int(v) for v in column) for column in minima.T)
+            start = end
+        return result
+
+    def candidate_pairs(self, signatures: Sequence[Tuple[int, ...]]) -> Iterable[Tuple[int, int]]:
+        """Index pairs sharing at least one band"""
+        seen = set()
+        for band in range(self.bands):
+            buckets: Dict[Tuple[int, ...], List[int]] = {}
+            start = band * self.rows
+            for i, signature in enumerate(signatures):
+                buckets.setdefault(signature[start:start + self.rows], []).append(i)
+            for members in buckets.values():
+                for j in range(1, len(members)):
+                    for i in members[:j]:
+                        pair = (i, members[j])
+                        if pair not in seen:
+                            seen.add(pair)
+                            yield pair
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def cluster_outputs(outputs: Dict[str, str], expected: Optional[str] = None, threshold: float = 0.8,
+                    hasher: Optional[MinHasher] = None) -> List[OutputCluster]:
+    """
+    Cluster normalized outputs
+
+    Args:
+        outputs: submission -> normalized output
+        expected: Normalized expected output (flags the cluster that contains it)
+        threshold: Minimum estimated Jaccard similarity for merging distinct outputs
+        hasher: MinHasher to use (default: 64 permutations in 16 bands)
+    Returns:
+        Clusters, largest first
+    """
+    hasher = hasher or MinHasher()
+
+    # Exact grouping by content hash
+    groups: Dict[str, List[str]] = {}
+    texts: Dict[str, str] = {}
+    for submission, text in outputs.items():
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        groups.setdefault(key, []).append(submission)
+        texts[key] = text
+    keys = sorted(groups, key=lambda k: (-len(groups[k]), k))
+    expected_key = hashlib.sha1(expected.encode('utf-8')).hexdigest() if expected is not None else None
+
+    # Near-duplicate merging of the distinct outputs
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if len(keys) > 1:
+        signatures = hasher.signatures([shingles(texts[key]) for key in keys])
+        for i, j in hasher.candidate_pairs(signatures):
+            if hasher.similarity(signatures[i], signatures[j]) >= threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    # Keep the more common output as the root (lower index = larger group)
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(keys)):
+        members.setdefault(find(i), []).append(i)
+
+    clusters = []
+    for root, indexes in members.items():
+        submissions = sorted(s for i in indexes for s in groups[keys[i]])
+        clusters.append(OutputCluster(texts[keys[root]], submissions, len(indexes),
+                                      any(keys[i] == expected_key for i in indexes)))
+    clusters.sort(key=lambda cluster: (-cluster.size, cluster.representative))
+    return clusters
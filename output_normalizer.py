@@ -0,0 +1,170 @@
+"""
+Output normalization for the RPAL grader
+The comparison rules (line endings, IDENTIFIER/ID aliasing, AST indentation,
+final-answer extraction) are declared as plain settings and applied in a single
+pass over the lines of the output. Input may be str, bytes, bytearray or a
+memoryview of captured stdout; bytes are decoded one line at a time.
+"""
+
+import re
+from typing import Dict, Optional, Sequence, Union
+
+Output = Union[str, bytes, bytearray, memoryview]
+
+DEFAULT_RULES = {
+    # Token spelled two ways by different reference implementations: (variant, canonical)
+    'identifier_alias': ('IDENTIFIER', 'ID'),
+    # Any of these in the output means it is a tree (AST/ST) rather than a final answer
+    'ast_keywords': ('gamma', 'lambda', 'tau', '.+', '.>', '.='),
+    # Lines that look like a final answer; the last matching line is kept
+    'answer_patterns': (
+        r'-?\d+',                      # Integers
+        r'\d+\.\d+',                   # Decimals
+        r'[a-zA-Z_][a-zA-Z0-9_]*',     # Simple identifiers
+        r'[()]+',                      # Parentheses
+        r'[a-zA-Z0-9\s\(\)]+',         # Simple expressions
+    ),
+    # Space-indented trees: try these widths per level, in order
+    'indent_widths': (4, 2),
+}
+
+# Line contents between \r\n, \r or \n breaks (blank lines are dropped anyway)
+_LINE_STR = re.compile(r'[^\r\n]+')
+_LINE_BYTES = re.compile(rb'[^\r\n]+')
+
+
+class NormalizedOutput:
+    """
+    Result of normalizing one output
+    text is used for similarity scoring, canonical (IDENTIFIER/ID aliased) for exact matching
+    """
+    __slots__ = ('text', 'canonical', 'is_tree')
+
+    def __init__(self, text: str, canonical: str, is_tree: bool):
+        self.text = text
+        self.canonical = canonical
+        self.is_tree = is_tree
+
+
+class OutputNormalizer:
+    def __init__(self, identifier_alias: Optional[Sequence[str]] = DEFAULT_RULES['identifier_alias'],
+                 ast_keywords: Sequence[str] = DEFAULT_RULES['ast_keywords'],
+                 answer_patterns: Sequence[str] = DEFAULT_RULES['answer_patterns'],
+                 indent_widths: Sequence[int] = DEFAULT_RULES['indent_widths']):
+        """
+        Compile the normalization rules
+
+        Args:
+            identifier_alias: (variant, canonical) token pair treated as equal, or None
+            ast_keywords: Substrings that mark an output as a tree
+            answer_patterns: Full-line regexes for answer-looking lines
+            indent_widths: Spaces per indent level to try for space-indented trees
+        """
+        if identifier_alias:
+            variant, self.alias_to = identifier_alias
+            self.alias_re = re.compile(rf'\b{re.escape(variant)}\b')
+            self.alias_marker = variant
+        else:
+            self.alias_re = None
+        self.keyword_re = re.compile('|'.join(re.escape(k) for k in ast_keywords)) if ast_keywords else None
+        self.answer_re = re.compile('(?:' + '|'.join(answer_patterns) + r')\Z') if answer_patterns else None
+        self.indent_widths = tuple(indent_widths)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict] = None) -> 'OutputNormalizer':
+        """Build from a (possibly partial) rules dict, e.g. a manifest's "normalization" section"""
+        rules = dict(DEFAULT_RULES)
+        rules.update(config or {})
+        unknown = set(rules) - set(DEFAULT_RULES)
+        if unknown:
+            raise ValueError(f"Unknown normalization rules: {sorted(unknown)}")
+        return cls(**rules)
+
+    def _indent(self, line: str) -> str:
+        """Rewrite leading dots/spaces as one dot per tree level"""
+        content = line.lstrip('.')
+        level = len(line) - len(content)
+        if not level:
+            content = line.lstrip(' ')
+            spaces = len(line) - len(content)
+            level = spaces
+            for width in self.indent_widths:
+                if spaces % width == 0:
+                    level = spaces // width
+                    break
+        return '.' * level + content if level else line
+
+    def normalize(self, output: Output, is_ast: bool = False) -> NormalizedOutput:
+        """
+        Normalize an output in one pass over its lines
+
+        For is_ast the result is the indentation-normalized tree. Otherwise the output
+        is aliased first, and is either normalized as a tree (if it contains tree
+        keywords) or reduced to its final answer line.
+        """
+        if isinstance(output, str):
+            lines = _LINE_STR.finditer(output)
+            decode = None
+        else:
+            lines = _LINE_BYTES.finditer(output)
+            decode = True
+
+        alias_re = self.alias_re
+        keyword_re = None if is_ast else self.keyword_re
+        answer_re = self.answer_re
+
+        tree_lines = []
+        canonical_lines = [] if is_ast and alias_re else None
+        is_tree = is_ast
+        last_line = last_answer = None
+        first = True
+
+        for match in lines:
+            line = match.group()
+            if decode:
+                line = line.decode('utf-8', errors='ignore')
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if first:
+                # The whole output is stripped, so the first line loses its indentation
+                line = line.lstrip()
+                first = False
+
+            aliased = line
+            if alias_re is not None and self.alias_marker in line:
+                aliased = alias_re.sub(self.alias_to, line)
+
+            if is_ast:
+                tree_lines.append(self._indent(line))
+                if canonical_lines is not None:
+                    canonical_lines.append(tree_lines[-1] if aliased is line else self._indent(aliased))
+                continue
+
+            # Final-answer candidates (on aliased, stripped lines)
+            if aliased is not line:
+                stripped = aliased.strip()
+            last_line = stripped
+            if answer_re is not None and answer_re.match(stripped):
+                last_answer = stripped
+
+            if not is_tree and keyword_re is not None and keyword_re.search(aliased):
+                is_tree = True
+            tree_lines.append(aliased)
+
+        if is_tree and not is_ast:
+            tree_lines = [self._indent(line) for line in tree_lines]
+        if tree_lines:
+            # ...and the last line loses its trailing whitespace
+            tree_lines[-1] = tree_lines[-1].rstrip()
+            if canonical_lines:
+                canonical_lines[-1] = canonical_lines[-1].rstrip()
+
+        if is_tree:
+            text = '\n'.join(tree_lines)
+            canonical = '\n'.join(canonical_lines) if canonical_lines else text
+            return NormalizedOutput(text, canonical, True)
+
+        answer = last_answer if last_answer is not None else (last_line or "")
+        return NormalizedOutput(answer, answer, False)
+
@@ -0,0 +1,281 @@
+"""
+Performance tier for the RPAL grader
+The correctness suite only uses tiny programs, so an interpreter with a
+badly scaling CSE machine still gets full marks. This tier runs scaled
+variants of existing test programs (deeper towers recursion, longer
+vectorsum tuples, longer pairs strings), meters the CPU time of each run,
+fits a growth curve over the sizes and reports the complexity class and
+throughput next to the correctness score.
+
+Expected outputs and the reference growth class of every variant come from
+the built-in reference engine (rpal_engine); the reference class is fitted
+on its CSE machine step counts, which unlike CPU time are exact. Per
+program, a submission earns the bonus weight when it scales better than
+the reference, nothing when it matches it, the penalty weight per polynomial
+degree worse, and the failure weight when a variant fails, times out or
+prints a wrong answer. The adjusted score stays within the suite's points.
+Weights, scales, the timeout and metered repeats per variant can be
+set in the manifest's "performance" section:
+
+    "performance": {"weights": {"bonus": 1, "penalty": -2, "failure": -2},
+                    "scales": {"towers": [6, 8, 10, 12]}, "timeout": 20, "repeats": 2}
+
+CPU time is metered from the rusage of reaped children, so variants are run
+one at a time; without the resource module (Windows) wall time is used.
+"""
+
+import math
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import rpal_engine
+
+DEFAULT_WEIGHTS = {'bonus': 1.0, 'penalty': -2.0, 'failure': -2.0}
+
+_TOWERS = """let rec T a b c N =
+   (N gr 1 -> T a c b (N-1) | '') @Conc
+   'Move ' @Conc
+   a @Conc
+   ' to ' @Conc
+   b @Conc
+   '\\n' @Conc
+   (N gr 1 -> T c b a (N-1) | '')
+
+in Print (T 'A' 'B' 'C' {n})
+"""
+
+_VECTORSUM = """let Vec_sum (A,B) =
+    Psum(A,B,Order A)
+    where
+      rec Psum(A,B,N) =
+      N eq 0
+      ->  nil
+      |  (Psum(A,B,N-1) aug  A N + B N)
+
+ in Print (Vec_sum ( ({a}), ({b}) ))
+"""
+
+_PAIRS = """let rec Rev S =
+     S eq '' -> ''
+     | (Rev(Stern S)) @Conc (Stem S )
+within
+     Pairs (S1,S2) =
+      not (Isstring S1 & Isstring S2) -> 'both args not strings'
+      | P (Rev S1, Rev S2)
+    where rec P (S1, S2) =
+       S1 eq '' & S2 eq '' -> nil
+     | (Stern S1 eq '' & Stern S2 ne '') or
+       (Stern S1 ne '' & Stern S2 eq '')
+           -> 'bad strings'
+     | (P (Stern S1, Stern S2) aug ((Stem S1) @Conc (Stem S2)))
+ in Print ( Pairs ('{a}','{b}'))
+"""
+
+
+def _letters(n: int, offset: int) -> str:
+    return ''.join(chr(ord('a') + (i + offset) % 26) for i in range(n))
+
+
+# program -> (source for scale n, work units for scale n, default scales)
+SCALED_PROGRAMS: Dict[str, Tuple[Callable[[int], str], Callable[[int], int], Tuple[int, ...]]] = {
+    'towers': (lambda n: _TOWERS.replace('{n}', str(n)), lambda n: 2 ** n - 1, (6, 8, 10, 12)),
+    'vectorsum': (lambda n: _VECTORSUM.format(a=','.join(str(i) for i in range(1, n + 1)),
+                                              b=','.join(str(i) for i in range(n + 1, 2 * n + 1))),
+                  lambda n: n, (25, 50, 100, 200)),
+    'pairs': (lambda n: _PAIRS.format(a=_letters(n, 0), b=_letters(n, 13)), lambda n: n, (25, 50, 100, 200)),
+}
+
+# Growth models t = a + b * g(n), simplest first
+COMPLEXITY_CLASSES: Tuple[Tuple[str, Callable[[float], float]], ...] = (
+    ('O(1)', lambda n: 0.0),
+    ('O(log n)', math.log),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)', lambda n: n * n),
+    ('O(n^3)', lambda n: n ** 3),
+)
+SUPER_POLYNOMIAL = 'super-polynomial'
+# Polynomial degree of each class; weights step by degree since log factors are within timing noise
+CLASS_DEGREE = {'O(1)': 0, 'O(log n)': 0, 'O(n)': 1, 'O(n log n)': 1, 'O(n^2)': 2, 'O(n^3)': 3,
+                SUPER_POLYNOMIAL: 4}
+
+
+class ScaledVariant:
+    """One scaled program: its input file, expected output and the reference engine's step count"""
+    __slots__ = ('program', 'scale', 'size', 'input_path', 'expected', 'reference_steps')
+
+    def __init__(self, program: str, scale: int, size: int, input_path: Path, expected: str,
+                 reference_steps: int):
+        self.program = program
+        self.scale = scale
+        self.size = size
+        self.input_path = input_path
+        self.expected = expected
+        self.reference_steps = reference_steps
+
+
+class ProgramProfile:
+    """How one submission scales on one program"""
+    __slots__ = ('program', 'points', 'complexity', 'throughput', 'failure', 'adjustment')
+
+    def __init__(self, program: str):
+        self.program = program
+        self.points: List[Tuple[int, float]] = []
+        self.complexity = ''
+        self.throughput = 0.0
+        self.failure = ''
+        self.adjustment = 0.0
+
+
+def generate_variants(output_dir: Path, scales: Optional[Dict[str, Sequence[int]]] = None) -> List[ScaledVariant]:
+    """
+    Write the scaled inputs to output_dir and evaluate them with the reference engine
+
+    Args:
+        output_dir: Folder for the generated <program>_<scale>.rpal inputs
+        scales: program -> scales overriding SCALED_PROGRAMS' defaults
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    scales = scales or {}
+    unknown = set(scales) - set(SCALED_PROGRAMS)
+    if unknown:
+        raise ValueError(f"Unknown performance programs: {', '.join(sorted(unknown))} "
+                         f"(available: {', '.join(SCALED_PROGRAMS)})")
+    variants = []
+    for program, (source_for, size_for, default_scales) in SCALED_PROGRAMS.items():
+        for scale in sorted(scales.get(program, default_scales)):
+            source = source_for(scale)
+            input_path = output_dir / f"{program}_{scale}.rpal"
+            if not input_path.exists() or input_path.read_text(encoding='utf-8') != source:
+                input_path.write_text(source, encoding='utf-8')
+            machine = rpal_engine.CSEMachine(rpal_engine.standardize(rpal_engine.parse(source)))
+            expected = machine.run()
+            variants.append(ScaledVariant(program, scale, size_for(scale), input_path, expected, machine.steps))
+    return variants
+
+
+def reference_complexity(variants: Sequence[ScaledVariant]) -> str:
+    """Growth class of the reference engine's step counts over one program's variants"""
+    return fit_growth([(v.size, float(v.reference_steps)) for v in variants], noise=0)
+
+
+class ChildCPUMeter:
+    """CPU seconds (user + system) of children reaped inside the block"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    @staticmethod
+    def _now() -> float:
+        if resource is None:
+            return time.perf_counter()
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def __enter__(self) -> 'ChildCPUMeter':
+        self._start = self._now()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = self._now() - self._start
+
+
+def fit_growth(points: Sequence[Tuple[int, float]], tolerance: float = 1.25, noise: float = 0.1) -> str:
+    """
+    Complexity class that best explains (size, seconds) measurements
+
+    Timings include start-up (interpreter or JVM launch) that doesn't grow with the
+    input, so the smallest size's time is taken as the baseline and each model
+    t - t0 = b * (g(n) - g(n0)) is fitted through the origin by least squares (b >= 0).
+    The simplest model whose relative squared error is within `tolerance` of the best
+    one wins. Timings spreading less than `noise` times the largest one are O(1).
+    Growth faster than n^4 between the two largest sizes is reported as super-polynomial.
+    """
+    if len(points) < 2:
+        return ''
+    ordered = sorted(points)
+    seconds = [t for _, t in ordered]
+    if max(seconds) - min(seconds) <= noise * max(seconds):
+        return 'O(1)'
+
+    (n0, t0), rest = ordered[0], ordered[1:]
+    excess = [t - t0 for _, t in rest]
+    total = sum(e * e for e in excess)
+    errors = []
+    for name, g in COMPLEXITY_CLASSES:
+        xs = [g(float(n)) - g(float(n0)) for n, _ in rest]
+        norm = sum(x * x for x in xs)
+        slope = max(0.0, sum(x * e for x, e in zip(xs, excess)) / norm) if norm else 0.0
+        errors.append((name, sum((slope * x - e) ** 2 for x, e in zip(xs, excess)) / total))
+    best = min(error for _, error in errors)
+    complexity = next(name for name, error in errors if error <= best * tolerance + 1e-9)
+
+    (n1, t1), (n2, t2) = ordered[-2:]
+    if n2 > n1 and t1 > 0 and t2 / t1 > (n2 / n1) ** 4:
+        return SUPER_POLYNOMIAL
+    return complexity
+
+
+def profile_program(program: str, variants: Sequence[ScaledVariant],
+                    run: Callable[[Path], Tuple[str, str, int]],
+                    check: Callable[[ScaledVariant, str, str, int], str], repeats: int = 1) -> ProgramProfile:
+    """
+    Run a program's variants smallest first, metering CPU time, and fit their growth
+
+    Args:
+        program: Program name
+        variants: Its scaled variants
+        run: input path -> (stdout, stderr, returncode) for the submission
+        check: (variant, stdout, stderr, returncode) -> failure description, '' if correct
+        repeats: Metered runs per variant; the fastest counts
+    Stops at the first failing variant; larger ones would only fail slower.
+    """
+    profile = ProgramProfile(program)
+    ordered = sorted(variants, key=lambda v: v.size)
+    # Unmetered warm-up so one-off builds and cold caches don't count as growth
+    run(ordered[0].input_path)
+    for variant in ordered:
+        best = float('inf')
+        for _ in range(max(1, repeats)):
+            with ChildCPUMeter() as meter:
+                stdout, stderr, returncode = run(variant.input_path)
+            failure = check(variant, stdout, stderr, returncode)
+            if failure:
+                profile.failure = f"{variant.program} {variant.scale}: {failure}"
+                break
+            best = min(best, meter.seconds)
+        if profile.failure:
+            break
+        profile.points.append((variant.size, best))
+    if not profile.failure:
+        profile.complexity = fit_growth(profile.points)
+        size, seconds = profile.points[-1]
+        profile.throughput = size / max(seconds, 1e-6)
+    return profile
+
+
+def apply_weights(profile: ProgramProfile, reference_complexity: str, weights: Dict[str, float]) -> float:
+    """Set and return the profile's bonus/penalty relative to the reference's complexity class"""
+    if profile.failure:
+        profile.adjustment = weights['failure']
+    else:
+        steps = CLASS_DEGREE.get(profile.complexity, 0) - CLASS_DEGREE.get(reference_complexity, 0)
+        if steps < 0:
+            profile.adjustment = weights['bonus']
+        elif steps == 0:
+            profile.adjustment = 0.0
+        else:
+            profile.adjustment = weights['penalty'] * steps
+    return profile.adjustment
+
+
+def adjusted_score(score: float, adjustment: float, max_score: float) -> float:
+    """Correctness score plus the performance adjustment, kept within 0..max_score"""
+    return min(max(score + adjustment, 0.0), max_score)
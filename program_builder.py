@@ -0,0 +1,212 @@
+"""
+Build subsystem for compiled RPAL submissions
+C/C++ projects are built from every translation unit next to the main program
+file, compiled in parallel; Java projects from every .java source. Objects,
+linked executables and Java class folders are stored in a content-addressed
+cache shared by all submissions, so identical starter code is compiled once.
+If the whole-project build fails (stray test files, old copies with their own
+main), the main file is built alone, as the grader always did.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("rpal_grader")
+
+C_SOURCES = ('.c',)
+CPP_SOURCES = ('.cpp', '.cxx', '.cc')
+JAVA_SOURCES = ('.java',)
+HEADER_SUFFIXES = ('.h', '.hpp', '.hh', '.hxx')
+
+# Folders that never hold sources worth building
+SKIPPED_DIRS = ('__MACOSX',)
+
+
+def discover_sources(root: Path, suffixes: Sequence[str], max_depth: int = 3) -> List[Path]:
+    """Source files under root (sorted, hidden folders skipped)"""
+    sources = []
+    root_depth = len(root.parts)
+    for directory, dirnames, filenames in os.walk(root):
+        if len(Path(directory).parts) - root_depth >= max_depth:
+            dirnames[:] = []
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in SKIPPED_DIRS]
+        sources.extend(Path(directory) / name for name in filenames if name.lower().endswith(suffixes))
+    return sorted(sources)
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """First line of `tool --version` (part of every cache key)"""
+    try:
+        result = subprocess.run([tool, '-version' if tool == 'javac' else '--version'],
+                                capture_output=True, text=True, timeout=30, errors='ignore')
+    except (OSError, subprocess.TimeoutExpired):
+        return tool
+    output = (result.stdout or result.stderr).strip()
+    return output.splitlines()[0] if output else tool
+
+
+class ObjectCache:
+    def __init__(self, root: Path, storage=None):
+        """
+        Content-addressed store for build outputs (files or folders), shared across submissions
+
+        Args:
+            root: Cache folder (created on first store)
+            storage: StorageManager told about stored entries and hits (see storage_manager)
+        """
+        self.root = Path(root)
+        self.storage = storage
+
+    def path(self, key: str, suffix: str = '') -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def lookup(self, key: str, suffix: str = '') -> Optional[Path]:
+        path = self.path(key, suffix)
+        if not path.exists():
+            return None
+        if self.storage is not None:
+            self.storage.touch(path)
+        return path
+
+    def store(self, key: str, suffix: str, source: Path) -> Path:
+        """Copy a freshly built file or folder into the cache atomically"""
+        path = self.path(key, suffix)
+        if path.exists():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}_{id(source)}")
+        if source.is_dir():
+            shutil.copytree(source, tmp_path)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Another worker stored the same output first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        else:
+            shutil.copy2(source, tmp_path)
+            os.replace(tmp_path, path)
+        if self.storage is not None:
+            self.storage.track(path, 'build')
+        return path
+
+
+class ProgramBuilder:
+    def __init__(self, cache_root: Optional[Path] = None, jobs: Optional[int] = None,
+                 opt_level: Optional[str] = None, storage=None):
+        """
+        Args:
+            cache_root: Shared object cache folder, None to disable caching
+            jobs: Translation units compiled in parallel per build (default: CPU count)
+            opt_level: gcc/g++ optimization level ('0'-'3', 's', 'fast'), None for compiler default
+            storage: StorageManager tracking the cache entries (see storage_manager)
+        """
+        self.cache = ObjectCache(cache_root, storage) if cache_root else None
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.opt_level = opt_level
+
+    @property
+    def native_flags(self) -> List[str]:
+        return [f'-O{self.opt_level}'] if self.opt_level else []
+
+    def build(self, program_file: Path, output_dir: Path, timeout: float = 30) -> Tuple[Optional[Path], str]:
+        """
+        Build the project around program_file
+        Returns (class folder or executable, None on failure; compiler errors)
+        """
+        if program_file.suffix == '.java':
+            builder, suffixes = self.build_java, JAVA_SOURCES
+        else:
+            builder = functools.partial(self.build_native, 'gcc' if program_file.suffix == '.c' else 'g++')
+            suffixes = C_SOURCES if program_file.suffix == '.c' else CPP_SOURCES
+
+        sources = discover_sources(program_file.parent, suffixes)
+        if len(sources) > 1:
+            target, errors = builder(program_file, sources, output_dir, timeout)
+            if target is not None:
+                return target, errors
+            logger.debug("Project build of %d sources failed, building %s alone", len(sources), program_file.name)
+        return builder(program_file, [program_file], output_dir, timeout)
+
+    def _stored(self, key: str, suffix: str, built: Path) -> Path:
+        return self.cache.store(key, suffix, built) if self.cache else built
+
+    def _digest(self, root: Path, parts: Sequence[str], files: Sequence[Path]) -> str:
+        """Cache key over tool/flag strings and file names (relative to root) and contents"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8') + b'\0')
+        for path in files:
+            digest.update(os.path.relpath(path, root).encode('utf-8') + b'\0')
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        return digest.hexdigest()
+
+    def build_native(self, compiler: str, program_file: Path, sources: List[Path], output_dir: Path,
+                     timeout: float) -> Tuple[Optional[Path], str]:
+        root = program_file.parent
+        flags = self.native_flags
+        include_dirs = sorted({source.parent for source in sources})
+        includes = [f'-I{directory}' for directory in include_dirs]
+        # Headers can't be attributed to one unit without preprocessing, so every
+        # project header is part of every object's key
+        headers = discover_sources(root, HEADER_SUFFIXES)
+        key_parts = [tool_version(compiler)] + flags + [os.path.relpath(d, root) for d in include_dirs]
+        header_key = self._digest(root, key_parts, headers)
+
+        def compile_unit(index_source: Tuple[int, Path]) -> Tuple[Optional[Path], str, str]:
+            index, source = index_source
+            key = self._digest(root, [header_key], [source])
+            cached = self.cache.lookup(key, '.o') if self.cache else None
+            if cached:
+                return cached, key, ''
+            obj = output_dir / f"{index}_{source.stem}.o"
+            result = subprocess.run([compiler, *flags, *includes, '-c', str(source), '-o', str(obj)],
+                                    capture_output=True, text=True, timeout=timeout, cwd=root,
+                                    encoding='utf-8', errors='ignore')
+            if result.returncode != 0:
+                return None, key, result.stderr
+            return self._stored(key, '.o', obj), key, ''
+
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(sources))) as pool:
+            units = list(pool.map(compile_unit, enumerate(sources)))
+        errors = '\n'.join(error for _, _, error in units if error)
+        if any(obj is None for obj, _, _ in units):
+            return None, errors
+
+        link_key = hashlib.sha256('\0'.join([compiler, *flags] + [key for _, key, _ in units]).encode()).hexdigest()
+        cached = self.cache.lookup(link_key, f'.{program_file.stem}') if self.cache else None
+        if cached:
+            return cached, ''
+        exe_file = output_dir / program_file.stem
+        result = subprocess.run([compiler, *flags, *(str(obj) for obj, _, _ in units), '-o', str(exe_file)],
+                                capture_output=True, text=True, timeout=timeout, cwd=root,
+                                encoding='utf-8', errors='ignore')
+        if result.returncode != 0:
+            return None, result.stderr
+        return self._stored(link_key, f'.{program_file.stem}', exe_file), ''
+
+    def build_java(self, program_file: Path, sources: List[Path], output_dir: Path,
+                   timeout: float) -> Tuple[Optional[Path], str]:
+        """javac compiles a whole source set in one (internally parallel) process"""
+        root = program_file.parent
+        all_sources = discover_sources(root, JAVA_SOURCES)
+        # A single-file build still pulls other sources in through the sourcepath
+        key = self._digest(root, [tool_version('javac'), os.path.relpath(program_file, root), str(len(sources))],
+                           all_sources)
+        cached = self.cache.lookup(key, '.classes') if self.cache else None
+        if cached:
+            return cached, ''
+        class_dir = output_dir / f"classes_{len(sources)}"
+        result = subprocess.run(['javac', '-d', str(class_dir), *(str(source) for source in sources)],
+                                capture_output=True, text=True, timeout=timeout, cwd=root,
+                                encoding='utf-8', errors='ignore')
+        if result.returncode != 0:
+            return None, result.stderr
+        return self._stored(key, '.classes', class_dir), ''
@@ -0,0 +1,143 @@
+"""
+Live grading progress for the RPAL grader
+A ProgressTracker is fed by the grader as submissions and runs start and
+finish. It can redraw a one-line status on a terminal and serve the same
+numbers as JSON over a local HTTP endpoint, e.g.
+
+    $ curl -s localhost:8765
+    {"done": 41, "total": 120, "per_minute": 9.8, "in_flight": 4, "timeouts": 3,
+     "slowest": [{"submission": "bob", "run": "towers/run", "seconds": 27.4}], ...}
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class ProgressTracker:
+    def __init__(self, total: int = 0, slowest: int = 3):
+        """
+        Args:
+            total: Number of submissions to grade
+            slowest: How many of the longest-running in-flight runs to report
+        """
+        self.total = total
+        self.slowest_count = slowest
+        self.done = 0
+        self.timeouts = 0
+        self.started_at = time.time()
+        # submission -> [submission start, current run label, run start]
+        self._in_flight: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def submission_started(self, submission: str):
+        with self._lock:
+            self._in_flight[submission] = [time.time(), '', None]
+
+    def run_started(self, submission: str, test: str, mode: str):
+        with self._lock:
+            entry = self._in_flight.get(submission)
+            if entry is not None:
+                entry[1:] = [f"{test}/{mode}", time.time()]
+
+    def run_finished(self, submission: str, error_class: str):
+        with self._lock:
+            if error_class == 'timeout':
+                self.timeouts += 1
+            entry = self._in_flight.get(submission)
+            if entry is not None:
+                entry[1:] = ['', None]
+
+    def submission_finished(self, submission: str):
+        with self._lock:
+            self._in_flight.pop(submission, None)
+            self.done += 1
+
+    def snapshot(self) -> Dict:
+        """Current numbers (also the JSON document served over HTTP)"""
+        now = time.time()
+        with self._lock:
+            done, total, timeouts = self.done, self.total, self.timeouts
+            running = [(name, label, now - run_start)
+                       for name, (_, label, run_start) in self._in_flight.items() if run_start is not None]
+            in_flight = len(self._in_flight)
+        elapsed = now - self.started_at
+        per_minute = done / elapsed * 60 if elapsed > 0 else 0.0
+        eta = (total - done) / per_minute * 60 if per_minute > 0 else None
+        running.sort(key=lambda run: run[2], reverse=True)
+        return {
+            'done': done,
+            'total': total,
+            'per_minute': round(per_minute, 2),
+            'in_flight': in_flight,
+            'timeouts': timeouts,
+            'slowest': [{'submission': name, 'run': label, 'seconds': round(seconds, 1)}
+                        for name, label, seconds in running[:self.slowest_count]],
+            'elapsed_s': round(elapsed, 1),
+            'eta_s': round(eta, 1) if eta is not None else None,
+            'eta_clock': time.strftime('%H:%M:%S', time.localtime(now + eta)) if eta is not None else None,
+        }
+
+    def status_line(self) -> str:
+        snap = self.snapshot()
+        line = (f"[{snap['done']}/{snap['total']}] {snap['per_minute']:.1f}/min, "
+                f"{snap['in_flight']} in flight, {snap['timeouts']} timeouts")
+        if snap['eta_s'] is not None:
+            line += f", ETA {snap['eta_clock']} ({snap['eta_s'] / 60:.1f} min)"
+        if snap['slowest']:
+            line += " | slowest: " + ", ".join(f"{run['submission']} {run['run']} {run['seconds']:.0f}s"
+                                               for run in snap['slowest'])
+        return line
+
+    def show_status(self, stream=None, interval: float = 0.5):
+        """Redraw the status line on a terminal (no-op if the stream isn't a TTY)"""
+        stream = stream or sys.stderr
+        if not stream.isatty():
+            return
+
+        def redraw():
+            while not self._stop.wait(interval):
+                stream.write("\r\x1b[K" + self.status_line())
+                stream.flush()
+            stream.write("\r\x1b[K")
+            stream.flush()
+
+        thread = threading.Thread(target=redraw, name='progress-status', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serve snapshot() as JSON on http://host:port/"""
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(tracker.snapshot()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name='progress-http', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=2)
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Normalized results store for the RPAL grader
+One row per submission x test x mode in SQLite, indexed for cohort analytics
+across grading runs (semesters, grader versions)
+"""
+
+import sqlite3
+import sys
+import threading
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from grading_records import CapturedOutput, ModeResult, TestResult, SubmissionResult
+
+# Score columns are left untyped so ints and floats round-trip exactly into the CSV
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT,
+    workspace TEXT,
+    grader_version TEXT,
+    points_per_mode REAL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    run_id INTEGER NOT NULL,
+    test TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (run_id, test)
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    run_id INTEGER NOT NULL,
+    submission TEXT NOT NULL,
+    has_makefile TEXT,
+    has_program_file TEXT,
+    execution_method TEXT,
+    makefile_location TEXT,
+    program_file_location TEXT,
+    algorithm_score,
+    comments_score,
+    report_score,
+    total_score,
+    notes TEXT,
+    PRIMARY KEY (run_id, submission)
+);
+CREATE TABLE IF NOT EXISTS mode_results (
+    run_id INTEGER NOT NULL,
+    submission TEXT NOT NULL,
+    test TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    score,
+    similarity REAL,
+    error_class TEXT,
+    error TEXT,
+    duration_s REAL,
+    PRIMARY KEY (run_id, submission, test, mode)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    run_id INTEGER NOT NULL,
+    submission TEXT NOT NULL,
+    test TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    return_code INTEGER,
+    stdout TEXT,
+    stderr TEXT,
+    stdout_blob TEXT,
+    stderr_blob TEXT,
+    PRIMARY KEY (run_id, submission, test, mode)
+);
+CREATE TABLE IF NOT EXISTS watch_index (
+    run_id INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    signature TEXT,
+    PRIMARY KEY (run_id, entry)
+);
+CREATE INDEX IF NOT EXISTS idx_mode_results_test ON mode_results (test, mode, run_id);
+CREATE INDEX IF NOT EXISTS idx_mode_results_class ON mode_results (error_class, run_id);
+CREATE INDEX IF NOT EXISTS idx_submissions_name ON submissions (submission, run_id);
+"""
+
+
+class ResultsStore:
+    def __init__(self, db_path: str):
+        """
+        Open (or create) a results database
+
+        Args:
+            db_path: Path to the SQLite file, or ":memory:"
+        """
+        self.db_path = str(db_path)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def begin_run(self, workspace: str, test_names: List[str], points_per_mode: float,
+                  grader_version: str = '', label: str = '') -> int:
+        """Register a grading run and its test order, returns the run id"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (label, workspace, grader_version, points_per_mode, started_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (label, str(workspace), grader_version, points_per_mode, datetime.now().isoformat(timespec='seconds'))
+            )
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO tests (run_id, test, position) VALUES (?, ?, ?)",
+                [(run_id, name, i) for i, name in enumerate(test_names)]
+            )
+        return run_id
+
+    def finish_run(self, run_id: int):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?",
+                              (datetime.now().isoformat(timespec='seconds'), run_id))
+
+    def latest_run(self) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def find_run(self, workspace: str, label: str = '') -> Optional[int]:
+        """Most recent run for a workspace and label, used to resume watch mode"""
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs WHERE workspace = ? AND label = ?",
+                                (str(workspace), label)).fetchone()
+        return row[0]
+
+    def watch_index(self, run_id: int) -> Dict[str, str]:
+        """Signatures of the submission folders/archives last graded in a run"""
+        rows = self.conn.execute("SELECT entry, signature FROM watch_index WHERE run_id = ?", (run_id,))
+        return {row['entry']: row['signature'] for row in rows}
+
+    def set_watch_signature(self, run_id: int, entry: str, signature: str):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO watch_index VALUES (?, ?, ?)", (run_id, entry, signature))
+
+    def delete_submission(self, run_id: int, submission: str):
+        with self.lock, self.conn:
+            for table in ('mode_results', 'outputs', 'submissions'):
+                self.conn.execute(f"DELETE FROM {table} WHERE run_id = ? AND submission = ?", (run_id, submission))
+            self.conn.execute("DELETE FROM watch_index WHERE run_id = ? AND entry = ?", (run_id, submission))
+
+    def record_submission(self, run_id: int, result: SubmissionResult):
+        """
+        Insert or replace one graded submission
+        Captured outputs (if kept) are stored too, so the run can be rescored later;
+        a mode that reused another mode's run (ST copying AST) has no outputs of its own
+        """
+        submission = result.submission
+        mode_rows = [
+            (run_id, submission, test_name, mode, mode_result.score, mode_result.similarity,
+             mode_result.error_class, mode_result.error, mode_result.duration)
+            for test_name, test_result in result.tests.items()
+            for mode, mode_result in test_result.modes.items()
+        ]
+        output_rows = []
+        for test_name, test_result in result.tests.items():
+            seen = set()
+            for mode, mode_result in test_result.modes.items():
+                if mode_result.stdout is None or id(mode_result.stdout) in seen:
+                    continue
+                seen.add(id(mode_result.stdout))
+                output_rows.append((run_id, submission, test_name, mode, mode_result.return_code)
+                                   + self._output_columns(mode_result.stdout, mode_result.stderr))
+
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM mode_results WHERE run_id = ? AND submission = ?", (run_id, submission))
+            self.conn.execute("DELETE FROM outputs WHERE run_id = ? AND submission = ?", (run_id, submission))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, submission, result.has_makefile, result.has_program_file, result.execution_method,
+                 result.makefile_location, result.program_file_location, result.algorithm_score,
+                 result.comments_score, result.report_score, result.total_score, "\n".join(result.notes))
+            )
+            self.conn.executemany("INSERT INTO mode_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", mode_rows)
+            self.conn.executemany("INSERT INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", output_rows)
+
+    @staticmethod
+    def _output_columns(stdout: CapturedOutput, stderr: Optional[CapturedOutput]) -> Tuple:
+        """(stdout, stderr, stdout_blob, stderr_blob): spilled outputs are referenced, not copied"""
+        columns = []
+        for output in (stdout, stderr):
+            if output is None:
+                columns.append((None, None))
+            elif output.is_spilled:
+                columns.append((None, str(output.blob_path)))
+            else:
+                columns.append((output.text, None))
+        return columns[0][0], columns[1][0], columns[0][1], columns[1][1]
+
+    def has_outputs(self, run_id: int) -> bool:
+        return self.conn.execute("SELECT 1 FROM outputs WHERE run_id = ? LIMIT 1", (run_id,)).fetchone() is not None
+
+    def outputs(self, run_id: int, submission: str) -> Dict[Tuple[str, str], Tuple[Optional[int], str, str]]:
+        """Recorded (return code, stdout, stderr) of one submission, keyed by (test, mode)"""
+        def text(inline: Optional[str], blob: Optional[str]) -> str:
+            return CapturedOutput(blob_path=Path(blob)).text if blob else (inline or '')
+
+        return {
+            (row['test'], row['mode']): (row['return_code'], text(row['stdout'], row['stdout_blob']),
+                                         text(row['stderr'], row['stderr_blob']))
+            for row in self.conn.execute("SELECT * FROM outputs WHERE run_id = ? AND submission = ?",
+                                         (run_id, submission))
+        }
+
+    def copy_outputs(self, source_run_id: int, run_id: int):
+        """Carry a run's recorded outputs over to another run (e.g. a rescore of it)"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outputs SELECT ?, submission, test, mode, return_code, stdout, stderr, "
+                "stdout_blob, stderr_blob FROM outputs WHERE run_id = ?", (run_id, source_run_id))
+
+    def test_names(self, run_id: int) -> List[str]:
+        rows = self.conn.execute("SELECT test FROM tests WHERE run_id = ? ORDER BY position", (run_id,))
+        return [row['test'] for row in rows]
+
+    def iter_results(self, run_id: int, with_tests: bool = True) -> Iterator[SubmissionResult]:
+        """
+        Stream the SubmissionResults of a run, sorted by submission
+        Only one submission's test rows are held in memory at a time
+        """
+        submissions = self.conn.execute(
+            "SELECT * FROM submissions WHERE run_id = ? ORDER BY submission", (run_id,)).fetchall()
+        for row in submissions:
+            result = SubmissionResult(
+                row['submission'], row['algorithm_score'], row['comments_score'], row['report_score'],
+                row['total_score'], notes=row['notes'].split("\n") if row['notes'] else [],
+                has_makefile=row['has_makefile'], has_program_file=row['has_program_file'],
+                execution_method=row['execution_method'], makefile_location=row['makefile_location'],
+                program_file_location=row['program_file_location']
+            )
+            if with_tests:
+                for mode_row in self.conn.execute(
+                        "SELECT * FROM mode_results WHERE run_id = ? AND submission = ?", (run_id, row['submission'])):
+                    test_result = result.tests.get(mode_row['test'])
+                    if test_result is None:
+                        test_result = result.tests[mode_row['test']] = TestResult(mode_row['test'])
+                    test_result.modes[mode_row['mode']] = ModeResult(
+                        score=mode_row['score'], similarity=mode_row['similarity'], error=mode_row['error'],
+                        error_class=mode_row['error_class'], duration=mode_row['duration_s']
+                    )
+            yield result
+
+    def load_results(self, run_id: int) -> List[SubmissionResult]:
+        return list(self.iter_results(run_id))
+
+    def pass_rates(self, run_ids: Optional[List[int]] = None) -> List[sqlite3.Row]:
+        """Per run/test/mode submission count, pass rate and mean score"""
+        query = ("SELECT run_id, test, mode, COUNT(*) AS submissions, "
+                 "AVG(error_class = 'pass') AS pass_rate, AVG(score) AS mean_score, "
+                 "AVG(duration_s) AS mean_duration_s "
+                 "FROM mode_results")
+        params: Tuple = ()
+        if run_ids:
+            query += f" WHERE run_id IN ({','.join('?' * len(run_ids))})"
+            params = tuple(run_ids)
+        query += " GROUP BY run_id, test, mode ORDER BY run_id, test, mode"
+        return self.conn.execute(query, params).fetchall()
+
+    def score_distribution(self, run_id: int, bucket: float = 10.0) -> List[sqlite3.Row]:
+        """Histogram of algorithm scores in buckets of `bucket` points"""
+        return self.conn.execute(
+            "SELECT CAST(algorithm_score / ? AS INTEGER) * ? AS bucket_start, COUNT(*) AS submissions "
+            "FROM submissions WHERE run_id = ? GROUP BY bucket_start ORDER BY bucket_start",
+            (bucket, bucket, run_id)
+        ).fetchall()
+
+    def error_classes(self, run_id: int) -> List[sqlite3.Row]:
+        return self.conn.execute(
+            "SELECT test, mode, error_class, COUNT(*) AS count FROM mode_results WHERE run_id = ? "
+            "GROUP BY test, mode, error_class ORDER BY test, mode, count DESC",
+            (run_id,)
+        ).fetchall()
+
+    def regressions(self, old_run_id: int, new_run_id: int) -> List[sqlite3.Row]:
+        """Submissions whose algorithm score differs between two runs"""
+        return self.conn.execute(
+            "SELECT new.submission, old.algorithm_score AS old_score, new.algorithm_score AS new_score, "
+            "new.algorithm_score - old.algorithm_score AS delta "
+            "FROM submissions AS new JOIN submissions AS old "
+            "ON old.submission = new.submission AND old.run_id = ? "
+            "WHERE new.run_id = ? AND ABS(new.algorithm_score - old.algorithm_score) > 0.005 "
+            "ORDER BY delta",
+            (old_run_id, new_run_id)
+        ).fetchall()
+
+    def export_parquet(self, output_file: str, run_ids: Optional[List[int]] = None):
+        """Write mode_results (optionally filtered by run) to a Parquet file, requires pyarrow"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        query = "SELECT * FROM mode_results"
+        params: Tuple = ()
+        if run_ids:
+            query += f" WHERE run_id IN ({','.join('?' * len(run_ids))})"
+            params = tuple(run_ids)
+        cursor = self.conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()
+        table = pa.table({name: [row[i] for row in rows] for i, name in enumerate(columns)})
+        pq.write_table(table, output_file)
+
+
+def print_rows(rows: List[sqlite3.Row]):
+    if not rows:
+        print("(no rows)")
+        return
+    print("\t".join(rows[0].keys()))
+    for row in rows:
+        print("\t".join("" if v is None else (f"{v:.3f}" if isinstance(v, float) else str(v)) for v in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the RPAL grader results store")
+    parser.add_argument('db', help="Path to the results database")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    runs = sub.add_parser('runs', help="List grading runs")
+    rates = sub.add_parser('pass-rates', help="Per-test pass rates")
+    rates.add_argument('run_ids', nargs='*', type=int)
+    dist = sub.add_parser('distribution', help="Algorithm score distribution")
+    dist.add_argument('run_id', type=int)
+    classes = sub.add_parser('error-classes', help="Error class counts per test and mode")
+    classes.add_argument('run_id', type=int)
+    reg = sub.add_parser('regressions', help="Score changes between two runs")
+    reg.add_argument('old_run_id', type=int)
+    reg.add_argument('new_run_id', type=int)
+    parquet = sub.add_parser('export-parquet', help="Export per-mode results to Parquet")
+    parquet.add_argument('output_file')
+    parquet.add_argument('run_ids', nargs='*', type=int)
+
+    args = parser.parse_args()
+    if not Path(args.db).exists():
+        print(f"Results database {args.db} not found!")
+        sys.exit(1)
+
+    store = ResultsStore(args.db)
+    if args.command == 'runs':
+        print_rows(store.conn.execute("SELECT * FROM runs ORDER BY run_id").fetchall())
+    elif args.command == 'pass-rates':
+        print_rows(store.pass_rates(args.run_ids))
+    elif args.command == 'distribution':
+        print_rows(store.score_distribution(args.run_id))
+    elif args.command == 'error-classes':
+        print_rows(store.error_classes(args.run_id))
+    elif args.command == 'regressions':
+        print_rows(store.regressions(args.old_run_id, args.new_run_id))
+    elif args.command == 'export-parquet':
+        store.export_parquet(args.output_file, args.run_ids)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
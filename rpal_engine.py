@@ -0,0 +1,734 @@
+#!/usr/bin/env python3
+"""
+Reference RPAL implementation for the RPAL grader
+Lexer, recursive-descent parser, standardizer and CSE machine in pure Python,
+used to (re)generate expected outputs in-process. Trees are printed in the
+dotted format of test_cases/*ast.txt, one node per line:
+
+    let
+    .=
+    ..<ID:a>
+    ..<STR:'abc'>
+    .gamma
+    ..<ID:Print>
+    ..<ID:a>
+
+Also usable like a submission: python3 rpal_engine.py [-ast|-st] <file>
+"""
+
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+class RPALError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------- lexer
+
+KEYWORDS = frozenset(['let', 'in', 'fn', 'where', 'aug', 'or', 'not', 'gr', 'ge', 'ls', 'le', 'eq', 'ne',
+                      'true', 'false', 'nil', 'dummy', 'within', 'and', 'rec'])
+
+_TOKEN_RE = re.compile(r"""
+     (?P<space>\s+)
+    |(?P<comment>//[^\n]*)
+    |(?P<id>[A-Za-z][A-Za-z0-9_]*)
+    |(?P<int>[0-9]+)
+    |(?P<str>'(?:\\.|[^'\\])*')
+    |(?P<op>[-+*<>&.@/:=~|$!\#%^_\[\]{}"`?]+)
+    |(?P<punct>[();,])
+""", re.VERBOSE)
+
+
+def tokenize(source: str) -> List[Tuple[str, str]]:
+    """(kind, text) tokens; kind is id, key, int, str, op or punct"""
+    tokens = []
+    position = 0
+    match_token = _TOKEN_RE.match
+    while position < len(source):
+        match = match_token(source, position)
+        if match is None:
+            line = source.count('\n', 0, position) + 1
+            raise RPALError(f"Unexpected character {source[position]!r} on line {line}")
+        kind = match.lastgroup
+        text = match.group()
+        position = match.end()
+        if kind in ('space', 'comment'):
+            continue
+        if kind == 'id' and text in KEYWORDS:
+            kind = 'key'
+        tokens.append((kind, text))
+    tokens.append(('end', ''))
+    return tokens
+
+
+# ---------------------------------------------------------------- trees
+
+# Leaf kinds printed as <...>; everything else prints as its kind
+_LEAF_LABELS = {'true': '<true>', 'false': '<false>', 'nil': '<nil>', 'dummy': '<dummy>', 'Y*': '<Y*>'}
+
+
+class Node:
+    __slots__ = ('kind', 'children', 'value')
+
+    def __init__(self, kind: str, children: Optional[List['Node']] = None, value: Optional[str] = None):
+        self.kind = kind
+        self.children = children if children is not None else []
+        self.value = value
+
+    @property
+    def label(self) -> str:
+        if self.kind == 'id':
+            return f"<ID:{self.value}>"
+        if self.kind == 'int':
+            return f"<INT:{self.value}>"
+        if self.kind == 'str':
+            return f"<STR:{self.value}>"
+        return _LEAF_LABELS.get(self.kind, self.kind)
+
+
+def format_tree(node: Node) -> str:
+    """Dotted pre-order listing, one node per line with a trailing space like the reference interpreter"""
+    lines = []
+    pending = [(node, 0)]
+    while pending:
+        current, depth = pending.pop()
+        lines.append('.' * depth + current.label + ' ')
+        pending.extend((child, depth + 1) for child in reversed(current.children))
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------- parser
+
+_COMPARISONS = {'gr': 'gr', '>': 'gr', 'ge': 'ge', '>=': 'ge', 'ls': 'ls', '<': 'ls',
+                'le': 'le', '<=': 'le', 'eq': 'eq', 'ne': 'ne'}
+_RN_KEYWORDS = ('true', 'false', 'nil', 'dummy')
+
+
+class Parser:
+    """Recursive descent over the RPAL phrase-structure grammar, building the AST"""
+
+    def __init__(self, source: str):
+        self.tokens = tokenize(source)
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        return self.tokens[min(self.position + offset, len(self.tokens) - 1)]
+
+    def at(self, kind: str, text: Optional[str] = None) -> bool:
+        token_kind, token_text = self.tokens[self.position]
+        return token_kind == kind and (text is None or token_text == text)
+
+    def expect(self, kind: str, text: Optional[str] = None) -> str:
+        if not self.at(kind, text):
+            found = self.tokens[self.position][1] or 'end of input'
+            raise RPALError(f"Expected {text or kind} but found '{found}'")
+        token = self.tokens[self.position][1]
+        self.position += 1
+        return token
+
+    def parse(self) -> Node:
+        tree = self.E()
+        if not self.at('end'):
+            raise RPALError(f"Unexpected '{self.peek()[1]}' after the end of the program")
+        return tree
+
+    # Expressions
+    def E(self) -> Node:
+        if self.at('key', 'let'):
+            self.position += 1
+            definition = self.D()
+            self.expect('key', 'in')
+            return Node('let', [definition, self.E()])
+        if self.at('key', 'fn'):
+            self.position += 1
+            variables = [self.Vb()]
+            while self.at('id') or self.at('punct', '('):
+                variables.append(self.Vb())
+            self.expect('op', '.')
+            return Node('lambda', variables + [self.E()])
+        return self.Ew()
+
+    def Ew(self) -> Node:
+        tree = self.T()
+        if self.at('key', 'where'):
+            self.position += 1
+            return Node('where', [tree, self.Dr()])
+        return tree
+
+    # Tuple expressions
+    def T(self) -> Node:
+        tree = self.Ta()
+        if not self.at('punct', ','):
+            return tree
+        items = [tree]
+        while self.at('punct', ','):
+            self.position += 1
+            items.append(self.Ta())
+        return Node('tau', items)
+
+    def Ta(self) -> Node:
+        tree = self.Tc()
+        while self.at('key', 'aug'):
+            self.position += 1
+            tree = Node('aug', [tree, self.Tc()])
+        return tree
+
+    def Tc(self) -> Node:
+        tree = self.B()
+        if self.at('op', '->'):
+            self.position += 1
+            then_branch = self.Tc()
+            self.expect('op', '|')
+            return Node('->', [tree, then_branch, self.Tc()])
+        return tree
+
+    # Boolean expressions
+    def B(self) -> Node:
+        tree = self.Bt()
+        while self.at('key', 'or'):
+            self.position += 1
+            tree = Node('or', [tree, self.Bt()])
+        return tree
+
+    def Bt(self) -> Node:
+        tree = self.Bs()
+        while self.at('op', '&'):
+            self.position += 1
+            tree = Node('&', [tree, self.Bs()])
+        return tree
+
+    def Bs(self) -> Node:
+        if self.at('key', 'not'):
+            self.position += 1
+            return Node('not', [self.Bp()])
+        return self.Bp()
+
+    def Bp(self) -> Node:
+        tree = self.A()
+        kind, text = self.peek()
+        if kind in ('key', 'op') and text in _COMPARISONS:
+            self.position += 1
+            return Node(_COMPARISONS[text], [tree, self.A()])
+        return tree
+
+    # Arithmetic expressions
+    def A(self) -> Node:
+        if self.at('op', '+'):
+            self.position += 1
+            tree = self.At()
+        elif self.at('op', '-'):
+            self.position += 1
+            tree = Node('neg', [self.At()])
+        else:
+            tree = self.At()
+        while self.at('op', '+') or self.at('op', '-'):
+            operator = self.expect('op')
+            tree = Node(operator, [tree, self.At()])
+        return tree
+
+    def At(self) -> Node:
+        tree = self.Af()
+        while self.at('op', '*') or self.at('op', '/'):
+            operator = self.expect('op')
+            tree = Node(operator, [tree, self.Af()])
+        return tree
+
+    def Af(self) -> Node:
+        tree = self.Ap()
+        if self.at('op', '**'):
+            self.position += 1
+            return Node('**', [tree, self.Af()])
+        return tree
+
+    def Ap(self) -> Node:
+        tree = self.R()
+        while self.at('op', '@'):
+            self.position += 1
+            name = Node('id', value=self.expect('id'))
+            tree = Node('@', [tree, name, self.R()])
+        return tree
+
+    # Rators and rands
+    def starts_rn(self) -> bool:
+        kind, text = self.peek()
+        return kind in ('id', 'int', 'str') or (kind == 'key' and text in _RN_KEYWORDS) or \
+            (kind == 'punct' and text == '(')
+
+    def R(self) -> Node:
+        tree = self.Rn()
+        while self.starts_rn():
+            tree = Node('gamma', [tree, self.Rn()])
+        return tree
+
+    def Rn(self) -> Node:
+        kind, text = self.peek()
+        if kind in ('id', 'int', 'str'):
+            self.position += 1
+            return Node(kind, value=text)
+        if kind == 'key' and text in _RN_KEYWORDS:
+            self.position += 1
+            return Node(text)
+        if kind == 'punct' and text == '(':
+            self.position += 1
+            tree = self.E()
+            self.expect('punct', ')')
+            return tree
+        raise RPALError(f"Expected an operand but found '{text or 'end of input'}'")
+
+    # Definitions
+    def D(self) -> Node:
+        tree = self.Da()
+        if self.at('key', 'within'):
+            self.position += 1
+            return Node('within', [tree, self.D()])
+        return tree
+
+    def Da(self) -> Node:
+        tree = self.Dr()
+        if not self.at('key', 'and'):
+            return tree
+        items = [tree]
+        while self.at('key', 'and'):
+            self.position += 1
+            items.append(self.Dr())
+        return Node('and', items)
+
+    def Dr(self) -> Node:
+        if self.at('key', 'rec'):
+            self.position += 1
+            return Node('rec', [self.Db()])
+        return self.Db()
+
+    def Db(self) -> Node:
+        if self.at('punct', '('):
+            self.position += 1
+            tree = self.D()
+            self.expect('punct', ')')
+            return tree
+        if self.at('id'):
+            following = self.peek(1)
+            if following == ('punct', ',') or following == ('op', '='):
+                variables = self.Vl()
+                self.expect('op', '=')
+                return Node('=', [variables, self.E()])
+            name = Node('id', value=self.expect('id'))
+            variables = [self.Vb()]
+            while not self.at('op', '='):
+                variables.append(self.Vb())
+            self.expect('op', '=')
+            return Node('function_form', [name] + variables + [self.E()])
+        raise RPALError(f"Expected a definition but found '{self.peek()[1] or 'end of input'}'")
+
+    # Variables
+    def Vb(self) -> Node:
+        if self.at('id'):
+            return Node('id', value=self.expect('id'))
+        self.expect('punct', '(')
+        if self.at('punct', ')'):
+            self.position += 1
+            return Node('()')
+        tree = self.Vl()
+        self.expect('punct', ')')
+        return tree
+
+    def Vl(self) -> Node:
+        names = [Node('id', value=self.expect('id'))]
+        while self.at('punct', ','):
+            self.position += 1
+            names.append(Node('id', value=self.expect('id')))
+        return names[0] if len(names) == 1 else Node(',', names)
+
+
+def parse(source: str) -> Node:
+    return Parser(source).parse()
+
+
+# ---------------------------------------------------------------- standardizer
+
+def _lambda_chain(variables: List[Node], body: Node) -> Node:
+    for variable in reversed(variables):
+        body = Node('lambda', [variable, body])
+    return body
+
+
+def _definition(node: Node) -> Tuple[Node, Node]:
+    if node.kind != '=':
+        raise RPALError(f"Expected a definition, found '{node.label}'")
+    return node.children[0], node.children[1]
+
+
+def standardize(node: Node) -> Node:
+    """Standardized tree (let/where/fn/within/and/rec/@ rewritten to lambda, gamma, tau and Y*)"""
+    children = [standardize(child) for child in node.children]
+    kind = node.kind
+    if kind in ('let', 'where'):
+        definition, body = (children[0], children[1]) if kind == 'let' else (children[1], children[0])
+        name, value = _definition(definition)
+        return Node('gamma', [Node('lambda', [name, body]), value])
+    if kind == 'function_form':
+        return Node('=', [children[0], _lambda_chain(children[1:-1], children[-1])])
+    if kind == 'lambda':
+        return _lambda_chain(children[:-1], children[-1])
+    if kind == 'within':
+        inner_name, inner_value = _definition(children[0])
+        name, value = _definition(children[1])
+        return Node('=', [name, Node('gamma', [Node('lambda', [inner_name, value]), inner_value])])
+    if kind == 'and':
+        definitions = [_definition(child) for child in children]
+        return Node('=', [Node(',', [name for name, _ in definitions]),
+                          Node('tau', [value for _, value in definitions])])
+    if kind == 'rec':
+        name, value = _definition(children[0])
+        return Node('=', [name, Node('gamma', [Node('Y*'), Node('lambda', [name, value])])])
+    if kind == '@':
+        return Node('gamma', [Node('gamma', [children[1], children[0]]), children[2]])
+    return Node(kind, children, node.value)
+
+
+# ---------------------------------------------------------------- CSE machine
+
+class Dummy:
+    def __repr__(self):
+        return 'dummy'
+
+
+DUMMY = Dummy()
+YSTAR = object()
+
+
+class Closure:
+    __slots__ = ('parameter', 'body', 'env')
+
+    def __init__(self, parameter: Node, body: int, env: 'Env'):
+        self.parameter = parameter
+        self.body = body
+        self.env = env
+
+
+class Eta:
+    __slots__ = ('closure',)
+
+    def __init__(self, closure: Closure):
+        self.closure = closure
+
+
+class Env:
+    __slots__ = ('names', 'parent')
+
+    def __init__(self, names: Dict, parent: Optional['Env']):
+        self.names = names
+        self.parent = parent
+
+
+class Builtin:
+    __slots__ = ('name', 'arity', 'args')
+
+    def __init__(self, name: str, arity: int = 1, args: Tuple = ()):
+        self.name = name
+        self.arity = arity
+        self.args = args
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r"\\(.)", lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)), literal[1:-1])
+
+
+def format_value(value) -> str:
+    """Value as Print shows it"""
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, tuple):
+        return '(' + ', '.join(format_value(item) for item in value) + ')' if value else 'nil'
+    if isinstance(value, Closure):
+        parameter = value.parameter
+        names = [parameter.value] if parameter.kind == 'id' else [child.value for child in parameter.children]
+        return f"[lambda closure: {', '.join(names)}: {value.body}]"
+    if isinstance(value, Eta):
+        return '[eta closure]'
+    if isinstance(value, Builtin):
+        return f"[builtin: {value.name}]"
+    return str(value)
+
+
+def _is_int(value) -> bool:
+    return type(value) is int
+
+
+def _type_name(value) -> str:
+    if isinstance(value, bool):
+        return 'truthvalue'
+    if _is_int(value):
+        return 'integer'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, tuple):
+        return 'tuple'
+    return 'function' if isinstance(value, (Closure, Eta, Builtin)) else 'dummy'
+
+
+def _integers(operator: str, left, right):
+    if not (_is_int(left) and _is_int(right)):
+        raise RPALError(f"'{operator}' needs integers, got {_type_name(left)} and {_type_name(right)}")
+
+
+def _binary(operator: str, left, right):
+    if operator in ('eq', 'ne'):
+        if _type_name(left) != _type_name(right) or _type_name(left) not in ('integer', 'string', 'truthvalue'):
+            raise RPALError(f"Can't compare {_type_name(left)} with {_type_name(right)}")
+        return (left == right) == (operator == 'eq')
+    if operator in ('or', '&'):
+        if not (isinstance(left, bool) and isinstance(right, bool)):
+            raise RPALError(f"'{operator}' needs truth values")
+        return (left or right) if operator == 'or' else (left and right)
+    if operator == 'aug':
+        if not isinstance(left, tuple):
+            raise RPALError(f"'aug' needs a tuple on the left, got {_type_name(left)}")
+        return left + (right,)
+    _integers(operator, left, right)
+    if operator == '+':
+        return left + right
+    if operator == '-':
+        return left - right
+    if operator == '*':
+        return left * right
+    if operator == '/':
+        if right == 0:
+            raise RPALError("Division by zero")
+        quotient = abs(left) // abs(right)
+        return quotient if (left >= 0) == (right >= 0) else -quotient
+    if operator == '**':
+        if right < 0:
+            return 0 if abs(left) != 1 else left ** right
+        return left ** right
+    if operator == 'gr':
+        return left > right
+    if operator == 'ge':
+        return left >= right
+    if operator == 'ls':
+        return left < right
+    if operator == 'le':
+        return left <= right
+    raise RPALError(f"Unknown operator '{operator}'")
+
+
+_BINARY = frozenset(['+', '-', '*', '/', '**', 'gr', 'ge', 'ls', 'le', 'eq', 'ne', 'or', '&', 'aug'])
+_BUILTINS = {'Print': 1, 'print': 1, 'Isinteger': 1, 'Istruthvalue': 1, 'Isstring': 1, 'Istuple': 1,
+             'Isfunction': 1, 'Isdummy': 1, 'Stem': 1, 'Stern': 1, 'Conc': 2, 'conc': 2, 'Order': 1,
+             'Null': 1, 'ItoS': 1}
+
+
+class CSEMachine:
+    def __init__(self, tree: Node):
+        """Compile a standardized tree into control structures (deltas)"""
+        self.deltas: List[List[Tuple]] = []
+        self.output: List[str] = []
+        self.steps = 0
+        self._compile(tree)
+
+    def _compile(self, root: Node) -> int:
+        index = len(self.deltas)
+        delta: List[Tuple] = []
+        self.deltas.append(delta)
+        self._emit(root, delta)
+        return index
+
+    def _emit(self, node: Node, delta: List[Tuple]):
+        kind = node.kind
+        children = node.children
+        if kind == 'lambda':
+            delta.append(('lambda', children[0], self._compile(children[1])))
+        elif kind == '->':
+            delta.append(('beta', self._compile(children[1]), self._compile(children[2])))
+            self._emit(children[0], delta)
+        elif kind == 'gamma':
+            delta.append(('gamma',))
+            self._emit(children[0], delta)
+            self._emit(children[1], delta)
+        elif kind == 'tau':
+            delta.append(('tau', len(children)))
+            for child in children:
+                self._emit(child, delta)
+        elif kind in _BINARY:
+            delta.append(('binary', kind))
+            self._emit(children[0], delta)
+            self._emit(children[1], delta)
+        elif kind in ('not', 'neg'):
+            delta.append(('unary', kind))
+            self._emit(children[0], delta)
+        elif kind == 'id':
+            delta.append(('name', node.value))
+        elif kind == 'int':
+            delta.append(('value', int(node.value)))
+        elif kind == 'str':
+            delta.append(('value', _unescape(node.value)))
+        elif kind in ('true', 'false'):
+            delta.append(('value', kind == 'true'))
+        elif kind == 'nil':
+            delta.append(('value', ()))
+        elif kind == 'dummy':
+            delta.append(('value', DUMMY))
+        elif kind == 'Y*':
+            delta.append(('value', YSTAR))
+        else:
+            raise RPALError(f"Can't evaluate '{node.label}'")
+
+    def _bind(self, parameter: Node, value) -> Dict:
+        if parameter.kind == 'id':
+            return {parameter.value: value}
+        if parameter.kind == '()':
+            return {}
+        names = [child.value for child in parameter.children]
+        if not isinstance(value, tuple) or len(value) != len(names):
+            raise RPALError(f"Expected a tuple of {len(names)} values for ({', '.join(names)})")
+        return dict(zip(names, value))
+
+    def _call_builtin(self, builtin: Builtin, argument):
+        args = builtin.args + (argument,)
+        if len(args) < builtin.arity:
+            return Builtin(builtin.name, builtin.arity, args)
+        name = builtin.name
+        value = args[0]
+        if name in ('Print', 'print'):
+            self.output.append(format_value(value))
+            return DUMMY
+        if name == 'Isinteger':
+            return _is_int(value)
+        if name == 'Istruthvalue':
+            return isinstance(value, bool)
+        if name == 'Isstring':
+            return isinstance(value, str)
+        if name == 'Istuple':
+            return isinstance(value, tuple)
+        if name == 'Isfunction':
+            return isinstance(value, (Closure, Eta, Builtin))
+        if name == 'Isdummy':
+            return value is DUMMY
+        if name == 'Order':
+            if not isinstance(value, tuple):
+                raise RPALError(f"Order needs a tuple, got {_type_name(value)}")
+            return len(value)
+        if name == 'Null':
+            return value == ()
+        if name == 'ItoS':
+            if not _is_int(value):
+                raise RPALError(f"ItoS needs an integer, got {_type_name(value)}")
+            return str(value)
+        if not all(isinstance(arg, str) for arg in args):
+            raise RPALError(f"{name} needs strings")
+        if name == 'Stem':
+            return value[:1]
+        if name == 'Stern':
+            return value[1:]
+        return args[0] + args[1]
+
+    def run(self) -> str:
+        """Evaluate the program, returning everything it printed"""
+        deltas = self.deltas
+        control = list(deltas[0])
+        stack = []
+        env = Env({}, None)
+        pop, push = stack.pop, stack.append
+        steps = 0
+        while control:
+            steps += 1
+            item = control.pop()
+            op = item[0]
+            if op == 'name':
+                name = item[1]
+                scope = env
+                while scope is not None and name not in scope.names:
+                    scope = scope.parent
+                if scope is not None:
+                    push(scope.names[name])
+                elif name in _BUILTINS:
+                    push(Builtin(name, _BUILTINS[name]))
+                else:
+                    raise RPALError(f"Undeclared identifier '{name}'")
+            elif op == 'value':
+                push(item[1])
+            elif op == 'gamma':
+                rator = pop()
+                rand = pop()
+                if isinstance(rator, Closure):
+                    control.append(('env', env))
+                    env = Env(self._bind(rator.parameter, rand), rator.env)
+                    control.extend(deltas[rator.body])
+                elif isinstance(rator, Builtin):
+                    push(self._call_builtin(rator, rand))
+                elif isinstance(rator, tuple):
+                    if not _is_int(rand) or not 1 <= rand <= len(rator):
+                        raise RPALError(f"Tuple index {format_value(rand)} out of range 1..{len(rator)}")
+                    push(rator[rand - 1])
+                elif isinstance(rator, Eta):
+                    push(rand)
+                    push(rator)
+                    push(rator.closure)
+                    control.append(('gamma',))
+                    control.append(('gamma',))
+                elif rator is YSTAR:
+                    if not isinstance(rand, Closure):
+                        raise RPALError("Y* needs a function")
+                    push(Eta(rand))
+                else:
+                    raise RPALError(f"Can't apply a {_type_name(rator)} value")
+            elif op == 'lambda':
+                push(Closure(item[1], item[2], env))
+            elif op == 'env':
+                env = item[1]
+            elif op == 'binary':
+                left = pop()
+                push(_binary(item[1], left, pop()))
+            elif op == 'beta':
+                condition = pop()
+                if not isinstance(condition, bool):
+                    raise RPALError(f"Conditional needs a truth value, got {_type_name(condition)}")
+                control.extend(deltas[item[1] if condition else item[2]])
+            elif op == 'tau':
+                push(tuple(pop() for _ in range(item[1])))
+            elif op == 'unary':
+                value = pop()
+                if item[1] == 'not':
+                    if not isinstance(value, bool):
+                        raise RPALError(f"'not' needs a truth value, got {_type_name(value)}")
+                    push(not value)
+                else:
+                    if not _is_int(value):
+                        raise RPALError(f"'neg' needs an integer, got {_type_name(value)}")
+                    push(-value)
+        self.steps = steps
+        return ''.join(self.output)
+
+
+def run(source: str, mode: str = 'run') -> str:
+    """Output of an RPAL program for a grader mode: 'run', 'ast' or 'st'"""
+    tree = parse(source)
+    if mode == 'ast':
+        return format_tree(tree)
+    standardized = standardize(tree)
+    if mode == 'st':
+        return format_tree(standardized)
+    return CSEMachine(standardized).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    mode = 'ast' if '-ast' in args else 'st' if '-st' in args else 'run'
+    files = [arg for arg in args if arg not in ('-ast', '-st')]
+    if len(files) != 1:
+        print("Usage: rpal_engine.py [-ast|-st] <file>", file=sys.stderr)
+        return 2
+    try:
+        with open(files[0], 'r', encoding='utf-8', errors='ignore') as f:
+            sys.stdout.write(run(f.read(), mode))
+    except RPALError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,43 +8,324 @@ Updated to match specific evaluation requirements
 import os
 import subprocess
 import csv
+import json
 import sys
 import shlex
 from pathlib import Path
 import difflib
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Set, Tuple, Optional, Iterable, Iterator
 import re
 import traceback
+import tempfile
+import argparse
+import time
+import itertools
+import zipfile
+import logging
+import logging.handlers
+import queue
+import contextvars
+import threading
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+
+from extractor import extract_nested_zipfiles
+from grading_records import MODES, BlobStore, ModeResult, TestResult, SubmissionResult
+from results_store import ResultsStore
+from output_normalizer import OutputNormalizer, NormalizedOutput
+from suite_manifest import TestSuite, TestCaseSpec, ManifestError, parse_shard
+from submission_workspace import SubmissionWorkspace
+from program_builder import ProgramBuilder
+from progress import ProgressTracker
+from grading_events import EventBus, JsonLinesSink, load_subscriber
+from output_clusters import cluster_outputs
+from feedback_reports import FORMATS as FEEDBACK_FORMATS, FeedbackRenderer, build_job
+from toolchain import CDS_FLAGS, Toolchains
+from storage_manager import StorageManager, format_size, parse_size
+from admission import AdmissionController, is_resource_failure
+from run_archive import RunArchiveWriter, suite_hashes
+from entry_points import ENTRY_SIGNAL, EntryPointCache, probe_candidates, rank_candidates, submission_key
+from performance_tier import (DEFAULT_WEIGHTS, SCALED_PROGRAMS, adjusted_score, apply_weights, generate_variants,
+                              profile_program, reference_complexity)
+import rpal_engine
+
+__version__ = "2.1.0"
+
+logger = logging.getLogger("rpal_grader")
+logger.addHandler(logging.NullHandler())
+
+# Submission currently being graded in this thread, stamped onto log records
+current_submission: contextvars.ContextVar = contextvars.ContextVar('current_submission', default='-')
+
+# Staged workspace of the submission being graded in this thread (None when staging is off)
+current_workspace: contextvars.ContextVar = contextvars.ContextVar('current_workspace', default=None)
+
+# stderr of a JVM that never got to run the program (bad or unsupported flags, archive errors)
+JVM_START_FAILURE_RE = re.compile(r'Could not create the Java Virtual Machine|Error occurred during initialization '
+                                  r'of VM|Unrecognized (?:VM )?option|An error has occurred while processing '
+                                  r'the shared archive file')
+
+# Header the batch protocol expects before each input's output, e.g. "==> /path/t9input.txt <=="
+BATCH_HEADER_RE = re.compile(r'^==> (.+) <==[ \t]*$', re.MULTILINE)
+
+def clip(text: str, limit: int) -> str:
+    """Shorten text for log output, noting how much was cut"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class SubmissionContextFilter(logging.Filter):
+    """Attach the current submission name to each record"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.submission = current_submission.get()
+        return True
+
+
+class PerSubmissionFileHandler(logging.Handler):
+    """
+    Write records to <log_dir>/<submission>.log through buffered file objects
+    Only the most recently used files are kept open
+    """
+    def __init__(self, log_dir: Path, max_open: int = 32, buffer_size: int = 64 * 1024):
+        super().__init__()
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_open = max_open
+        self.buffer_size = buffer_size
+        self.files: OrderedDict = OrderedDict()
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            name = getattr(record, 'submission', '-')
+            f = self.files.pop(name, None)
+            if f is None:
+                filename = 'grader' if name == '-' else re.sub(r'[^\w.-]', '_', name)
+                f = open(self.log_dir / f"{filename}.log", 'a', encoding='utf-8', buffering=self.buffer_size)
+                if len(self.files) >= self.max_open:
+                    self.files.popitem(last=False)[1].close()
+            self.files[name] = f
+            f.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+    
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        super().close()
+
+
+class ThreadLocalStdout:
+    """
+    sys.stdout proxy that lets worker threads buffer their prints and emit them in one piece
+    Threads that are not capturing write straight through
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+    
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(text)
+        with self.lock:
+            return self.stream.write(text)
+    
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+    
+    @contextmanager
+    def capture(self):
+        self.local.buffer = io.StringIO()
+        try:
+            yield
+        finally:
+            text = self.local.buffer.getvalue()
+            self.local.buffer = None
+            with self.lock:
+                self.stream.write(text)
+                self.stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def setup_logging(verbose: bool = False, log_dir: Optional[Path] = None) -> Optional[logging.handlers.QueueListener]:
+    """
+    Configure grader logging: warnings on the console (debug with verbose) and, if
+    log_dir is given, full debug logs per submission written from a background thread
+    Returns the queue listener to stop at the end of the run
+    """
+    logger.setLevel(logging.DEBUG if (verbose or log_dir) else logging.WARNING)
+    
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG if verbose else logging.WARNING)
+    console.setFormatter(logging.Formatter("    %(levelname)s - [%(submission)s] %(message)s"))
+    console.addFilter(SubmissionContextFilter())
+    logger.addHandler(console)
+    
+    if not log_dir:
+        return None
+    
+    file_handler = PerSubmissionFileHandler(log_dir)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SubmissionContextFilter())
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    return listener
+
 
 class RPALGrader:
-    def __init__(self, workspace_path: str, rpal_executable: str = "./rpal/rpal.exe"):
+    def __init__(self, workspace_path: str, rpal_executable: str = "./rpal/rpal.exe",
+                 batch_protocol: bool = False, results_db: Optional[str] = None, run_label: str = '',
+                 keep_outputs: bool = False, spill_threshold: int = 64 * 1024, log_output_limit: int = 200,
+                 manifest_path: Optional[str] = None, tests: Optional[List[str]] = None,
+                 shard: Optional[Tuple[int, int]] = None, workers: int = 1,
+                 canary: Optional[str] = None, canary_timeout: float = 5,
+                 stage: bool = True, stage_root: Optional[str] = None,
+                 build_cache: bool = True, build_jobs: Optional[int] = None, opt_level: Optional[str] = None,
+                 compile_timeout: float = 30,
+                 java_cds: bool = False, show_progress: bool = False, progress_port: Optional[int] = None,
+                 storage_budget: Optional[int] = None, adaptive: bool = False,
+                 max_workers: Optional[int] = None, resource_retries: int = 4, probe_candidates: int = 3,
+                 archive: bool = False, storage: Optional[StorageManager] = None,
+                 builder: Optional[ProgramBuilder] = None, blobs: Optional[BlobStore] = None,
+                 toolchains: Optional[Toolchains] = None, entry_points: Optional[EntryPointCache] = None,
+                 admission: Optional[AdmissionController] = None):
         """
         Initialize the RPAL grader
         
         Args:
             workspace_path: Path to grading_workspace
             rpal_executable: Path to RPAL interpreter executable
+            batch_protocol: Try running all inputs through one process per mode first
+            results_db: Path to the SQLite results store (default: <workspace>/grading_results.sqlite3)
+            run_label: Free-form label for this grading run in the store (e.g. semester)
+            keep_outputs: Retain raw stdout/stderr of every run on the result records
+            spill_threshold: Retained outputs above this many bytes are spilled to disk blobs
+            log_output_limit: Max characters of program output echoed into debug logs (0 = no cap)
+            manifest_path: Test-suite manifest (default: test_cases/manifest.json if present, else built-in suite)
+            tests: Only run these test names
+            shard: (index, count) to run only one round-robin shard of the suite
+            workers: Number of submissions graded concurrently
+            canary: Run this test ('' = first suite test) in run mode for everyone before the full suite
+            canary_timeout: Timeout in seconds for canary runs
+            stage: Run each submission from a private staged copy with a scratch folder for builds
+            stage_root: Where staged copies are created (default: /dev/shm if writable, else the temp folder)
+            build_cache: Share compiled objects across submissions via <workspace>/build_cache
+            build_jobs: Translation units compiled in parallel per build (default: CPU count)
+            opt_level: gcc/g++ optimization level, None for the compiler default
+            compile_timeout: Seconds a build may take, independent of the test timeouts
+            java_cds: Amortize JVM startup with a per-build AppCDS archive (see run_java_with_cds)
+            show_progress: Keep a live status line (throughput, in-flight runs, ETA) on the terminal
+            progress_port: Also serve the progress numbers as JSON on http://127.0.0.1:<port>/
+            storage_budget: Bytes the indexed workspace artifacts may use; LRU ones are evicted after grading
+            adaptive: Gate program launches on system load, free memory and child usage (see admission),
+                starting at `workers` concurrent runs
+            max_workers: Ceiling for adaptive concurrency (default: twice the CPU count)
+            resource_retries: Retries for launches that fail for lack of resources (EAGAIN, ENOMEM, ...)
+            probe_candidates: Likely entry points probed with the canary input when a submission has
+                several (see entry_points); below 2 the static ranking decides alone
+            archive: Bundle each run's raw outputs, timings and suite hashes into
+                <workspace>/archives/run_<id>.zip (see run_archive)
+            storage: Shared artifact index to use instead of the workspace's own (see batch_grading)
+            builder: Shared ProgramBuilder; build_cache, build_jobs and opt_level are then ignored
+            blobs: Shared output BlobStore; spill_threshold is then ignored
+            toolchains: Shared toolchain probe cache
+            entry_points: Shared entry-point cache
+            admission: Shared AdmissionController; adaptive and max_workers are then ignored
         """
         self.workspace_path = Path(workspace_path)
         self.rpal_path = Path(rpal_executable)
         self.submissions_path = self.workspace_path / "submissions"
         self.test_cases_path = self.workspace_path / "test_cases"
         
-        # Test cases mapping: input file -> (expected output, expected AST output)
-        self.test_cases = {
-            "t9input.txt": ("t9inputfinaloutput.txt", "t9inputast.txt"),
-            "t2input.txt": ("t2inputfinaloutput.txt", "t2inputast.txt"),
-            "wsum1input.txt": ("wsum1inputfinaloutput.txt", "wsum1inputast.txt"),
-            "vectorsumintput.txt": ("vectorsumintputfinaloutput.txt", "vectorsumintputast.txt"),
-            "towersinput.txt": ("towerfinaloutput.txt", "towerast.txt")
-        }
+        # Test suite, loaded on first use (see suite_manifest)
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.test_selection = tests
+        self.test_shard = shard
+        self._suite: Optional[TestSuite] = None
+        self._normalizer: Optional[OutputNormalizer] = None
+        self._expected_normalized: Dict[Tuple[str, bool], NormalizedOutput] = {}
+        
+        # Concurrency and the optional canary pre-screen
+        self.workers = max(1, workers)
+        self.canary = canary
+        self.canary_timeout = canary_timeout
+        
+        # Load-aware gate on program launches (see admission); None runs them ungated
+        if admission is None and adaptive:
+            admission = AdmissionController(self.workers, max_workers or 2 * (os.cpu_count() or 1))
+        self.admission = admission
+        self.resource_retries = max(0, resource_retries)
+        
+        # Live progress surface, active during grade_all_submissions (see progress)
+        self.show_progress = show_progress
+        self.progress_port = progress_port
+        self.progress: Optional[ProgressTracker] = None
         
-        # Scoring per test case: 14 points total, 14/3 ≈ 4.67 per mode
+        # Streaming consumers subscribe here (see grading_events)
+        self.events = EventBus()
+        
+        # Index of workspace artifacts with sizes and last use (see storage_manager)
+        self.storage = storage or StorageManager(self.workspace_path)
+        self.storage_budget = storage_budget
+        
+        # Per-submission staging (see submission_workspace)
+        self.stage = stage
+        self.stage_root = Path(stage_root) if stage_root else None
+        self.builder = builder or ProgramBuilder(self.workspace_path / "build_cache" if build_cache else None,
+                                                 build_jobs, opt_level, self.storage)
+        self.compile_timeout = compile_timeout
+        self.java_cds = java_cds
+        # Interpreters/compilers available on this host, probed once (see toolchain)
+        self.toolchains = toolchains or Toolchains(self.workspace_path / "toolchains.json")
+        # Cleared if a JVM that passed the CDS probe still fails to start with the flags
+        self.java_cds_supported = True
+        # Entry point chosen per submission content when there are several candidates (see entry_points)
+        self.entry_points = entry_points or EntryPointCache(self.workspace_path / "entry_points.json")
+        self.probe_candidates = probe_candidates
+        
+        # Default scoring per test case: 14 points total, 14/3 ≈ 4.67 per mode
+        # (manifests can set points per test)
         self.points_per_mode = 14.0 / 3.0  # 4.67 points per mode (run/ast/st)
         
+        # Opt-in multi-input execution (see run_batch); submissions that failed it aren't offered it again
+        self.batch_protocol = batch_protocol
+        self.batch_rejected: Set[str] = set()
+        
         # Results storage
         self.results = []
+        self.results_db = Path(results_db) if results_db else self.workspace_path / "grading_results.sqlite3"
+        self.run_label = run_label
+        self.store: Optional[ResultsStore] = None
+        self.run_id: Optional[int] = None
+        self.keep_outputs = keep_outputs
+        self.blobs = blobs or BlobStore(self.workspace_path / "output_blobs", spill_threshold, self.storage)
+        self.log_output_limit = log_output_limit
+        self.archive_runs = archive
+        self.archive: Optional[RunArchiveWriter] = None
         
+    @property
+    def suite(self) -> TestSuite:
+        """The test suite, with --tests/--shard applied"""
+        if self._suite is None:
+            suite = TestSuite(self.test_cases_path, self.manifest_path)
+            if self.test_selection:
+                suite = suite.select(self.test_selection)
+            if self.test_shard:
+                suite = suite.shard(*self.test_shard)
+            self._suite = suite
+        return self._suite
+    
     def find_files_recursively(self, submission_folder: Path, patterns: List[str]) -> List[Path]:
         """
         Find files matching patterns recursively in submission folder and subfolders
@@ -76,10 +357,12 @@ class RPALGrader:
         makefiles = self.find_files_recursively(submission_folder, ['Makefile', 'makefile', 'Makefile.txt', 'makefile.txt'])
         return makefiles[0] if makefiles else None
     
-    def find_program_file(self, submission_folder: Path) -> Optional[Path]:
+    def find_program_file(self, submission_folder: Path, notes: Optional[List[str]] = None,
+                          probe: bool = True) -> Optional[Path]:
         """
         Find the main program file in submission folder and subfolders
-        Priority: myrpal.py > *.py > *.rpal > *.java > *.cpp > *.c > others
+        Priority: myrpal.py > *.py > *.rpal > *.java > *.cpp > *.c > others; several files
+        of one language are ranked by choose_entry_point
         """
         # Look for myrpal.py first (highest priority)
         myrpal_files = self.find_files_recursively(submission_folder, ['myrpal.py'])
@@ -89,30 +372,18 @@ class RPALGrader:
         # Look for other Python files
         py_files = self.find_files_recursively(submission_folder, ['*.py'])
         if py_files:
-            return py_files[0]
+            return self.choose_entry_point(submission_folder, py_files, notes, probe)
             
         # Look for .rpal files
         rpal_files = self.find_files_recursively(submission_folder, ['*.rpal'])
         if rpal_files:
             return rpal_files[0]
             
-        # Look for Java files (main class)
-        java_files = self.find_files_recursively(submission_folder, ['*.java'])
-        for java_file in java_files:
-            if 'main' in java_file.name.lower():
-                return java_file
-        if java_files:
-            return java_files[0]
-        
-        # Look for C++ files
-        cpp_files = self.find_files_recursively(submission_folder, ['*.cpp', '*.cxx', '*.cc'])
-        if cpp_files:
-            return cpp_files[0]
-            
-        # Look for C files
-        c_files = self.find_files_recursively(submission_folder, ['*.c'])
-        if c_files:
-            return c_files[0]
+        # Look for Java, C++ and C files
+        for patterns in (['*.java'], ['*.cpp', '*.cxx', '*.cc'], ['*.c']):
+            source_files = self.find_files_recursively(submission_folder, patterns)
+            if source_files:
+                return self.choose_entry_point(submission_folder, source_files, notes, probe)
             
         # Look for executable files
         for item in submission_folder.rglob('*'):
@@ -121,124 +392,97 @@ class RPALGrader:
                 
         return None
     
+    def choose_entry_point(self, submission_folder: Path, files: List[Path], notes: Optional[List[str]] = None,
+                           probe: bool = True) -> Path:
+        """
+        Pick the program file among same-language candidates
+        The static ranking decides unless several candidates look like entry points; then
+        the top ones are probed in parallel with the canary input. Decisions made with probing
+        allowed are cached per submission content (a static-only pick would otherwise stand in
+        for a later probe), and noted on the result when notes is given.
+        """
+        if len(files) == 1:
+            return files[0]
+        key = submission_key(submission_folder, files)
+        cached = self.entry_points.get(key)
+        if cached and (submission_folder / cached['entry']).is_file():
+            chosen, method = submission_folder / cached['entry'], cached['method']
+        else:
+            ranked = rank_candidates(files)
+            chosen, method = ranked[0].path, 'static'
+            contenders = [c for c in ranked if c.score >= ENTRY_SIGNAL][:self.probe_candidates]
+            if probe and len(contenders) > 1:
+                winner = probe_candidates(contenders, lambda path: self.probe_entry_point(submission_folder, path))
+                if winner is not None:
+                    chosen, method = winner.path, 'probe'
+            logger.debug("Entry point %s by %s ranking: %s", chosen.name, method,
+                         ', '.join(f"{c.path.name}={c.score}" for c in ranked))
+            if probe and self.probe_candidates > 1:
+                self.entry_points.put(key, str(chosen.relative_to(submission_folder)), method, len(files))
+        if notes is not None:
+            notes.append(f"Entry point {chosen.relative_to(submission_folder)} chosen by {method} ranking "
+                         f"of {len(files)} candidates")
+        return chosen
+    
+    def probe_entry_point(self, submission_folder: Path, program_file: Path) -> Optional[float]:
+        """Similarity of one candidate's canary output to the expected one, None if it fails"""
+        try:
+            case = self.canary_case()
+        except (ManifestError, IndexError):
+            return None
+        stdout, stderr, return_code, _ = self.dispatch(lambda: self.execute_program(
+            submission_folder, {}, program_file, case.input_path, "run", case.timeout))
+        if self.is_runtime_error(stderr, return_code) or not stdout.strip():
+            return None
+        expected = self.suite.expected_output(case, "run")
+        return self.compare_outputs_strict(stdout, expected)[1] if expected is not None else 0.0
+    
+    @property
+    def normalizer(self) -> OutputNormalizer:
+        """Output normalization rules (a manifest's "normalization" section overrides the defaults)"""
+        if self._normalizer is None:
+            self._normalizer = OutputNormalizer.from_config(self.suite.normalization)
+        return self._normalizer
+    
     def normalize_ast_structure(self, ast_content: str) -> str:
         """
         Normalize AST structure by converting between dots and spaces
         This handles the mismatch between expected (dots) and actual (spaces) AST formats
         """
-        lines = ast_content.strip().split('\n')
-        normalized_lines = []
-        
-        for line in lines:
-            # Skip empty lines
-            if not line.strip():
-                continue
-                
-            # Count leading dots or spaces
-            leading_dots = len(line) - len(line.lstrip('.'))
-            leading_spaces = len(line) - len(line.lstrip(' '))
-            
-            # Get the actual content (after dots/spaces)
-            if leading_dots > 0:
-                content = line.lstrip('.')
-                indent_level = leading_dots
-            elif leading_spaces > 0:
-                content = line.lstrip(' ')
-                # Assume each 2 spaces = 1 level, or each 4 spaces = 1 level
-                if leading_spaces % 4 == 0:
-                    indent_level = leading_spaces // 4
-                elif leading_spaces % 2 == 0:
-                    indent_level = leading_spaces // 2
-                else:
-                    indent_level = leading_spaces
-            else:
-                content = line
-                indent_level = 0
-            
-            # Normalize to dots format for comparison
-            normalized_line = '.' * indent_level + content
-            normalized_lines.append(normalized_line)
-        
-        return '\n'.join(normalized_lines)
+        return self.normalizer.normalize(ast_content, is_ast=True).text
     
     def extract_core_answer(self, output: str) -> str:
         """
         Extract core answer from output, ignoring extra content
         This handles cases where student output has extra information
         """
-        # Clean output first
-        output = output.strip().replace('\r\n', '\n').replace('\r', '\n')
-        
-        # Handle IDENTIFIER vs ID variations
-        output = re.sub(r'\bIDENTIFIER\b', 'ID', output)
-        
-        # For AST output, preserve structure
-        if any(keyword in output for keyword in ['.gamma', '.lambda', '.tau', 'gamma', 'lambda', 'tau', '.+', '.>', '.=']):
-            return self.normalize_ast_structure(output)
-        
-        # For regular output, try to extract the final answer
-        lines = [line.strip() for line in output.split('\n') if line.strip()]
-        
-        if not lines:
-            return ""
-        
-        # If it's a single line, return it
-        if len(lines) == 1:
-            return lines[0]
-        
-        # Try to find lines that look like answers (numbers, simple expressions)
-        answer_patterns = [
-            r'^\d+$',  # Just numbers
-            r'^-?\d+$',  # Negative numbers
-            r'^\d+\.\d+$',  # Decimals
-            r'^[a-zA-Z_][a-zA-Z0-9_]*$',  # Simple identifiers
-            r'^[()]+$',  # Parentheses
-            r'^[a-zA-Z0-9\s\(\)]+$',  # Simple expressions
-        ]
-        
-        potential_answers = []
-        for line in lines:
-            for pattern in answer_patterns:
-                if re.match(pattern, line):
-                    potential_answers.append(line)
-                    break
-        
-        # Return the last potential answer, or the last line if no patterns match
-        if potential_answers:
-            return potential_answers[-1]
-        else:
-            return lines[-1]
+        return self.normalizer.normalize(output).text
+    
+    def normalize_expected(self, expected: str, is_ast: bool) -> NormalizedOutput:
+        """Normalized expected output, computed once per distinct expected text"""
+        key = (expected, is_ast)
+        normalized = self._expected_normalized.get(key)
+        if normalized is None:
+            normalized = self._expected_normalized[key] = self.normalizer.normalize(expected, is_ast)
+        return normalized
     
     def compare_outputs_strict(self, actual: str, expected: str, is_ast: bool = False) -> Tuple[bool, float]:
         """
         Strict comparison for exact matching with partial credit based on similarity
         Returns: (is_perfect_match, similarity_score)
         """
-        print(f"    DEBUG - Actual output: '{actual.strip()}'")
-        print(f"    DEBUG - Expected output: '{expected.strip()}'") 
-        if is_ast:
-            actual_normalized = self.normalize_ast_structure(actual)
-            expected_normalized = self.normalize_ast_structure(expected)
-        else:
-            actual_normalized = self.extract_core_answer(actual)
-            expected_normalized = self.extract_core_answer(expected)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Actual output: '%s'", clip(actual.strip(), self.log_output_limit))
+            logger.debug("Expected output: '%s'", clip(expected.strip(), self.log_output_limit))
+        actual_result = self.normalizer.normalize(actual, is_ast)
+        expected_result = self.normalize_expected(expected, is_ast)
         
-        # Check for exact match first
-        if actual_normalized == expected_normalized:
+        # Exact match, treating IDENTIFIER and ID as the same token
+        if actual_result.canonical == expected_result.canonical:
             return True, 1.0
         
-        # Try with IDENTIFIER <-> ID conversion
-        actual_id = re.sub(r'\bIDENTIFIER\b', 'ID', actual_normalized)
-        expected_id = re.sub(r'\bIDENTIFIER\b', 'ID', expected_normalized)
-        
-        if actual_id == expected_id:
-            return True, 1.0
-            
-        actual_identifier = re.sub(r'\bID\b', 'IDENTIFIER', actual_normalized)
-        expected_identifier = re.sub(r'\bID\b', 'IDENTIFIER', expected_normalized)
-        
-        if actual_identifier == expected_identifier:
-            return True, 1.0
+        actual_normalized = actual_result.text
+        expected_normalized = expected_result.text
         
         # Calculate similarity for partial credit
         if not expected_normalized or not actual_normalized:
@@ -316,15 +560,15 @@ class RPALGrader:
                 if line and not line.startswith((' ', '\t')):
                     current_target = None
             
-            print(f"    DEBUG - Parsed Makefile commands: {commands}")
+            logger.debug("Parsed Makefile commands: %s", commands)
                         
         except Exception as e:
-            print(f"    Error parsing Makefile: {e}")
+            logger.warning("Error parsing Makefile: %s", e)
             
         return commands
 
     def run_with_makefile(self, submission_folder: Path, makefile_commands: Dict[str, str], 
-                        input_file: Path, mode: str = "run") -> Tuple[str, str, int]:
+                        input_file: Path, mode: str = "run", timeout: float = 30) -> Tuple[str, str, int]:
         """
         Run program using Makefile commands - HANDLES ALL VARIABLE FORMATS
         """
@@ -397,8 +641,8 @@ class RPALGrader:
                 if not replaced:
                     command = f"{command} {input_file_abs}"
             
-            print(f"    DEBUG - Original command: {original_command}")
-            print(f"    DEBUG - Processed command: {command}")
+            logger.debug("Original command: %s", original_command)
+            logger.debug("Processed command: %s", command)
             
             # Get the makefile directory for proper execution context
             makefile_dir = Path(makefile_commands.get('_makefile_dir', submission_folder))
@@ -408,27 +652,28 @@ class RPALGrader:
                 shell=True,
                 capture_output=True, 
                 text=True, 
-                timeout=30,
+                timeout=timeout,
                 cwd=makefile_dir,
                 encoding='utf-8',
                 errors='ignore'
             )
             
-            print(f"    DEBUG - Return code: {result.returncode}")
-            print(f"    DEBUG - Stdout length: {len(result.stdout)} chars")
-            print(f"    DEBUG - Stderr: '{result.stderr.strip()}'")
-            if result.stdout.strip():
-                print(f"    DEBUG - First 200 chars of stdout: '{result.stdout[:200]}...'")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Return code: %s", result.returncode)
+                logger.debug("Stdout length: %d chars", len(result.stdout))
+                logger.debug("Stderr: '%s'", clip(result.stderr.strip(), self.log_output_limit))
+                if result.stdout.strip():
+                    logger.debug("Start of stdout: '%s'", clip(result.stdout, self.log_output_limit))
             
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Program execution exceeded 30 seconds", -1
+            return "", f"Timeout: Program execution exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Error: {str(e)}", -1
 
     def try_alternative_makefile_execution(self, submission_folder: Path, makefile_path: Path, 
-                                        input_file: Path, mode: str) -> Tuple[str, str, int]:
+                                        input_file: Path, mode: str, timeout: float = 30) -> Tuple[str, str, int]:
         """
         Alternative approach: Use 'make' command directly
         This handles complex Makefiles better than parsing
@@ -453,24 +698,25 @@ class RPALGrader:
                 ['make', mode, f'file={input_file.absolute()}'],
                 capture_output=True,
                 text=True,
-                timeout=30,
+                timeout=timeout,
                 cwd=makefile_dir,
                 env=env,
                 encoding='utf-8',
                 errors='ignore'
             )
             
-            print(f"    DEBUG - Make command result: RC={result.returncode}")
+            logger.debug("Make command result: RC=%s", result.returncode)
             
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Make command exceeded 30 seconds", -1
+            return "", f"Timeout: Make command exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Make command error: {str(e)}", -1
 
 
-    def run_direct_python(self, program_file: Path, input_file: Path, mode: str = "run") -> Tuple[str, str, int]:
+    def run_direct_python(self, program_file: Path, input_file: Path, mode: str = "run",
+                          timeout: float = 30) -> Tuple[str, str, int]:
         try:
             cmd = ['python3', str(program_file), str(input_file)]  # Put input file BEFORE flags
             
@@ -486,7 +732,7 @@ class RPALGrader:
                 cmd, 
                 capture_output=True, 
                 text=True, 
-                timeout=30,
+                timeout=timeout,
                 cwd=program_file.parent,
                 encoding='utf-8',
                 errors='ignore'
@@ -495,45 +741,41 @@ class RPALGrader:
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Program execution exceeded 30 seconds", -1
+            return "", f"Timeout: Program execution exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Error: {str(e)}", -1
     
-    def run_java_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run") -> Tuple[str, str, int]:
+    def run_java_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run",
+                         timeout: float = 30) -> Tuple[str, str, int]:
         """
         Run Java program
         """
         try:
-            # Try to compile first
-            compile_result = subprocess.run(
-                ['javac', str(program_file)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=program_file.parent,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            # Compile first (once per submission)
+            class_dir, compile_errors = self.build_program(program_file)
             
-            if compile_result.returncode != 0:
-                return "", f"Compilation error: {compile_result.stderr}", -1
+            if class_dir is None:
+                return "", f"Compilation error: {compile_errors}", -1
             
             # Run the program
             main_class = program_file.stem
-            cmd = ['java', main_class]
+            args = ['-cp', f"{class_dir}{os.pathsep}.", main_class]
             
             if mode == "ast":
-                cmd.append('-ast')
+                args.append('-ast')
             elif mode == "st":
-                cmd.append('-st')
+                args.append('-st')
             
-            cmd.append(str(input_file))
+            args.append(str(input_file))
+            
+            if self.java_cds and self.java_cds_supported and self.toolchains.java_cds():
+                return self.run_java_with_cds(class_dir, main_class, args, program_file.parent, timeout)
             
             result = subprocess.run(
-                cmd,
+                ['java'] + args,
                 capture_output=True,
                 text=True,
-                timeout=30,
+                timeout=timeout,
                 cwd=program_file.parent,
                 encoding='utf-8',
                 errors='ignore'
@@ -542,29 +784,56 @@ class RPALGrader:
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Program execution exceeded 30 seconds", -1
+            return "", f"Timeout: Program execution exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Error: {str(e)}", -1
     
-    def run_cpp_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run") -> Tuple[str, str, int]:
+    def run_java_with_cds(self, class_dir: Path, main_class: str, args: List[str], cwd: Path,
+                          timeout: float) -> Tuple[str, str, int]:
+        """
+        Run java with an AppCDS archive of the submission's loaded classes
+        The first run of a build records the archive at JVM exit (JDK 13+); later runs map
+        it instead of loading and verifying classes again. Every run is still a fresh JVM,
+        so return codes and uncaught exceptions are reported exactly as without CDS.
+        Only used when the JVM passed the CDS probe (see toolchain.probe_cds); if it still
+        fails to start with the flags, the run is repeated without them and CDS is turned off.
+        """
+        archive = class_dir.parent / f"{class_dir.name}.{main_class}.jsa"
+        # -Xlog:disable: JVM warnings go to stdout by default and would pollute the program output
+        flags = list(CDS_FLAGS)
+        dump_path = None
+        if archive.exists():
+            flags.append(f'-XX:SharedArchiveFile={archive}')
+        else:
+            dump_path = archive.with_name(f"{archive.name}.tmp{os.getpid()}_{threading.get_ident()}")
+            flags.append(f'-XX:ArchiveClassesAtExit={dump_path}')
+        
+        result = subprocess.run(['java'] + flags + args, capture_output=True, text=True, timeout=timeout,
+                                cwd=cwd, encoding='utf-8', errors='ignore')
+        
+        if dump_path is not None and dump_path.exists():
+            os.replace(dump_path, archive)
+            if self.builder.cache is not None and self.builder.cache.root in archive.parents:
+                self.storage.track(archive, 'build')
+        elif result.returncode != 0 and JVM_START_FAILURE_RE.search(result.stderr):
+            logger.warning("The JVM failed to start with AppCDS flags, running Java submissions without them")
+            self.java_cds_supported = False
+            result = subprocess.run(['java'] + args, capture_output=True, text=True, timeout=timeout,
+                                    cwd=cwd, encoding='utf-8', errors='ignore')
+        
+        return result.stdout, result.stderr, result.returncode
+    
+    def run_cpp_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run",
+                        timeout: float = 30) -> Tuple[str, str, int]:
         """
         Run C++ program
         """
         try:
-            # Compile first
-            exe_file = program_file.parent / program_file.stem
-            compile_result = subprocess.run(
-                ['g++', str(program_file), '-o', str(exe_file)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=program_file.parent,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            # Compile first (once per submission)
+            exe_file, compile_errors = self.build_program(program_file)
             
-            if compile_result.returncode != 0:
-                return "", f"Compilation error: {compile_result.stderr}", -1
+            if exe_file is None:
+                return "", f"Compilation error: {compile_errors}", -1
             
             # Run the program
             cmd = [str(exe_file)]
@@ -580,7 +849,7 @@ class RPALGrader:
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=30,
+                timeout=timeout,
                 cwd=program_file.parent,
                 encoding='utf-8',
                 errors='ignore'
@@ -589,29 +858,21 @@ class RPALGrader:
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Program execution exceeded 30 seconds", -1
+            return "", f"Timeout: Program execution exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Error: {str(e)}", -1
     
-    def run_c_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run") -> Tuple[str, str, int]:
+    def run_c_program(self, submission_folder: Path, program_file: Path, input_file: Path, mode: str = "run",
+                      timeout: float = 30) -> Tuple[str, str, int]:
         """
         Run C program
         """
         try:
-            # Compile first
-            exe_file = program_file.parent / program_file.stem
-            compile_result = subprocess.run(
-                ['gcc', str(program_file), '-o', str(exe_file)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=program_file.parent,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            # Compile first (once per submission)
+            exe_file, compile_errors = self.build_program(program_file)
             
-            if compile_result.returncode != 0:
-                return "", f"Compilation error: {compile_result.stderr}", -1
+            if exe_file is None:
+                return "", f"Compilation error: {compile_errors}", -1
             
             # Run the program
             cmd = [str(exe_file)]
@@ -627,7 +888,7 @@ class RPALGrader:
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=30,
+                timeout=timeout,
                 cwd=program_file.parent,
                 encoding='utf-8',
                 errors='ignore'
@@ -636,10 +897,29 @@ class RPALGrader:
             return result.stdout, result.stderr, result.returncode
             
         except subprocess.TimeoutExpired:
-            return "", "Timeout: Program execution exceeded 30 seconds", -1
+            return "", f"Timeout: Program execution exceeded {timeout:g} seconds", -1
         except Exception as e:
             return "", f"Error: {str(e)}", -1
     
+    def build_program(self, program_file: Path) -> Tuple[Optional[Path], str]:
+        """
+        Compile a Java/C/C++ program file, once per staged submission
+        Fresh outputs go to the workspace's scratch folder (next to the source when staging
+        is off) and into the shared build cache (see program_builder). Builds get the
+        compile timeout, not the per-test one, and a compiler timeout is a compile error.
+        Returns (class folder or executable, None on failure; compiler errors)
+        """
+        def build(output_dir: Path) -> Tuple[Optional[Path], str]:
+            try:
+                return self.builder.build(program_file, output_dir, self.compile_timeout)
+            except subprocess.TimeoutExpired:
+                return None, f"Compiler exceeded {self.compile_timeout:g} seconds"
+        
+        workspace = current_workspace.get()
+        if workspace is None:
+            return build(program_file.parent)
+        return workspace.build(program_file, lambda: build(workspace.scratch))
+    
     def is_runtime_error(self, stderr: str, return_code: int) -> bool:
         """
         Check if the error is a runtime/traceback error that should get 0 marks
@@ -662,41 +942,192 @@ class RPALGrader:
         stderr_lower = stderr.lower()
         return any(indicator in stderr_lower for indicator in error_indicators)
     
+    def direct_command(self, program_file: Path) -> Optional[List[str]]:
+        """
+        Base command for program files that run without a build step
+        Returns None for sources that need compiling first
+        """
+        if program_file.suffix == '.py':
+            return ['python3', str(program_file)]
+        if program_file.suffix in ['.java', '.cpp', '.cxx', '.cc', '.c']:
+            return None
+        return [str(program_file)]
+    
+    def run_batch(self, program_file: Path, input_paths: List[Path], mode: str,
+                  timeout: float = 30) -> Optional[Dict[str, Tuple[str, str, int]]]:
+        """
+        Run every input through a single process using the batch protocol
+        The program is called as `<cmd> --batch <manifest> [-ast|-st]`, where the manifest
+        lists one input path per line, and must print a "==> <input path> <==" header
+        before the output of each input. timeout covers the whole batch (the inputs' summed
+        timeouts).
+        Returns per-input (stdout, stderr, returncode) keyed by input path, or None when the
+        submission doesn't support the protocol or the output can't be split unambiguously
+        """
+        base_cmd = self.direct_command(program_file)
+        if base_cmd is None or not input_paths or self.toolchains.missing_for(program_file):
+            return None
+        
+        expected_inputs = [str(path.absolute()) for path in input_paths]
+        manifest_fd, manifest_path = tempfile.mkstemp(prefix='rpal_batch_', suffix='.txt')
+        try:
+            with os.fdopen(manifest_fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(expected_inputs) + '\n')
+            
+            cmd = base_cmd + ['--batch', manifest_path]
+            if mode == "ast":
+                cmd.append('-ast')
+            elif mode == "st":
+                cmd.append('-st')
+            
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                cwd=program_file.parent,
+                encoding='utf-8',
+                errors='ignore'
+            )
+        except subprocess.TimeoutExpired:
+            return None
+        except Exception as e:
+            logger.debug("Batch execution error: %s", e)
+            return None
+        finally:
+            os.unlink(manifest_path)
+        
+        # stderr and the return code can't be attributed to a single input
+        if self.is_runtime_error(result.stderr, result.returncode):
+            return None
+        
+        headers = list(BATCH_HEADER_RE.finditer(result.stdout))
+        if [h.group(1).strip() for h in headers] != expected_inputs:
+            return None
+        
+        outputs = {}
+        for i, header in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(result.stdout)
+            outputs[header.group(1).strip()] = (result.stdout[header.end():end], '', 0)
+        return outputs
+    
+    def collect_batch_outputs(self, submission: str, makefile_commands: Dict[str, str], program_file: Path,
+                              cases: List[TestCaseSpec]) -> Dict[Tuple[str, str], Tuple[str, str, int]]:
+        """
+        Batch-run the cases' inputs once per mode, keyed by (input path, mode)
+        Modes handled by the Makefile are left to execute_program. Stops at the first
+        unsupported/ambiguous/timed-out batch so the caller falls back to per-file execution,
+        and remembers the submission so later modes and re-grades don't spawn it with --batch
+        """
+        batch_outputs = {}
+        for mode in ("run", "ast"):
+            if submission in self.batch_rejected:
+                break
+            if mode in makefile_commands:
+                continue
+            mode_cases = [case for case in cases if mode in case.modes]
+            if not mode_cases:
+                continue
+            with self.launch_slot():
+                outputs = self.run_batch(program_file, [case.input_path for case in mode_cases], mode,
+                                         sum(case.timeout for case in mode_cases))
+            if outputs is None:
+                self.batch_rejected.add(submission)
+                break
+            for input_path, output in outputs.items():
+                batch_outputs[(input_path, mode)] = output
+        return batch_outputs
+    
+    def run_test_mode(self, batch_outputs: Dict[Tuple[str, str], Tuple[str, str, int]], submission_folder: Path,
+                      makefile_commands: Dict[str, str], program_file: Path, input_path: Path,
+                      mode: str, timeout: float = 30) -> Tuple[str, str, int, Optional[float]]:
+        """
+        Execute one (test, mode) pair, reusing batch output when available
+        Returns (stdout, stderr, returncode, duration in seconds or None for batched runs)
+        """
+        batched = batch_outputs.get((str(input_path.absolute()), mode))
+        if batched:
+            return batched + (None,)
+        return self.dispatch(lambda: self.execute_program(submission_folder, makefile_commands, program_file,
+                                                          input_path, mode, timeout))
+    
+    def launch_slot(self):
+        """Context holding an admission slot for one launch (a no-op without --adaptive)"""
+        return self.admission.slot() if self.admission else nullcontext()
+    
+    def dispatch(self, launch) -> Tuple[str, str, int, float]:
+        """
+        Run one program launch (a call returning (stdout, stderr, returncode)) under admission control
+        Launches that fail for lack of resources are retried with backoff instead of being
+        scored; if the last retry fails too, stderr starts with "Resource failure".
+        Returns (stdout, stderr, returncode, seconds taken by the final attempt)
+        """
+        for attempt in range(self.resource_retries + 1):
+            with self.launch_slot():
+                start = time.perf_counter()
+                stdout, stderr, returncode = launch()
+                duration = time.perf_counter() - start
+            pressure = self.admission is not None and self.admission.under_pressure()
+            if not (self.is_runtime_error(stderr, returncode) and is_resource_failure(stderr, returncode, pressure)):
+                return stdout, stderr, returncode, duration
+            if self.admission:
+                self.admission.resource_failure()
+            if attempt < self.resource_retries:
+                logger.warning("Launch failed for lack of resources (attempt %d/%d): %s", attempt + 1,
+                               self.resource_retries + 1, clip(stderr.strip(), self.log_output_limit))
+                time.sleep(min(8.0, 0.5 * 2 ** attempt))
+        return stdout, f"Resource failure after {self.resource_retries + 1} attempts: {stderr}", returncode, duration
+    
+    def classify_error(self, stderr: str, return_code: int) -> str:
+        """Short error class for a failed run, used by the results store"""
+        if stderr.startswith("Timeout"):
+            return 'timeout'
+        if stderr.startswith("Compilation error"):
+            return 'compile_error'
+        if stderr.startswith("Toolchain unavailable"):
+            return 'toolchain_unavailable'
+        if stderr.startswith("Resource failure"):
+            return 'resource_error'
+        return 'runtime_error'
+    
     def execute_program(self, submission_folder: Path, makefile_commands: Dict[str, str], 
-                    program_file: Path, input_path: Path, mode: str) -> Tuple[str, str, int]:
+                    program_file: Path, input_path: Path, mode: str, timeout: float = 30) -> Tuple[str, str, int]:
         """
         Execute program with multiple fallback strategies
         """
         # Strategy 1: Try parsed Makefile commands
         if makefile_commands and mode in makefile_commands:
-            stdout, stderr, returncode = self.run_with_makefile(submission_folder, makefile_commands, input_path, mode)
+            stdout, stderr, returncode = self.run_with_makefile(submission_folder, makefile_commands, input_path, mode, timeout)
             
             # If successful or has meaningful output, return it
             if returncode == 0 or stdout.strip():
                 return stdout, stderr, returncode
             
-            print(f"    DEBUG - Makefile parsing failed, trying direct make command")
+            logger.debug("Makefile parsing failed, trying direct make command")
             
             # Strategy 2: Try direct make command
             makefile_path = Path(makefile_commands.get('_makefile_path', ''))
-            if makefile_path and makefile_path.exists():
+            if makefile_path and makefile_path.exists() and self.toolchains.available('make'):
                 stdout2, stderr2, returncode2 = self.try_alternative_makefile_execution(
-                    submission_folder, makefile_path, input_path, mode)
+                    submission_folder, makefile_path, input_path, mode, timeout)
                 
                 if returncode2 == 0 or stdout2.strip():
                     return stdout2, stderr2, returncode2
             
-            print(f"    DEBUG - Both makefile strategies failed, falling back to direct execution")
+            logger.debug("Both makefile strategies failed, falling back to direct execution")
         
         # Strategy 3: Direct execution fallback
+        missing_tools = self.toolchains.missing_for(program_file)
+        if missing_tools:
+            return "", f"Toolchain unavailable: {', '.join(missing_tools)}", -1
         if program_file.suffix == '.py':
-            return self.run_direct_python(program_file, input_path, mode)
+            return self.run_direct_python(program_file, input_path, mode, timeout)
         elif program_file.suffix == '.java':
-            return self.run_java_program(submission_folder, program_file, input_path, mode)
+            return self.run_java_program(submission_folder, program_file, input_path, mode, timeout)
         elif program_file.suffix in ['.cpp', '.cxx', '.cc']:
-            return self.run_cpp_program(submission_folder, program_file, input_path, mode)
+            return self.run_cpp_program(submission_folder, program_file, input_path, mode, timeout)
         elif program_file.suffix == '.c':
-            return self.run_c_program(submission_folder, program_file, input_path, mode)
+            return self.run_c_program(submission_folder, program_file, input_path, mode, timeout)
         else:
             # Try to execute as is (for compiled executables)
             try:
@@ -713,7 +1144,7 @@ class RPALGrader:
                     cmd,
                     capture_output=True,
                     text=True,
-                    timeout=30,
+                    timeout=timeout,
                     cwd=program_file.parent,
                     encoding='utf-8',
                     errors='ignore'
@@ -725,260 +1156,776 @@ class RPALGrader:
                 return "", f"Unsupported file type or execution error: {str(e)}", -1
 
     
-    def grade_submission(self, submission_folder: Path) -> Dict:
+    def grade_mode(self, batch_outputs: Dict[Tuple[str, str], Tuple[str, str, int]], submission_folder: Path,
+                   makefile_commands: Dict[str, str], program_file: Path, case: TestCaseSpec,
+                   mode: str) -> ModeResult:
         """
-        Grade a single submission with strict scoring requirements
+        Execute and score one (test, mode) pair
         """
-        result = {
-            'submission': submission_folder.name,
-            'algorithm_score': 0,
-            'comments_score': 0,
-            'report_score': 0,
-            'total_score': 0,
-            'max_algorithm_score': 70,
-            'test_results': {},
-            'notes': [],
-            'has_makefile': 'No',
-            'has_program_file': 'No',
-            'execution_method': 'None',
-            'makefile_location': '',
-            'program_file_location': '',
-            'error_details': {}
-        }
+        mode_result = ModeResult()
+        if self.progress:
+            self.progress.run_started(current_submission.get(), case.name, mode)
         
-        print(f"Grading {submission_folder.name}...")
+        try:
+            actual_output, stderr, return_code, mode_result.duration = self.run_test_mode(
+                batch_outputs, submission_folder, makefile_commands, program_file, case.input_path, mode, case.timeout
+            )
+            mode_result.return_code = return_code
+            if self.archive:
+                self.archive.add_output(current_submission.get(), case.name, mode, actual_output, stderr)
+            if self.keep_outputs:
+                mode_result.stdout = self.blobs.capture(actual_output)
+                mode_result.stderr = self.blobs.capture(stderr)
+            self.score_output(mode_result, case, mode, actual_output, stderr, return_code)
+        except Exception as e:
+            mode_result.error = f"Execution error: {str(e)}"
+            mode_result.error_class = 'execution_error'
+        
+        if self.progress:
+            self.progress.run_finished(current_submission.get(), mode_result.error_class)
+        self.events.emit('on_run_complete', current_submission.get(), case.name, mode, mode_result)
+        if mode_result.error_class in ('pass', 'partial'):
+            print(f"{mode.upper()}:{mode_result.score:.1f}", end=" ")
+        else:
+            print(f"{mode.upper()}:0", end=" ")
+        return mode_result
+    
+    def score_output(self, mode_result: ModeResult, case: TestCaseSpec, mode: str,
+                     actual_output: str, stderr: str, return_code: int):
+        """
+        Score one run's output against the expected output, filling in mode_result
+        """
+        expected_output = self.suite.expected_output(case, mode)
+        
+        if self.is_runtime_error(stderr, return_code):
+            mode_result.error_class = self.classify_error(stderr, return_code)
+            if mode_result.error_class == 'toolchain_unavailable':
+                mode_result.error = stderr
+            elif mode_result.error_class == 'resource_error':
+                mode_result.error = clip(stderr.strip().splitlines()[0], 200)
+            else:
+                mode_result.error = f"Runtime error (RC:{return_code})"
+        elif expected_output is not None and actual_output.strip():
+            is_perfect, similarity = self.compare_outputs_strict(actual_output, expected_output, is_ast=(mode != "run"))
+            mode_result.similarity = similarity
+            
+            if is_perfect:
+                mode_result.score = case.points_per_mode
+            else:
+                mode_result.score = similarity * case.points_per_mode
+                mode_result.error = f"Partial match (similarity: {similarity:.2f})"
+                mode_result.error_class = 'partial'
+        else:
+            mode_result.error = "No output or missing expected file"
+            mode_result.error_class = 'no_output'
+    
+    def locate_submission(self, submission_folder: Path, result: SubmissionResult,
+                          quiet: bool = False) -> Tuple[Dict[str, str], Optional[Path]]:
+        """
+        Find the Makefile and program file, filling in the discovery fields of result
+        Returns (makefile commands, program file or None)
+        """
+        say = (lambda *args, **kwargs: None) if quiet else print
         
         # Check for Makefile (including subfolders)
         makefile_path = self.find_makefile(submission_folder)
         makefile_commands = {}
         
         if makefile_path:
-            result['has_makefile'] = 'Yes'
-            result['makefile_location'] = str(makefile_path.relative_to(submission_folder))
+            result.has_makefile = 'Yes'
+            result.makefile_location = str(makefile_path.relative_to(submission_folder))
             makefile_commands = self.parse_makefile(makefile_path)
             makefile_commands['_makefile_dir'] = str(makefile_path.parent)
             makefile_commands['_makefile_path'] = str(makefile_path)  # ADD THIS LINE
-            result['execution_method'] = 'Makefile'
-            print(f"  Found Makefile at: {makefile_path.relative_to(submission_folder)}")
-            print(f"  Makefile commands: {list(k for k in makefile_commands.keys() if not k.startswith('_'))}")
+            result.execution_method = 'Makefile'
+            say(f"  Found Makefile at: {makefile_path.relative_to(submission_folder)}")
+            say(f"  Makefile commands: {list(k for k in makefile_commands.keys() if not k.startswith('_'))}")
         
         # Find program file (including subfolders)
-        program_file = self.find_program_file(submission_folder)
+        program_file = self.find_program_file(submission_folder, result.notes, probe='run' not in makefile_commands)
         
         if program_file:
-            result['has_program_file'] = 'Yes'
-            result['program_file_location'] = str(program_file.relative_to(submission_folder))
-            print(f"  Found program file: {program_file.relative_to(submission_folder)}")
+            result.has_program_file = 'Yes'
+            result.program_file_location = str(program_file.relative_to(submission_folder))
+            say(f"  Found program file: {program_file.relative_to(submission_folder)}")
         else:
-            result['notes'].append("No program file found in folder or subfolders")
-            print(f"  No program file found")
-            return result
+            result.notes.append("No program file found in folder or subfolders")
+            say(f"  No program file found")
+            return makefile_commands, None
         
         # Determine execution method if not using Makefile
         if not makefile_path:
             if program_file.suffix == '.py':
-                result['execution_method'] = 'Direct Python'
+                result.execution_method = 'Direct Python'
             elif program_file.suffix == '.java':
-                result['execution_method'] = 'Direct Java'
+                result.execution_method = 'Direct Java'
             elif program_file.suffix in ['.cpp', '.cxx', '.cc']:
-                result['execution_method'] = 'Direct C++'
+                result.execution_method = 'Direct C++'
             elif program_file.suffix == '.c':
-                result['execution_method'] = 'Direct C'
+                result.execution_method = 'Direct C'
             else:
-                result['execution_method'] = 'Direct Execution'
+                result.execution_method = 'Direct Execution'
+        
+        return makefile_commands, program_file
+    
+    def grade_submission(self, submission_folder: Path) -> SubmissionResult:
+        """
+        Grade a single submission with strict scoring requirements
+        """
+        result = SubmissionResult(submission_folder.name)
+        
+        print(f"Grading {submission_folder.name}...")
+        
+        makefile_commands, program_file = self.locate_submission(submission_folder, result)
+        if not program_file:
+            return result
+        
+        missing_tools = self.toolchains.missing_for(program_file)
+        if missing_tools:
+            result.notes.append(f"Toolchain unavailable: {', '.join(missing_tools)}")
+            print(f"  Toolchain unavailable on this host: {', '.join(missing_tools)}")
+        
+        # Opt-in batch protocol: one process per mode for all inputs
+        batch_outputs = {}
+        if self.batch_protocol:
+            cases = [case for case in self.suite if case.input_path.exists()]
+            batch_outputs = self.collect_batch_outputs(result.submission, makefile_commands, program_file, cases)
+            if batch_outputs:
+                result.notes.append("Batch protocol used")
         
         # Test each test case with strict scoring
         total_test_score = 0
         
-        for input_file, (expected_output_file, expected_ast_file) in self.test_cases.items():
-            test_name = input_file.replace("input.txt", "").replace(".txt", "")
-            input_path = self.test_cases_path / input_file
-            expected_output_path = self.test_cases_path / expected_output_file
-            expected_ast_path = self.test_cases_path / expected_ast_file
+        for case in self.suite:
+            test_name = case.name
             
-            if not input_path.exists():
+            if not case.input_path.exists():
                 print(f"    {test_name}: Input file not found - SKIPPING")
-                result['test_results'][test_name] = {
-                    'run_score': 0,
-                    'ast_score': 0,
-                    'st_score': 0,
-                    'total': 0,
-                    'errors': {'run': 'Input file missing', 'ast': 'Input file missing', 'st': 'Input file missing'}
-                }
+                result.tests[test_name] = TestResult.failed(test_name, 'Input file missing', 'missing_input')
                 continue
             
-            mode_scores = {'run': 0, 'ast': 0, 'st': 0}
-            test_errors = {'run': '', 'ast': '', 'st': ''}
-            
             print(f"    {test_name}:", end=" ")
-            
-            # Test 1: Normal execution (run mode)
-            try:
-                actual_output, stderr, return_code = self.execute_program(
-                    submission_folder, makefile_commands, program_file, input_path, "run"
+            test_result = TestResult(test_name)
+            
+            for mode in [m for m in MODES if m in case.modes]:
+                if mode == 'st' and 'st' not in case.expected and 'ast' in test_result.modes:
+                    # ST grading - simplified since it's same as AST
+                    test_result.modes['st'] = test_result.modes['ast'].copy()
+                    print(f"ST:{test_result.modes['st'].score:.1f}", end=" ")
+                    self.events.emit('on_run_complete', result.submission, test_name, 'st', test_result.modes['st'])
+                    continue
+                test_result.modes[mode] = self.grade_mode(
+                    batch_outputs, submission_folder, makefile_commands, program_file, case, mode
                 )
-                
-                if self.is_runtime_error(stderr, return_code):
-                    mode_scores['run'] = 0
-                    test_errors['run'] = f"Runtime error (RC:{return_code})"
-                    print("RUN:0", end=" ")
-                elif expected_output_path.exists() and actual_output.strip():
-                    with open(expected_output_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        expected_output = f.read()
-                    
-                    is_perfect, similarity = self.compare_outputs_strict(actual_output, expected_output, is_ast=False)
-                    
-                    if is_perfect:
-                        mode_scores['run'] = self.points_per_mode
-                        print(f"RUN:{self.points_per_mode:.1f}", end=" ")
-                    else:
-                        mode_scores['run'] = similarity * self.points_per_mode
-                        test_errors['run'] = f"Partial match (similarity: {similarity:.2f})"
-                        print(f"RUN:{mode_scores['run']:.1f}", end=" ")
-                else:
-                    mode_scores['run'] = 0
-                    test_errors['run'] = "No output or missing expected file"
-                    print("RUN:0", end=" ")
-            except Exception as e:
-                mode_scores['run'] = 0
-                test_errors['run'] = f"Execution error: {str(e)}"
-                print("RUN:0", end=" ")
+            print()
             
-            # Test 2: AST execution
-            try:
-                actual_ast_output, stderr_ast, return_code_ast = self.execute_program(
-                    submission_folder, makefile_commands, program_file, input_path, "ast"
-                )
-                
-                if self.is_runtime_error(stderr_ast, return_code_ast):
-                    mode_scores['ast'] = 0
-                    test_errors['ast'] = f"Runtime error (RC:{return_code_ast})"
-                    print("AST:0", end=" ")
-                elif expected_ast_path.exists() and actual_ast_output.strip():
-                    with open(expected_ast_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        expected_ast_output = f.read()
-                    
-                    is_perfect, similarity = self.compare_outputs_strict(actual_ast_output, expected_ast_output, is_ast=True)
-                    
-                    if is_perfect:
-                        mode_scores['ast'] = self.points_per_mode
-                        print(f"AST:{self.points_per_mode:.1f}", end=" ")
-                    else:
-                        mode_scores['ast'] = similarity * self.points_per_mode
-                        test_errors['ast'] = f"Partial match (similarity: {similarity:.2f})"
-                        print(f"AST:{mode_scores['ast']:.1f}", end=" ")
-                else:
-                    mode_scores['ast'] = 0
-                    test_errors['ast'] = "No output or missing expected file"
-                    print("AST:0", end=" ")
-            except Exception as e:
-                mode_scores['ast'] = 0
-                test_errors['ast'] = f"Execution error: {str(e)}"
-                print("AST:0", end=" ")
-            
-            # Test 3: ST execution
-            # try:
-            #     actual_st_output, stderr_st, return_code_st = self.execute_program(
-            #         submission_folder, makefile_commands, program_file, input_path, "st"
-            #     )
-                
-            #     if self.is_runtime_error(stderr_st, return_code_st):
-            #         mode_scores['st'] = 0
-            #         test_errors['st'] = f"Runtime error (RC:{return_code_st})"
-            #         print("ST:0")
-            #     elif expected_ast_path.exists() and actual_st_output.strip():
-            #         with open(expected_ast_path, 'r', encoding='utf-8', errors='ignore') as f:
-            #             expected_st_output = f.read()
-                    
-            #         is_perfect, similarity = self.compare_outputs_strict(actual_st_output, expected_st_output, is_ast=True)
-                    
-            #         if is_perfect:
-            #             mode_scores['st'] = self.points_per_mode
-            #             print(f"ST:{self.points_per_mode:.1f}")
-            #         else:
-            #             mode_scores['st'] = similarity * self.points_per_mode
-            #             test_errors['st'] = f"Partial match (similarity: {similarity:.2f})"
-            #             print(f"ST:{mode_scores['st']:.1f}")
-            #     else:
-            #         mode_scores['st'] = 0
-            #         test_errors['st'] = "No output or missing expected file"
-            #         print("ST:0")
-            # except Exception as e:
-            #     mode_scores['st'] = 0
-            #     test_errors['st'] = f"Execution error: {str(e)}"
-            #     print("ST:0")
-            # ST grading - simplified since it's same as AST
-            mode_scores['st'] = mode_scores['ast']  # Copy AST score
-            test_errors['st'] = test_errors.get('ast', '')
-            print(f"ST:{mode_scores['st']:.1f}")
-            test_score = sum(mode_scores.values())
-            
-            result['test_results'][test_name] = {
-                'run_score': round(mode_scores['run'], 2),
-                'ast_score': round(mode_scores['ast'], 2),
-                'st_score': round(mode_scores['st'], 2),
-                'total': round(test_score, 2),
-                'errors': test_errors
-            }
-            
-            result['error_details'][test_name] = test_errors
-            total_test_score += test_score
+            result.tests[test_name] = test_result
+            total_test_score += sum(mode.score for mode in test_result.modes.values())
         
         # Calculate final algorithm score (scale to 70 points)
-        max_total_score = len(self.test_cases) * 14  # 5 test cases × 14 points each = 70 points
-        result['algorithm_score'] = min(70.0, total_test_score)  # Cap at 70 points
-        result['total_score'] = result['algorithm_score']
+        result.algorithm_score = min(70.0, total_test_score)  # Cap at 70 points
+        result.total_score = result.algorithm_score
         
-        print(f"\n  Total Algorithm Score: {result['algorithm_score']:.1f}/70")
-        print(f"  Execution Method: {result['execution_method']}")
+        print(f"\n  Total Algorithm Score: {result.algorithm_score:.1f}/70")
+        print(f"  Execution Method: {result.execution_method}")
         
         return result
     
-    def grade_all_submissions(self) -> List[Dict]:
-        """Grade all submissions in the submissions folder"""
+    def grade_all_submissions(self, retain_results: bool = True) -> List[SubmissionResult]:
+        """
+        Grade all submissions in the submissions folder
+        With retain_results=False each result is only written to the results store
+        (and its captured outputs released), keeping memory bounded for large cohorts
+        """
         if not self.submissions_path.exists():
             print(f"Submissions path {self.submissions_path} not found!")
             return []
+        
+        if not retain_results and self.store is None:
+            raise ValueError("retain_results=False requires an open results store")
             
-        results = []
-        submission_folders = [f for f in self.submissions_path.iterdir() if f.is_dir()]
+        submission_folders = sorted(f for f in self.submissions_path.iterdir() if f.is_dir())
         
         print(f"Found {len(submission_folders)} submissions to grade")
         print("=" * 80)
         
-        for i, submission_folder in enumerate(sorted(submission_folders), 1):
-            print(f"\n[{i}/{len(submission_folders)}] ", end="")
+        # Two-tier mode: quick canary for everyone first, then the full matrix with
+        # canary failures moved to the back of the queue
+        if self.canary is not None and submission_folders:
+            canary_results = self.run_canary(submission_folders)
+            submission_folders.sort(key=lambda f: canary_results[f.name].error_class != 'pass')
+            print("=" * 80)
+        
+        position = {folder: i for i, folder in enumerate(submission_folders, 1)}
+        
+        def grade(submission_folder: Path) -> SubmissionResult:
+            print(f"\n[{position[submission_folder]}/{len(submission_folders)}] ", end="")
+            return self.grade_and_record(submission_folder)
+        
+        if self.show_progress or self.progress_port:
+            self.progress = ProgressTracker(len(submission_folders))
+            if self.show_progress:
+                self.progress.show_status()
+            if self.progress_port:
+                self.progress.serve(self.progress_port)
+                print(f"Progress available at http://127.0.0.1:{self.progress_port}/")
+        
+        graded = 0
+        if self.admission:
+            self.admission.start()
+        try:
+            for result in self.map_submissions(grade, submission_folders):
+                graded += 1
+                if retain_results:
+                    self.results.append(result)
+                else:
+                    result.drop_outputs()
+        finally:
+            if self.admission:
+                self.admission.stop()
+                print(f"\nAdaptive concurrency: peak {self.admission.peak_limit}, final {self.admission.limit}, "
+                      f"{self.admission.resource_failures} resource failure(s)")
+            if self.progress:
+                self.progress.close()
+                self.progress = None
+        
+        self.events.emit('on_batch_done', graded, self.run_id)
+        return self.results
+    
+    def map_submissions(self, fn, submission_folders: List[Path], workers: Optional[int] = None) -> Iterator:
+        """
+        Apply fn to every submission folder, yielding results as they complete
+        With more than one worker the calls run on a thread pool (the work is
+        subprocess-bound) and each call's console output is printed in one piece
+        """
+        workers = workers or (self.admission.max_limit if self.admission else self.workers)
+        if workers <= 1:
+            for submission_folder in submission_folders:
+                yield fn(submission_folder)
+            return
+        
+        previous_stdout = sys.stdout
+        stdout = previous_stdout if isinstance(previous_stdout, ThreadLocalStdout) else ThreadLocalStdout(previous_stdout)
+        sys.stdout = stdout
+        
+        def run(submission_folder: Path):
+            with stdout.capture():
+                return fn(submission_folder)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run, submission_folder) for submission_folder in submission_folders]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            sys.stdout = previous_stdout
+    
+    def canary_case(self) -> TestCaseSpec:
+        """The canary test (--canary NAME, default the first suite test) with the short timeout"""
+        cases = {case.name: case for case in self.suite}
+        if self.canary and self.canary not in cases:
+            raise ManifestError(f"Unknown canary test '{self.canary}' (available: {', '.join(cases)})")
+        case = cases[self.canary] if self.canary else self.suite.cases[0]
+        return TestCaseSpec(case.name, case.input_path, case.expected, ('run',), case.points_per_mode, self.canary_timeout)
+    
+    def grade_canary(self, submission_folder: Path, case: TestCaseSpec) -> Tuple[str, ModeResult]:
+        """
+        Run only the canary input in run mode for one submission
+        Consumers see it as a provisional submission holding just the canary test
+        """
+        name = submission_folder.name
+        token = current_submission.set(name)
+        self.events.emit('on_submission_start', name)
+        try:
+            with self.staged(submission_folder) as folder:
+                makefile_commands, program_file = self.locate_submission(
+                    folder, SubmissionResult(folder.name), quiet=True)
+                if not program_file:
+                    mode_result = ModeResult(error="No program file found", error_class='no_program')
+                else:
+                    print(f"  canary {folder.name}:", end=" ")
+                    mode_result = self.grade_mode({}, folder, makefile_commands, program_file, case, "run")
+                    print()
+        except Exception as e:
+            mode_result = ModeResult(error=f"Execution error: {e}", error_class='execution_error')
+        finally:
+            current_submission.reset(token)
+        self.events.emit('on_submission_graded', SubmissionResult(
+            name, algorithm_score=round(mode_result.score, 2),
+            tests={case.name: TestResult(case.name, {'run': mode_result})},
+            notes=[f"Canary pre-screen ({case.name}, provisional)"]))
+        return name, mode_result
+    
+    def run_canary(self, submission_folders: List[Path]) -> Dict[str, ModeResult]:
+        """
+        Pre-screen every submission with the canary test in parallel and publish the
+        provisional results right away (grading_results_canary.csv)
+        """
+        case = self.canary_case()
+        print(f"Canary pass: {case.name} (run mode, {case.timeout:g}s timeout)")
+        start = time.perf_counter()
+        
+        workers = max(self.workers, os.cpu_count() or 1)
+        canary_results = dict(self.map_submissions(lambda f: self.grade_canary(f, case), submission_folders, workers))
+        
+        output_path = self.workspace_path / "grading_results_canary.csv"
+        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Submission', 'Canary_Test', f'Canary_Score_{case.points_per_mode:.1f}',
+                             'Canary_Status', 'Canary_Error', 'Canary_Seconds'])
+            for name in sorted(canary_results):
+                mode_result = canary_results[name]
+                writer.writerow([name, case.name, round(mode_result.score, 2), mode_result.error_class,
+                                 mode_result.error,
+                                 f"{mode_result.duration:.2f}" if mode_result.duration is not None else ''])
+        
+        passed = sum(1 for r in canary_results.values() if r.error_class == 'pass')
+        print(f"Canary done in {time.perf_counter() - start:.1f}s: {passed}/{len(canary_results)} passed")
+        print(f"Provisional results published: {output_path}")
+        return canary_results
+    
+    @contextmanager
+    def staged(self, submission_folder: Path) -> Iterator[Path]:
+        """
+        Stage a submission into its private workspace for the duration of the block
+        Yields the folder to grade from (the original folder when staging is off)
+        """
+        if not self.stage:
+            yield submission_folder
+            return
+        with SubmissionWorkspace(submission_folder, self.stage_root) as workspace:
+            logger.debug("Staged into %s", workspace.folder)
+            token = current_workspace.set(workspace)
             try:
-                result = self.grade_submission(submission_folder)
-                results.append(result)
-                self.results.append(result)
-            except Exception as e:
-                print(f"Error grading {submission_folder.name}: {e}")
-                traceback.print_exc()
-                error_result = {
-                    'submission': submission_folder.name,
-                    'algorithm_score': 0,
-                    'comments_score': 0,
-                    'report_score': 0,
-                    'total_score': 0,
-                    'max_algorithm_score': 70,
-                    'notes': [f"Grading error: {str(e)}"],
-                    'has_makefile': 'Error',
-                    'has_program_file': 'Error',
-                    'execution_method': 'Error',
-                    'makefile_location': 'N/A',
-                    'program_file_location': 'N/A',
-                    'test_results': {},
-                    'error_details': {}
-                }
-                results.append(error_result)
-                self.results.append(error_result)
+                yield workspace.folder
+            finally:
+                current_workspace.reset(token)
+    
+    def grade_and_record(self, submission_folder: Path) -> SubmissionResult:
+        """Grade one submission, turning grader failures into an error result, and store it"""
+        token = current_submission.set(submission_folder.name)
+        if self.progress:
+            self.progress.submission_started(submission_folder.name)
+        self.events.emit('on_submission_start', submission_folder.name)
+        try:
+            with self.staged(submission_folder) as folder:
+                result = self.grade_submission(folder)
+        except Exception as e:
+            print(f"Error grading {submission_folder.name}: {e}")
+            logger.debug("Grading traceback:\n%s", traceback.format_exc())
+            result = SubmissionResult.grading_error(submission_folder.name, str(e))
+        finally:
+            current_submission.reset(token)
+            if self.progress:
+                self.progress.submission_finished(submission_folder.name)
+        
+        self.record_result(result)
+        if self.archive:
+            self.archive.add_submission(result)
+        self.events.emit('on_submission_graded', result)
+        return result
+    
+    def folder_signature(self, folder: Path) -> str:
+        """
+        Cheap change detector for a submission folder: file count, total size and newest mtime
+        """
+        file_count = 0
+        total_size = 0
+        newest_mtime = 0
+        stack = [folder]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            file_count += 1
+                            total_size += stat.st_size
+                            newest_mtime = max(newest_mtime, stat.st_mtime_ns)
+            except OSError:
+                pass
+        return f"{file_count}:{total_size}:{newest_mtime}"
+    
+    def ingest_archives(self, index: Dict[str, str]) -> List[Path]:
+        """
+        Extract new or changed top-level archives (submissions/<name>.zip) into submissions/<name>/
+        Returns the folders that were (re)extracted
+        """
+        extracted = []
+        for archive in sorted(self.submissions_path.glob('*.zip')):
+            stat = archive.stat()
+            signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+            if index.get(archive.name) == signature:
+                continue
+            target = self.submissions_path / archive.stem
+            try:
+                with zipfile.ZipFile(archive, 'r') as zip_ref:
+                    zip_ref.extractall(target)
+                print(f"Extracted '{archive.name}' to '{target.name}/'")
+                extracted.append(target)
+                self.storage.track(archive, 'archive')
+            except zipfile.BadZipFile:
+                # Possibly still uploading; retry on the next poll
+                print(f"Failed to extract '{archive.name}': Bad ZIP file")
+                continue
+            index[archive.name] = signature
+            self.store.set_watch_signature(self.run_id, archive.name, signature)
+        return extracted
+    
+    def watch(self, interval: float = 5.0, max_cycles: Optional[int] = None):
+        """
+        Poll the submissions folder and grade only new or changed submissions
+        A folder is graded once its signature has been stable for one poll interval, so
+        half-uploaded submissions are not graded. Results go into one store run (resumed
+        on restart for the same workspace and label) and the CSV is refreshed after each change.
+        Each poll's ready submissions are graded concurrently like a full run (see map_submissions).
+        """
+        self.open_store(resume=True)
+        index = self.store.watch_index(self.run_id)
+        last_seen = {}
+        
+        def regrade(folder: Path) -> Tuple[Path, float]:
+            start = time.perf_counter()
+            extract_nested_zipfiles(str(folder), self.storage)
+            self.grade_and_record(folder).drop_outputs()
+            return folder, time.perf_counter() - start
+        
+        print(f"Watching {self.submissions_path} every {interval:g}s (run {self.run_id}), Ctrl+C to stop")
+        if self.admission:
+            self.admission.start()
+        cycle = 0
+        try:
+            while max_cycles is None or cycle < max_cycles:
+                cycle += 1
+                self.ingest_archives(index)
+                
+                folders = {f.name: f for f in self.submissions_path.iterdir() if f.is_dir()}
+                ready = []
+                for name in sorted(folders):
+                    signature = self.folder_signature(folders[name])
+                    previous, last_seen[name] = last_seen.get(name), signature
+                    if index.get(name) != signature and previous == signature:
+                        ready.append(folders[name])
+                
+                graded = 0
+                for folder, elapsed in self.map_submissions(regrade, ready):
+                    graded += 1
+                    # Re-sign after extraction/grading so our own writes don't retrigger
+                    index[folder.name] = self.folder_signature(folder)
+                    self.store.set_watch_signature(self.run_id, folder.name, index[folder.name])
+                    print(f"  Re-graded {folder.name} in {elapsed:.1f}s")
+                
+                for name in [n for n in index if not n.endswith('.zip') and n not in folders]:
+                    print(f"Submission {name} removed, dropping its results")
+                    self.store.delete_submission(self.run_id, name)
+                    del index[name]
+                
+                if graded:
+                    self.entry_points.flush()
+                    self.generate_csv_report(self.store.iter_results(self.run_id))
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nStopping watch mode")
+        finally:
+            if self.admission:
+                self.admission.stop()
+            self.store.finish_run(self.run_id)
+    
+    def rescore(self, source_run_id: Optional[int] = None) -> Optional[int]:
+        """
+        Re-score the outputs recorded by an earlier run (graded with --keep-outputs) under
+        the current expected files and normalization rules, without running any submission
+        The results go into a new store run, the CSV is regenerated from it and score
+        changes are written to grading_results_rescore_diff.csv. Returns the new run id.
+        """
+        if self.store is None:
+            self.store = ResultsStore(str(self.results_db))
+        if source_run_id is None:
+            source_run_id = self.store.find_run(self.workspace_path, self.run_label)
+        if source_run_id is None or not self.store.has_outputs(source_run_id):
+            print(f"No recorded outputs for run {source_run_id} in {self.results_db}; "
+                  f"grade with --keep-outputs first")
+            return None
+        
+        self.open_store()
+        print(f"Rescoring run {source_run_id} into run {self.run_id}")
+        start = time.perf_counter()
+        rescored = 0
+        for previous in self.store.iter_results(source_run_id):
+            result = self.rescore_submission(previous, self.store.outputs(source_run_id, previous.submission))
+            self.record_result(result)
+            self.events.emit('on_submission_graded', result)
+            rescored += 1
+        # Carry the outputs forward so the new run can itself be rescored
+        self.store.copy_outputs(source_run_id, self.run_id)
+        self.store.finish_run(self.run_id)
+        self.events.emit('on_batch_done', rescored, self.run_id)
+        print(f"Rescored {rescored} submissions in {time.perf_counter() - start:.2f}s")
+        
+        self.generate_csv_report(self.store.iter_results(self.run_id))
+        changes = self.store.regressions(source_run_id, self.run_id)
+        diff_path = self.workspace_path / "grading_results_rescore_diff.csv"
+        with open(diff_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Submission', 'Old_Algorithm_Score', 'New_Algorithm_Score', 'Delta'])
+            for row in changes:
+                writer.writerow([row['submission'], round(row['old_score'], 2), round(row['new_score'], 2),
+                                 round(row['delta'], 2)])
+        
+        print(f"{len(changes)} score(s) changed (details in {diff_path})")
+        for row in changes:
+            print(f"  {row['submission']}: {row['old_score']:.1f} -> {row['new_score']:.1f} ({row['delta']:+.1f})")
+        return self.run_id
+    
+    def rescore_submission(self, previous: SubmissionResult,
+                           outputs: Dict[Tuple[str, str], Tuple[Optional[int], str, str]]) -> SubmissionResult:
+        """
+        Rebuild a submission's test results from its recorded outputs
+        Modes that were never executed (missing input, no program file) keep their recorded result
+        """
+        result = SubmissionResult(
+            previous.submission, comments_score=previous.comments_score, report_score=previous.report_score,
+            notes=previous.notes, has_makefile=previous.has_makefile, has_program_file=previous.has_program_file,
+            execution_method=previous.execution_method, makefile_location=previous.makefile_location,
+            program_file_location=previous.program_file_location
+        )
+        if not outputs:
+            return previous
+        
+        total_test_score = 0
+        for case in self.suite:
+            old_test = previous.tests.get(case.name)
+            test_result = TestResult(case.name)
+            for mode in [m for m in MODES if m in case.modes]:
+                if mode == 'st' and 'st' not in case.expected and 'ast' in test_result.modes:
+                    test_result.modes['st'] = test_result.modes['ast'].copy()
+                    continue
+                recorded = outputs.get((case.name, mode))
+                if recorded is not None:
+                    return_code, stdout, stderr = recorded
+                    mode_result = ModeResult(return_code=return_code)
+                    if old_test and mode in old_test.modes:
+                        mode_result.duration = old_test.modes[mode].duration
+                    self.score_output(mode_result, case, mode, stdout, stderr, return_code)
+                elif old_test and mode in old_test.modes:
+                    mode_result = old_test.modes[mode]
+                else:
+                    mode_result = ModeResult(error="Not run in the rescored run", error_class='not_run',
+                                             similarity=None)
+                test_result.modes[mode] = mode_result
+            result.tests[case.name] = test_result
+            total_test_score += sum(mode.score for mode in test_result.modes.values())
+        
+        result.algorithm_score = min(70.0, total_test_score)
+        result.total_score = result.algorithm_score
+        return result
+    
+    def cluster_report(self, run_id: Optional[int] = None, threshold: float = 0.8,
+                       output_file: str = "grading_results_clusters.csv") -> Optional[Path]:
+        """
+        Cluster the cohort's recorded outputs per test and mode (see output_clusters)
+        Needs a run graded with --keep-outputs. Writes one row per cluster with its size,
+        a representative normalized output and its members.
+        """
+        store = self.store or ResultsStore(str(self.results_db))
+        if run_id is None:
+            run_id = store.find_run(self.workspace_path, self.run_label)
+        if run_id is None or not store.has_outputs(run_id):
+            print(f"No recorded outputs for run {run_id} in {self.results_db}; grade with --keep-outputs first")
+            return None
+        
+        # (test, mode) -> submission -> normalized output
+        normalized: Dict[Tuple[str, str], Dict[str, str]] = {}
+        for result in store.iter_results(run_id, with_tests=False):
+            for (test, mode), (_, stdout, _) in store.outputs(run_id, result.submission).items():
+                normalized.setdefault((test, mode), {})[result.submission] = \
+                    self.normalizer.normalize(stdout, is_ast=(mode != "run")).canonical
+        
+        output_path = self.workspace_path / output_file
+        print(f"Output clusters for run {run_id} (similarity threshold {threshold:g}):")
+        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Test', 'Mode', 'Cluster', 'Size', 'Distinct_Outputs', 'Matches_Expected',
+                             'Representative', 'Submissions'])
+            for case in self.suite:
+                for mode in [m for m in MODES if m in case.modes]:
+                    outputs = normalized.get((case.name, mode))
+                    if not outputs:
+                        continue
+                    expected = self.suite.expected_output(case, mode)
+                    expected_canonical = (self.normalize_expected(expected, mode != "run").canonical
+                                          if expected is not None else None)
+                    clusters = cluster_outputs(outputs, expected_canonical, threshold)
+                    summary = ", ".join(f"{c.size}{' (expected)' if c.matches_expected else ''}" for c in clusters[:5])
+                    print(f"  {case.name}/{mode}: {len(clusters)} cluster(s): {summary}"
+                          f"{', ...' if len(clusters) > 5 else ''}")
+                    for i, cluster in enumerate(clusters, 1):
+                        writer.writerow([case.name, mode, i, cluster.size, cluster.distinct,
+                                         'Yes' if cluster.matches_expected else 'No',
+                                         cluster.representative or '(no output)', ';'.join(cluster.members)])
+        print(f"Cluster report generated: {output_path}")
+        return output_path
+    
+    def feedback_reports(self, run_id: Optional[int] = None, formats=FEEDBACK_FORMATS,
+                         workers: Optional[int] = None) -> Optional[Path]:
+        """
+        Render per-student HTML/Markdown feedback for a recorded run into <workspace>/feedback
+        (see feedback_reports). Diffs need a run graded with --keep-outputs; reports whose
+        content is unchanged since the last rendering are skipped.
+        """
+        store = self.store or ResultsStore(str(self.results_db))
+        if run_id is None:
+            run_id = store.find_run(self.workspace_path, self.run_label)
+        if run_id is None:
+            print(f"No grading run found in {self.results_db}")
+            return None
+        
+        expected = {}
+        for case in self.suite:
+            for mode in [m for m in MODES if m in case.modes]:
+                text = self.suite.expected_output(case, mode)
+                if text is not None:
+                    expected[(case.name, mode)] = text
+        with_outputs = store.has_outputs(run_id)
+        if not with_outputs:
+            print(f"Run {run_id} has no recorded outputs (grade with --keep-outputs); reports will have no diffs")
+        test_names = store.test_names(run_id)
+        jobs = (build_job(result, store.outputs(run_id, result.submission) if with_outputs else {}, test_names)
+                for result in store.iter_results(run_id))
+        
+        output_dir = self.workspace_path / "feedback"
+        renderer = FeedbackRenderer(output_dir, expected, self.suite.normalization, formats, workers)
+        start = time.perf_counter()
+        rendered, skipped = renderer.render_all(jobs)
+        self.storage.track(output_dir, 'report')
+        print(f"Feedback for run {run_id}: {rendered} rendered, {skipped} unchanged "
+              f"in {time.perf_counter() - start:.1f}s: {output_dir}")
+        return output_dir
+    
+    def performance_report(self, output_file: str = "grading_results_performance.csv") -> Optional[Path]:
+        """
+        Performance tier (see performance_tier): run every submission on scaled variants of
+        towers/vectorsum/pairs, one run at a time so child CPU time can be metered, and
+        write each program's complexity class, throughput and bonus/penalty per submission
+        """
+        config = self.suite.performance
+        weights = {**DEFAULT_WEIGHTS, **config.get('weights', {})}
+        timeout = float(config.get('timeout', 20))
+        repeats = int(config.get('repeats', 2))
+        variants = generate_variants(self.workspace_path / "performance_inputs", config.get('scales'))
+        self.storage.track(self.workspace_path / "performance_inputs", 'generated')
+        by_program = {program: [v for v in variants if v.program == program] for program in SCALED_PROGRAMS}
+        reference = {program: reference_complexity(program_variants)
+                     for program, program_variants in by_program.items()}
+        
+        scores = {}
+        if self.store is not None and self.run_id is not None:
+            scores = {r.submission: (r.algorithm_score, r.max_algorithm_score)
+                      for r in self.store.iter_results(self.run_id, with_tests=False)}
         
-        return results
+        print("\nPerformance tier (reference: " +
+              ", ".join(f"{program} {complexity}" for program, complexity in reference.items()) + ")")
+        submission_folders = sorted(f for f in self.submissions_path.iterdir() if f.is_dir())
+        output_path = self.workspace_path / output_file
+        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            header = ['Submission', 'Algorithm_Score_70']
+            for program in by_program:
+                header += [f'{program}_Complexity', f'{program}_Throughput_per_s', f'{program}_Adjustment']
+            writer.writerow(header + ['Performance_Adjustment', 'Adjusted_Score', 'Performance_Notes'])
+            
+            for submission_folder in submission_folders:
+                token = current_submission.set(submission_folder.name)
+                try:
+                    with self.staged(submission_folder) as folder:
+                        makefile_commands, program_file = self.locate_submission(
+                            folder, SubmissionResult(folder.name), quiet=True)
+                        profiles = self.profile_submission(folder, makefile_commands, program_file,
+                                                           by_program, timeout, repeats)
+                finally:
+                    current_submission.reset(token)
+                
+                adjustment = sum(apply_weights(profile, reference[profile.program], weights) for profile in profiles)
+                score, max_score = scores.get(submission_folder.name, (None, None))
+                row = [submission_folder.name, round(score, 2) if score is not None else '']
+                for profile in profiles:
+                    row += [profile.complexity or 'failed', f"{profile.throughput:.1f}" if profile.throughput else '',
+                            f"{profile.adjustment:+g}"]
+                row += [f"{adjustment:+g}",
+                        round(adjusted_score(score, adjustment, max_score), 2) if score is not None else '',
+                        '; '.join(profile.failure for profile in profiles if profile.failure)]
+                writer.writerow(row)
+                print(f"  {submission_folder.name}: " +
+                      ", ".join(f"{p.program} {p.complexity or 'failed'}" for p in profiles) + f" ({adjustment:+g})")
+        
+        print(f"Performance report generated: {output_path}")
+        return output_path
     
-    def generate_csv_report(self, results: List[Dict], output_file: str = "grading_results_strict.csv"):
-        """Generate detailed CSV report with strict scoring breakdown"""
-        if not results:
+    def profile_submission(self, submission_folder: Path, makefile_commands: Dict[str, str],
+                           program_file: Optional[Path], by_program: Dict[str, list],
+                           timeout: float, repeats: int) -> list:
+        """Profile one (staged) submission on every scaled program"""
+        def run(input_path: Path) -> Tuple[str, str, int]:
+            if program_file is None:
+                return "", "No program file found", -1
+            return self.dispatch(lambda: self.execute_program(submission_folder, makefile_commands, program_file,
+                                                              input_path, "run", timeout))[:3]
+        
+        def check(variant, stdout: str, stderr: str, return_code: int) -> str:
+            if self.is_runtime_error(stderr, return_code):
+                return (stderr.strip().splitlines() or [f"RC:{return_code}"])[-1][:80]
+            if not self.compare_outputs_strict(stdout, variant.expected)[0]:
+                return "wrong output"
+            return ''
+        
+        return [profile_program(program, variants, run, check, repeats) for program, variants in by_program.items()]
+    
+    def open_store(self, resume: bool = False):
+        """
+        Open the results store (reusing an open connection) and register a new grading run
+        With resume, the latest run for this workspace and label is continued if there is one
+        """
+        if self.store is None:
+            self.store = ResultsStore(str(self.results_db))
+        if resume:
+            self.run_id = self.store.find_run(self.workspace_path, self.run_label)
+            if self.run_id is not None:
+                return
+        self.run_id = self.store.begin_run(self.workspace_path, self.suite.names, self.points_per_mode,
+                                           grader_version=__version__, label=self.run_label)
+    
+    def open_archive(self):
+        """Start archiving the current run (see run_archive)"""
+        manifest = {'grader_version': __version__, 'run_id': self.run_id, 'label': self.run_label,
+                    'workspace': str(self.workspace_path.absolute()), 'python': sys.version.split()[0],
+                    'toolchains': {tool: info['version'] if info else None
+                                   for tool, info in self.toolchains.capabilities.items()},
+                    'normalization': self.suite.normalization, 'suite': suite_hashes(self.suite)}
+        self.archive = RunArchiveWriter(self.workspace_path / "archives" / f"run_{self.run_id}.zip", manifest)
+    
+    def close_archive(self):
+        archive, self.archive = self.archive, None
+        path = archive.close()
+        self.storage.track(path, 'run_archive')
+        print(f"Run archived in {path} ({format_size(path.stat().st_size)} for "
+              f"{format_size(archive.raw_bytes)} of raw output)")
+    
+    def record_result(self, result: SubmissionResult):
+        """Persist one graded submission to the results store, if open"""
+        if self.store is not None and self.run_id is not None:
+            self.store.record_submission(self.run_id, result)
+    
+    def generate_csv_report(self, results: Iterable[SubmissionResult], output_file: str = "grading_results_strict.csv"):
+        """
+        Generate detailed CSV report with strict scoring breakdown
+        Results are consumed one at a time, so a store iterator can be passed directly
+        """
+        results = iter(results)
+        first = next(results, None)
+        if first is None:
             print("No results to generate report!")
             return
             
@@ -997,13 +1944,13 @@ class RPALGrader:
         ]
         
         # Add individual test case columns with strict 1/3 breakdown
-        for test_case in self.test_cases.keys():
-            test_name = test_case.replace("input.txt", "").replace(".txt", "")
+        for case in self.suite:
+            test_name = case.name
             fieldnames.extend([
-                f"{test_name}_run_{self.points_per_mode:.1f}",
-                f"{test_name}_ast_{self.points_per_mode:.1f}",
-                f"{test_name}_st_{self.points_per_mode:.1f}",
-                f"{test_name}_total_14",
+                f"{test_name}_run_{case.points_per_mode:.1f}",
+                f"{test_name}_ast_{case.points_per_mode:.1f}",
+                f"{test_name}_st_{case.points_per_mode:.1f}",
+                f"{test_name}_total_{case.points:g}",
                 f"{test_name}_run_error",
                 f"{test_name}_ast_error",
                 f"{test_name}_st_error"
@@ -1017,57 +1964,123 @@ class RPALGrader:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
             
-            for result in results:
+            for result in itertools.chain([first], results):
                 row = {
-                    'Submission': result['submission'],
-                    'Has_Makefile': result.get('has_makefile', 'Unknown'),
-                    'Has_Program_File': result.get('has_program_file', 'Unknown'),
-                    'Execution_Method': result.get('execution_method', 'Unknown'),
-                    'Makefile_Location': result.get('makefile_location', 'N/A'),
-                    'Program_File_Location': result.get('program_file_location', 'N/A'),
-                    'Algorithm_Score_70': f"{result['algorithm_score']:.1f}",
-                    'Comments_Score_10': result['comments_score'],
-                    'Report_Score_20': result['report_score'],
-                    'Total_Score_100': f"{result['total_score']:.1f}",
-                    'Percentage': f"{result['total_score']:.1f}%"
+                    'Submission': result.submission,
+                    'Has_Makefile': result.has_makefile,
+                    'Has_Program_File': result.has_program_file,
+                    'Execution_Method': result.execution_method,
+                    'Makefile_Location': result.makefile_location,
+                    'Program_File_Location': result.program_file_location,
+                    'Algorithm_Score_70': f"{result.algorithm_score:.1f}",
+                    'Comments_Score_10': result.comments_score,
+                    'Report_Score_20': result.report_score,
+                    'Total_Score_100': f"{result.total_score:.1f}",
+                    'Percentage': f"{result.total_score:.1f}%"
                 }
                 
                 # Add test case details with strict breakdown
-                if 'test_results' in result:
-                    for test_case in self.test_cases.keys():
-                        test_name = test_case.replace("input.txt", "").replace(".txt", "")
-                        if test_name in result['test_results']:
-                            test_result = result['test_results'][test_name]
-                            row[f"{test_name}_run_{self.points_per_mode:.1f}"] = test_result['run_score']
-                            row[f"{test_name}_ast_{self.points_per_mode:.1f}"] = test_result['ast_score']
-                            row[f"{test_name}_st_{self.points_per_mode:.1f}"] = test_result['st_score']
-                            row[f"{test_name}_total_14"] = test_result['total']
-                            
-                            # Add error details
-                            if 'errors' in test_result:
-                                row[f"{test_name}_run_error"] = test_result['errors'].get('run', '')
-                                row[f"{test_name}_ast_error"] = test_result['errors'].get('ast', '')
-                                row[f"{test_name}_st_error"] = test_result['errors'].get('st', '')
-                            else:
-                                row[f"{test_name}_run_error"] = ''
-                                row[f"{test_name}_ast_error"] = ''
-                                row[f"{test_name}_st_error"] = ''
-                        else:
-                            row[f"{test_name}_run_{self.points_per_mode:.1f}"] = 0
-                            row[f"{test_name}_ast_{self.points_per_mode:.1f}"] = 0
-                            row[f"{test_name}_st_{self.points_per_mode:.1f}"] = 0
-                            row[f"{test_name}_total_14"] = 0
-                            row[f"{test_name}_run_error"] = 'Not tested'
-                            row[f"{test_name}_ast_error"] = 'Not tested'
-                            row[f"{test_name}_st_error"] = 'Not tested'
+                for case in self.suite:
+                    test_name = case.name
+                    if test_name in result.tests:
+                        test_result = result.tests[test_name]
+                        row[f"{test_name}_run_{case.points_per_mode:.1f}"] = test_result.score('run')
+                        row[f"{test_name}_ast_{case.points_per_mode:.1f}"] = test_result.score('ast')
+                        row[f"{test_name}_st_{case.points_per_mode:.1f}"] = test_result.score('st')
+                        row[f"{test_name}_total_{case.points:g}"] = test_result.total
+                        row[f"{test_name}_run_error"] = test_result.error('run')
+                        row[f"{test_name}_ast_error"] = test_result.error('ast')
+                        row[f"{test_name}_st_error"] = test_result.error('st')
+                    else:
+                        row[f"{test_name}_run_{case.points_per_mode:.1f}"] = 0
+                        row[f"{test_name}_ast_{case.points_per_mode:.1f}"] = 0
+                        row[f"{test_name}_st_{case.points_per_mode:.1f}"] = 0
+                        row[f"{test_name}_total_{case.points:g}"] = 0
+                        row[f"{test_name}_run_error"] = 'Not tested'
+                        row[f"{test_name}_ast_error"] = 'Not tested'
+                        row[f"{test_name}_st_error"] = 'Not tested'
                 
-                row['General_Notes'] = "; ".join(result.get('notes', []))
+                row['General_Notes'] = "; ".join(result.notes)
                 writer.writerow(row)
         
         print(f"\nStrict scoring CSV report generated: {output_path}")
         print("Features: Strict scoring, subfolder search, enhanced error handling")
 
-    def run_grading(self):
+    def generate_expected(self, output_dir: Path, programs_dir: Optional[Path] = None) -> Optional[Path]:
+        """
+        Write expected run/AST/ST outputs produced by the built-in reference engine (rpal_engine)
+        Covers the suite's test inputs, or every file in programs_dir, and writes a manifest.json
+        next to them that --manifest accepts.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if programs_dir is not None:
+            inputs = [(path.stem, path, MODES, 14.0, 30)
+                      for path in sorted(Path(programs_dir).iterdir())
+                      if path.is_file() and path.suffix.lower() not in ('.exe', '.dll')]
+        else:
+            inputs = [(case.name, case.input_path, [m for m in MODES if m in case.modes], case.points, case.timeout)
+                      for case in self.suite]
+        
+        start = time.perf_counter()
+        tests = []
+        for name, input_path, modes, points, timeout in inputs:
+            try:
+                with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    source = f.read()
+                outputs = {mode: rpal_engine.run(source, mode) for mode in modes}
+            except (OSError, rpal_engine.RPALError) as e:
+                logger.warning("Skipping %s: %s", input_path, e)
+                continue
+            expected = {}
+            for mode, output in outputs.items():
+                expected[mode] = f"{name}_{mode}.txt"
+                with open(output_dir / expected[mode], 'w', encoding='utf-8') as f:
+                    f.write(output)
+            tests.append({'name': name, 'input': os.path.relpath(input_path, output_dir), 'modes': list(modes),
+                          'points': points, 'timeout': timeout, 'expected': expected})
+        
+        manifest_path = output_dir / "manifest.json"
+        manifest = {'tests': tests}
+        if self.suite.normalization:
+            manifest['normalization'] = self.suite.normalization
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Generated expected outputs for {len(tests)}/{len(inputs)} programs "
+              f"in {time.perf_counter() - start:.3f}s: {manifest_path}")
+        return manifest_path
+    
+    def manage_storage(self, reindex: bool = False, clean_kinds: Optional[List[str]] = None):
+        """
+        Storage maintenance without grading: optionally adopt existing artifacts into the
+        index, delete whole artifact kinds, enforce the budget and print the usage
+        """
+        if reindex or not self.storage.index_path.exists():
+            print(f"Indexed {self.storage.reindex()} existing artifacts")
+        if clean_kinds:
+            count, freed = self.storage.clean(clean_kinds)
+            print(f"Deleted {count} artifacts ({format_size(freed)}) of kind {', '.join(clean_kinds)}")
+        self.enforce_storage_budget()
+        print(f"Workspace storage ({self.storage.index_path}):")
+        for line in self.storage.describe():
+            print(f"  {line}")
+    
+    def enforce_storage_budget(self):
+        """Evict least recently used artifacts until the workspace fits in --storage-budget"""
+        if self.storage_budget is None:
+            return
+        count, freed = self.storage.evict(self.storage_budget)
+        if count:
+            print(f"Storage budget {format_size(self.storage_budget)}: evicted {count} least recently used "
+                  f"artifacts ({format_size(freed)})")
+    
+    def preflight(self):
+        """Print the toolchains available to submissions on this host"""
+        print(f"Toolchains on {self.toolchains.host}:")
+        for line in self.toolchains.describe():
+            print(f"  {line}")
+    
+    def run_grading(self, require_test_files: bool = False, performance: bool = False):
         """Run the complete grading process with strict requirements"""
         print("Enhanced RPAL Assignment Automated Grading System - Strict Scoring Version")
         print("=" * 80)
@@ -1101,26 +2114,48 @@ class RPALGrader:
             return
         
         # Check test cases
-        missing_files = []
-        for input_file, (output_file, ast_file) in self.test_cases.items():
-            if not (self.test_cases_path / input_file).exists():
-                missing_files.append(input_file)
-            if not (self.test_cases_path / output_file).exists():
-                missing_files.append(output_file)
-            if not (self.test_cases_path / ast_file).exists():
-                missing_files.append(ast_file)
+        try:
+            missing_files = self.suite.missing_files()
+            if self.canary is not None:
+                self.canary_case()
+        except ManifestError as e:
+            print(f"Error: {e}")
+            return
         
         if missing_files:
             print(f"Warning: Missing test case files: {missing_files}")
-            continue_anyway = input("Continue anyway? (y/n): ").lower().startswith('y')
-            if not continue_anyway:
+            if require_test_files:
+                print("Error: Stopping because of missing test case files (--require-test-files)")
                 return
+            print("Continuing; tests with missing files are recorded as such")
+        
+        self.preflight()
+        print("=" * 80)
         
-        # Grade all submissions
-        results = self.grade_all_submissions()
+        # Grade all submissions, streaming each one into the results store
+        self.open_store()
+        if self.archive_runs:
+            self.open_archive()
+        try:
+            self.grade_all_submissions(retain_results=False)
+        except BaseException:
+            if self.archive:
+                self.archive.abort()
+                self.archive = None
+            raise
+        finally:
+            self.entry_points.flush()
+        self.store.finish_run(self.run_id)
+        print(f"\nResults stored in {self.results_db} (run {self.run_id})")
+        if self.archive:
+            self.close_archive()
         
-        # Generate report
-        self.generate_csv_report(results)
+        # Generate report from the store
+        self.generate_csv_report(self.store.iter_results(self.run_id))
+        if performance:
+            self.performance_report()
+        self.enforce_storage_budget()
+        results = list(self.store.iter_results(self.run_id, with_tests=False))
         
         # Print summary
         print("\n" + "=" * 80)
@@ -1129,12 +2164,12 @@ class RPALGrader:
         
         if results:
             total_submissions = len(results)
-            avg_algorithm_score = sum(r['algorithm_score'] for r in results) / total_submissions
+            avg_algorithm_score = sum(r.algorithm_score for r in results) / total_submissions
             
-            makefile_count = sum(1 for r in results if r.get('has_makefile') == 'Yes')
+            makefile_count = sum(1 for r in results if r.has_makefile == 'Yes')
             execution_methods = {}
             for r in results:
-                method = r.get('execution_method', 'Unknown')
+                method = r.execution_method
                 execution_methods[method] = execution_methods.get(method, 0) + 1
             
             print(f"Total Submissions: {total_submissions}")
@@ -1147,7 +2182,7 @@ class RPALGrader:
             # Show score distribution
             score_ranges = {"0-10": 0, "11-20": 0, "21-30": 0, "31-40": 0, "41-50": 0, "51-60": 0, "61-70": 0}
             for result in results:
-                score = result['algorithm_score']
+                score = result.algorithm_score
                 if score <= 10: score_ranges["0-10"] += 1
                 elif score <= 20: score_ranges["11-20"] += 1
                 elif score <= 30: score_ranges["21-30"] += 1
@@ -1161,15 +2196,15 @@ class RPALGrader:
                 print(f"  {range_name}: {count} submissions")
             
             # Show top and bottom performers
-            sorted_results = sorted(results, key=lambda x: x['algorithm_score'], reverse=True)
+            sorted_results = sorted(results, key=lambda x: x.algorithm_score, reverse=True)
             print(f"\nTop 3 Performers:")
             for i, result in enumerate(sorted_results[:3], 1):
-                print(f"  {i}. {result['submission']}: {result['algorithm_score']:.1f}/70")
+                print(f"  {i}. {result.submission}: {result.algorithm_score:.1f}/70")
             
             if len(sorted_results) > 3:
                 print(f"\nNeeds Attention (Bottom 3):")
                 for i, result in enumerate(sorted_results[-3:], 1):
-                    print(f"  {i}. {result['submission']}: {result['algorithm_score']:.1f}/70")
+                    print(f"  {i}. {result.submission}: {result.algorithm_score:.1f}/70")
             
         print(f"\nGrading completed! Check the CSV file for detailed results.")
         print("Remember to manually add Comments (10 pts) and Report (20 pts) scores.")
@@ -1177,16 +2212,163 @@ class RPALGrader:
 
 def main():
     """Main function to run the grader"""
-    if len(sys.argv) > 1:
-        workspace_path = sys.argv[1]
-    else:
+    parser = argparse.ArgumentParser(description="RPAL Assignment Automated Grading System")
+    parser.add_argument('workspace', nargs='?', help="Path to grading_workspace")
+    parser.add_argument('--batch-protocol', action='store_true',
+                        help="Run all inputs through one process per mode for submissions that "
+                             "support `--batch <manifest>`, falling back to per-file execution")
+    parser.add_argument('--results-db', help="SQLite results store (default: <workspace>/grading_results.sqlite3)")
+    parser.add_argument('--run-label', default='', help="Label stored with this grading run, e.g. a semester")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and grade new or changed submissions as they appear")
+    parser.add_argument('--watch-interval', type=float, default=5.0, help="Watch mode poll interval in seconds")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Echo debug details to the console")
+    parser.add_argument('--log-dir', help="Write full debug logs to <log-dir>/<submission>.log")
+    parser.add_argument('--log-output-limit', type=int, default=200,
+                        help="Max characters of program output echoed into logs, 0 for no cap (default: 200)")
+    parser.add_argument('--manifest', help="Test-suite manifest (default: test_cases/manifest.json if present)")
+    parser.add_argument('--tests', help="Comma-separated test names to run, e.g. t9,towers")
+    parser.add_argument('--shard', help="Run only shard INDEX/COUNT of the suite, e.g. 2/4")
+    parser.add_argument('--workers', type=int, default=1, help="Number of submissions graded in parallel")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Adjust concurrency on the fly from system load, free memory and the programs' "
+                             "CPU/RSS, starting at --workers")
+    parser.add_argument('--max-workers', type=int,
+                        help="With --adaptive: concurrency ceiling (default: twice the CPU count)")
+    parser.add_argument('--probe-candidates', type=int, default=3,
+                        help="When a submission has several likely entry points, probe this many with the canary "
+                             "input and keep the best (default: 3; 0 = static ranking only)")
+    parser.add_argument('--resource-retries', type=int, default=4,
+                        help="Retries for runs that fail for lack of resources (EAGAIN, ENOMEM) before they "
+                             "are recorded as resource errors (default: 4)")
+    parser.add_argument('--canary', nargs='?', const='', metavar='TEST',
+                        help="Pre-screen all submissions with one test (default: the first) in run mode, "
+                             "publish grading_results_canary.csv, then grade canary passes first")
+    parser.add_argument('--canary-timeout', type=float, default=5, help="Canary run timeout in seconds (default: 5)")
+    parser.add_argument('--no-stage', action='store_true',
+                        help="Run submissions in place instead of from a private staged copy")
+    parser.add_argument('--stage-dir', help="Where staged submission copies are created "
+                                            "(default: /dev/shm if writable, else the temp folder)")
+    parser.add_argument('--build-jobs', type=int, help="C/C++ units compiled in parallel per build (default: CPU count)")
+    parser.add_argument('--opt-level', default='none', choices=['0', '1', '2', '3', 's', 'fast', 'none'],
+                        help="gcc/g++ optimization level for compiled submissions (default: none, the "
+                             "compiler's own default, as submissions have always been built)")
+    parser.add_argument('--compile-timeout', type=float, default=30,
+                        help="Seconds a Java/C/C++ build may take, separate from test timeouts (default: 30)")
+    parser.add_argument('--java-cds', action='store_true',
+                        help="Speed up Java start-up with an AppCDS archive recorded on each build's first run (JDK 13+)")
+    parser.add_argument('--no-build-cache', action='store_true',
+                        help="Don't share compiled objects across submissions via <workspace>/build_cache")
+    parser.add_argument('--progress', action='store_true',
+                        help="Show a live status line with throughput, in-flight runs, timeouts and ETA")
+    parser.add_argument('--progress-port', type=int,
+                        help="Serve live progress as JSON on http://127.0.0.1:PORT/")
+    parser.add_argument('--clusters', nargs='?', const=0, type=int, metavar='RUN_ID',
+                        help="Cluster the outputs recorded by a run (default: the latest) per test and mode "
+                             "into grading_results_clusters.csv")
+    parser.add_argument('--cluster-threshold', type=float, default=0.8,
+                        help="Minimum similarity (0-1) for merging near-identical outputs (default: 0.8)")
+    parser.add_argument('--feedback', nargs='?', const=0, type=int, metavar='RUN_ID',
+                        help="Render per-student HTML/Markdown feedback reports for a recorded run "
+                             "(default: latest for this workspace and label) into <workspace>/feedback")
+    parser.add_argument('--feedback-format', choices=['html', 'md', 'both'], default='both',
+                        help="Feedback report format (default: both)")
+    parser.add_argument('--storage', action='store_true',
+                        help="Run storage maintenance (index, clean, budget) and print usage instead of grading")
+    parser.add_argument('--storage-budget', type=parse_size, metavar='SIZE',
+                        help="Disk budget for workspace artifacts, e.g. 2G; least recently used builds, archives, "
+                             "reports and generated inputs are evicted after grading (or with --storage)")
+    parser.add_argument('--storage-clean', metavar='KINDS',
+                        help="With --storage: delete every artifact of these comma-separated kinds "
+                             "(archive, build, blob, report, generated, run_archive)")
+    parser.add_argument('--storage-reindex', action='store_true',
+                        help="With --storage: index artifacts already in the workspace (one full walk)")
+    parser.add_argument('--preflight', action='store_true',
+                        help="Only probe and print the toolchains available on this host")
+    parser.add_argument('--generate-expected', metavar='DIR',
+                        help="Write reference-engine expected outputs and a manifest to DIR, then exit")
+    parser.add_argument('--programs', metavar='DIR',
+                        help="With --generate-expected: use every RPAL program in DIR instead of the suite inputs")
+    parser.add_argument('--performance', action='store_true',
+                        help="Also run the performance tier: scaled programs, metered CPU time and complexity class "
+                             "per submission (grading_results_performance.csv)")
+    parser.add_argument('--require-test-files', action='store_true',
+                        help="Stop instead of continuing when test case files are missing")
+    parser.add_argument('--hook', action='append', default=[], metavar='MODULE:OBJECT',
+                        help="Subscribe an event consumer (object or class with on_submission_start, "
+                             "on_run_complete, on_submission_graded and/or on_batch_done); repeatable")
+    parser.add_argument('--events-jsonl', help="Stream grading events as JSON lines to this file")
+    parser.add_argument('--archive', action='store_true',
+                        help="Archive the run's raw outputs, timings and suite hashes as one compressed bundle "
+                             "(<workspace>/archives/run_<id>.zip, see run_archive.py)")
+    parser.add_argument('--keep-outputs', action='store_true',
+                        help="Retain raw stdout/stderr of every run (also recorded in the store for --rescore)")
+    parser.add_argument('--rescore', nargs='?', const=0, type=int, metavar='RUN_ID',
+                        help="Re-score the outputs recorded by a run (default: the latest for this workspace "
+                             "and label) against the current expected files, without running submissions")
+    parser.add_argument('--spill-threshold', type=int, default=64 * 1024,
+                        help="Retained outputs larger than this many bytes are spilled to disk (default: 65536)")
+    args = parser.parse_args()
+    
+    workspace_path = args.workspace
+    if workspace_path is None:
         workspace_path = input("Enter path to grading_workspace (or press Enter for current directory): ").strip()
         if not workspace_path:
             workspace_path = "."
     
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ManifestError as e:
+        parser.error(str(e))
+    
+    listener = setup_logging(args.verbose, Path(args.log_dir) if args.log_dir else None)
+    
     # Initialize and run grader
-    grader = RPALGrader(workspace_path)
-    grader.run_grading()
+    grader = RPALGrader(workspace_path, batch_protocol=args.batch_protocol,
+                        results_db=args.results_db, run_label=args.run_label,
+                        keep_outputs=args.keep_outputs, spill_threshold=args.spill_threshold,
+                        log_output_limit=args.log_output_limit, manifest_path=args.manifest,
+                        tests=args.tests.split(',') if args.tests else None, shard=shard,
+                        workers=args.workers, canary=args.canary, canary_timeout=args.canary_timeout,
+                        stage=not args.no_stage, stage_root=args.stage_dir,
+                        build_cache=not args.no_build_cache, build_jobs=args.build_jobs,
+                        opt_level=None if args.opt_level == 'none' else args.opt_level,
+                        compile_timeout=args.compile_timeout,
+                        java_cds=args.java_cds, show_progress=args.progress,
+                        progress_port=args.progress_port, storage_budget=args.storage_budget,
+                        adaptive=args.adaptive, max_workers=args.max_workers,
+                        resource_retries=args.resource_retries, probe_candidates=args.probe_candidates,
+                        archive=args.archive)
+    try:
+        for spec in args.hook:
+            grader.events.subscribe(load_subscriber(spec))
+        if args.events_jsonl:
+            grader.events.subscribe(JsonLinesSink(Path(args.events_jsonl)))
+        if args.rescore is not None:
+            grader.rescore(args.rescore or None)
+        elif args.clusters is not None:
+            grader.cluster_report(args.clusters or None, args.cluster_threshold)
+        elif args.feedback is not None:
+            grader.feedback_reports(args.feedback or None,
+                                    FEEDBACK_FORMATS if args.feedback_format == 'both' else (args.feedback_format,),
+                                    args.workers if args.workers > 1 else None)
+        elif args.generate_expected:
+            grader.generate_expected(Path(args.generate_expected), Path(args.programs) if args.programs else None)
+        elif args.storage or args.storage_clean or args.storage_reindex:
+            grader.manage_storage(args.storage_reindex, args.storage_clean.split(',') if args.storage_clean else None)
+        elif args.preflight:
+            grader.preflight()
+        elif args.watch:
+            grader.watch(args.watch_interval)
+        else:
+            grader.run_grading(require_test_files=args.require_test_files, performance=args.performance)
+    finally:
+        grader.events.close()
+        grader.storage.close()
+        if listener:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
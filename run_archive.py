@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Grading-run archives for the RPAL grader
+Every run can be archived as one zip bundle (<workspace>/archives/run_<id>.zip)
+holding exactly what each program printed, for appeals long after the
+workspace has been cleaned:
+
+    manifest.json           grader version, run id and label, toolchain versions,
+                            normalization rules, SHA-256 of every suite file
+    students/<name>.json    scores, error classes, timings and return codes per
+                            (test, mode), with the stdout/stderr content hashes
+    blobs/<digest>          raw outputs (first 24 hex digits of their SHA-256),
+                            stored once however many runs printed them
+
+Members are compressed individually (LZMA for large ones, deflate for small
+ones, whose LZMA headers would cost more than they save), so the zip central
+directory is the index: one student's record and outputs are read without
+touching the rest. Outputs are staged on disk while the run is graded and the bundle is
+assembled at the end in sorted order with fixed timestamps, so the same
+run always yields the same bytes.
+
+    python3 run_archive.py <archive> [student [--test T] [--mode M]]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import lzma  # noqa: F401 - zipfile needs it for ZIP_LZMA
+    LARGE_COMPRESSION = zipfile.ZIP_LZMA
+except ImportError:
+    LARGE_COMPRESSION = zipfile.ZIP_DEFLATED
+
+ARCHIVE_FORMAT = 1
+
+# Members from this many bytes on use LZMA; below it deflate, and tiny ones are stored
+LZMA_THRESHOLD = 16 * 1024
+STORE_THRESHOLD = 64
+
+# Hex digits of the SHA-256 naming a blob (96 bits; collisions are not a concern within a run)
+DIGEST_LENGTH = 24
+
+# Fixed member timestamp (the earliest a zip can hold) for reproducible bundles
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def file_digest(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def suite_hashes(suite) -> Dict:
+    """SHA-256 of the manifest and of every input and expected-output file of a TestSuite"""
+    cases = []
+    for case in suite:
+        cases.append({'name': case.name, 'modes': list(case.modes), 'points': case.points, 'timeout': case.timeout,
+                      'input': file_digest(case.input_path),
+                      'expected': {mode: file_digest(case.expected_path(mode)) if case.expected_path(mode) else None
+                                   for mode in case.modes}})
+    manifest = suite.manifest_path
+    return {'manifest': file_digest(manifest) if manifest and manifest.exists() else None, 'cases': cases}
+
+
+def _write(bundle: zipfile.ZipFile, name: str, data: bytes):
+    info = zipfile.ZipInfo(name, date_time=_ZIP_EPOCH)
+    info.external_attr = 0o644 << 16
+    if len(data) < STORE_THRESHOLD:
+        info.compress_type = zipfile.ZIP_STORED
+    elif len(data) < LZMA_THRESHOLD:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    else:
+        info.compress_type = LARGE_COMPRESSION
+    bundle.writestr(info, data, compresslevel=9 if info.compress_type == zipfile.ZIP_DEFLATED else None)
+
+
+class RunArchiveWriter:
+    def __init__(self, path: Path, manifest: Dict):
+        """
+        Args:
+            path: Zip file to create when the run is closed
+            manifest: Run metadata written as manifest.json (see suite_hashes for the suite part)
+        """
+        self.path = Path(path)
+        self.manifest = manifest
+        self.staging = self.path.with_name(f".{self.path.stem}.staging")
+        self.blob_dir = self.staging / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.raw_bytes = 0
+        self._pending: Dict[str, Dict[Tuple[str, str], Tuple[str, str]]] = {}
+        self._records: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _blob(self, text: str) -> str:
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        blob_path = self.blob_dir / digest
+        if not blob_path.exists():
+            tmp_path = blob_path.with_suffix(f'.tmp{threading.get_ident()}')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+        with self._lock:
+            self.raw_bytes += len(data)
+        return digest
+
+    def add_output(self, submission: str, test: str, mode: str, stdout: str, stderr: str):
+        """Stage one run's raw outputs until its submission's record is added"""
+        hashes = (self._blob(stdout), self._blob(stderr))
+        with self._lock:
+            self._pending.setdefault(submission, {})[(test, mode)] = hashes
+
+    def add_submission(self, result):
+        """Record a graded SubmissionResult together with the outputs staged for it"""
+        with self._lock:
+            outputs = self._pending.pop(result.submission, {})
+        tests = {}
+        for test_name, test in result.tests.items():
+            tests[test_name] = {}
+            for mode, mode_result in test.modes.items():
+                stdout, stderr = outputs.get((test_name, mode), (None, None))
+                run = {'score': round(mode_result.score, 4), 'error_class': mode_result.error_class,
+                       'error': mode_result.error, 'return_code': mode_result.return_code,
+                       'stdout': stdout, 'stderr': stderr,
+                       'similarity': None if mode_result.similarity is None else round(mode_result.similarity, 4),
+                       'duration': None if mode_result.duration is None else round(mode_result.duration, 4)}
+                # Unset fields are left out; records are most of a bundle's size
+                tests[test_name][mode] = {key: value for key, value in run.items() if value not in (None, '')}
+        record = {'submission': result.submission, 'algorithm_score': result.algorithm_score,
+                  'max_algorithm_score': result.max_algorithm_score, 'execution_method': result.execution_method,
+                  'program_file': result.program_file_location, 'makefile': result.makefile_location,
+                  'notes': result.notes, 'tests': tests}
+        data = json.dumps(record, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        with self._lock:
+            self._records[result.submission] = data
+
+    def close(self) -> Path:
+        """Assemble the bundle, drop the staging folder and return the archive path"""
+        blobs = sorted(os.listdir(self.blob_dir))
+        manifest = dict(self.manifest, format=ARCHIVE_FORMAT, submissions=len(self._records),
+                        blobs=len(blobs), raw_output_bytes=self.raw_bytes)
+        tmp_path = self.path.with_suffix(f'.tmp{os.getpid()}')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(tmp_path, 'w') as bundle:
+            _write(bundle, 'manifest.json', json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+            for name in sorted(self._records):
+                _write(bundle, f'students/{name}.json', self._records[name])
+            for digest in blobs:
+                _write(bundle, f'blobs/{digest}', (self.blob_dir / digest).read_bytes())
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(self.staging, ignore_errors=True)
+        return self.path
+
+    def abort(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+class RunArchive:
+    """Read side of a run bundle; every lookup reads only the members it needs"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.zip = zipfile.ZipFile(self.path)
+        self.manifest = json.loads(self.zip.read('manifest.json'))
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self) -> 'RunArchive':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def students(self) -> List[str]:
+        return sorted(name[len('students/'):-len('.json')] for name in self.zip.namelist()
+                      if name.startswith('students/'))
+
+    def record(self, student: str) -> Dict:
+        try:
+            return json.loads(self.zip.read(f'students/{student}.json'))
+        except KeyError:
+            raise KeyError(f"No record for '{student}' in {self.path}") from None
+
+    def output(self, digest: Optional[str]) -> Optional[str]:
+        """Text of one stored output, None for runs without captured output"""
+        if digest is None:
+            return None
+        return self.zip.read(f'blobs/{digest}').decode('utf-8')
+
+    def outputs(self, student: str, test: str, mode: str) -> Tuple[Optional[str], Optional[str]]:
+        """(stdout, stderr) a student's program printed for one test and mode"""
+        run = self.record(student)['tests'][test][mode]
+        return self.output(run.get('stdout')), self.output(run.get('stderr'))
+
+    def changed_suite_files(self, suite) -> List[str]:
+        """Suite files whose content differs from the archived run's (for re-running it faithfully)"""
+        archived = {case['name']: case for case in self.manifest['suite']['cases']}
+        changed = []
+        for case in suite_hashes(suite)['cases']:
+            before = archived.get(case['name'])
+            if before is None:
+                changed.append(f"{case['name']}: not in the archived suite")
+                continue
+            if before['input'] != case['input']:
+                changed.append(f"{case['name']}: input")
+            changed += [f"{case['name']}: expected {mode}" for mode, digest in case['expected'].items()
+                        if before['expected'].get(mode) != digest]
+        return changed
+
+    def stored_bytes(self) -> int:
+        return self.path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect an archived RPAL grading run")
+    parser.add_argument('archive', help="run_<id>.zip bundle")
+    parser.add_argument('student', nargs='?', help="Show this student's record")
+    parser.add_argument('--test', help="With a student: print the raw outputs of this test")
+    parser.add_argument('--mode', default='run', help="With --test: mode (default: run)")
+    args = parser.parse_args()
+
+    with RunArchive(Path(args.archive)) as archive:
+        if args.student is None:
+            manifest = archive.manifest
+            print(f"Run {manifest.get('run_id')} ({manifest.get('label') or 'no label'}), "
+                  f"grader {manifest.get('grader_version')}, {manifest['submissions']} submissions")
+            print(f"{manifest['blobs']} distinct outputs, {manifest['raw_output_bytes']} raw bytes "
+                  f"stored in {archive.stored_bytes()}")
+            for student in archive.students():
+                print(f"  {student}")
+        elif args.test:
+            stdout, stderr = archive.outputs(args.student, args.test, args.mode)
+            sys.stdout.write(stdout or '')
+            if stderr:
+                sys.stderr.write(stderr)
+        else:
+            print(json.dumps(archive.record(args.student), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
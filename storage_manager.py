@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Workspace storage manager for the RPAL grader
+Artifacts the grader leaves in a workspace (submission .zip archives, build cache
+entries, spilled output blobs, feedback reports, generated inputs, grading-run
+archives) are
+recorded in an index (<workspace>/storage_index.sqlite3) with their size and
+last access time as they are created or reused. A disk budget is enforced by
+evicting the least recently used artifacts of the evictable kinds, deleted
+in parallel; clean-up works from the index and never walks the submissions
+tree. Only reindex() walks the workspace, to adopt artifacts created before
+the index existed (or by older versions of the grader).
+
+    python3 storage_manager.py <workspace> [--reindex] [--clean archive] [--budget 2G]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+KINDS = ('archive', 'build', 'blob', 'report', 'generated', 'run_archive')
+
+# Submission archives are students' original uploads, spilled blobs back recorded outputs
+# (rescore, clusters, feedback) and run archives are kept for appeals, so they are only
+# evicted when asked for explicitly
+DEFAULT_EVICTABLE = ('build', 'report', 'generated')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_access ON artifacts (last_access);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts (kind);
+"""
+
+_SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(spec: str) -> int:
+    """Bytes in a size like 500M, 2G or 1.5T (binary units; a trailing B is optional)"""
+    text = spec.strip().upper().rstrip('B')
+    unit = text[-1] if text and text[-1] in 'KMGT' else ''
+    try:
+        return int(float(text[:len(text) - len(unit)]) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size '{spec}' (expected e.g. 500M, 2G)")
+
+
+def format_size(size: int) -> str:
+    for unit in ('', 'K', 'M', 'G'):
+        if size < 1024:
+            return f"{size:.0f}{unit}B" if not unit else f"{size:.1f}{unit}B"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def path_size(path: Path) -> int:
+    """Bytes used by a file, or by everything under a folder"""
+    try:
+        if not path.is_dir() or path.is_symlink():
+            return path.lstat().st_size
+    except OSError:
+        return 0
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def _check_kinds(kinds: Sequence[str]):
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown artifact kinds: {sorted(unknown)} (available: {', '.join(KINDS)})")
+
+
+def _remove(path: str) -> bool:
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError:
+        return False
+
+
+class StorageManager:
+    def __init__(self, workspace: Path, index_path: Optional[Path] = None, workers: int = 8):
+        """
+        Args:
+            workspace: Grading workspace the artifacts live in
+            index_path: SQLite index (default: <workspace>/storage_index.sqlite3), opened on first use
+            workers: Threads used for deletion
+        """
+        self.workspace = Path(workspace)
+        self.index_path = Path(index_path) if index_path else self.workspace / "storage_index.sqlite3"
+        self.workers = max(1, workers)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._touched: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self.lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def track(self, path: Path, kind: str):
+        """Record (or refresh) an artifact that was just created"""
+        _check_kinds([kind])
+        conn = self.conn
+        with self.lock, conn:
+            conn.execute("INSERT OR REPLACE INTO artifacts (path, kind, size, last_access) VALUES (?, ?, ?, ?)",
+                         (str(Path(path).absolute()), kind, path_size(Path(path)), time.time()))
+
+    def touch(self, path: Path):
+        """Mark an artifact as used; batched, so cache hits stay cheap"""
+        with self.lock:
+            self._touched[str(Path(path).absolute())] = time.time()
+            pending = len(self._touched)
+        if pending >= 256:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn = self.conn
+            with self.lock, conn:
+                conn.executemany("UPDATE artifacts SET last_access = ? WHERE path = ?",
+                                 [(at, path) for path, at in touched.items()])
+
+    def forget(self, paths: Iterable[str]):
+        conn = self.conn
+        with self.lock, conn:
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in paths])
+
+    def usage(self) -> Dict[str, Tuple[int, int]]:
+        """kind -> (artifact count, bytes)"""
+        self.flush()
+        rows = self.conn.execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts GROUP BY kind")
+        return {kind: (count, size) for kind, count, size in rows}
+
+    def total_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def delete(self, rows: Sequence[Tuple[str, int]]) -> Tuple[int, int]:
+        """Delete (path, size) artifacts in parallel and drop them from the index; returns (count, bytes)"""
+        if not rows:
+            return 0, 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(rows))) as pool:
+            removed = list(pool.map(_remove, [path for path, _ in rows]))
+        deleted = [(path, size) for (path, size), ok in zip(rows, removed) if ok]
+        self.forget(path for path, _ in deleted)
+        return len(deleted), sum(size for _, size in deleted)
+
+    def evict(self, budget: int, kinds: Sequence[str] = DEFAULT_EVICTABLE) -> Tuple[int, int]:
+        """
+        Delete least recently used artifacts of `kinds` until the indexed total fits in budget
+        Returns (artifacts deleted, bytes freed)
+        """
+        _check_kinds(kinds)
+        self.flush()
+        excess = self.total_size() - budget
+        if excess <= 0:
+            return 0, 0
+        victims = []
+        cursor = self.conn.execute(
+            f"SELECT path, size FROM artifacts WHERE kind IN ({','.join('?' * len(kinds))}) ORDER BY last_access",
+            tuple(kinds))
+        for path, size in cursor:
+            victims.append((path, size))
+            excess -= size
+            if excess <= 0:
+                break
+        cursor.close()
+        return self.delete(victims)
+
+    def clean(self, kinds: Sequence[str]) -> Tuple[int, int]:
+        """Delete every artifact of `kinds`; returns (artifacts deleted, bytes freed)"""
+        _check_kinds(kinds)
+        rows = self.conn.execute(f"SELECT path, size FROM artifacts WHERE kind IN ({','.join('?' * len(kinds))})",
+                                 tuple(kinds)).fetchall()
+        return self.delete(rows)
+
+    def reindex(self) -> int:
+        """
+        Adopt existing artifacts and forget vanished ones (the one full walk of the workspace)
+        Returns the number of artifacts indexed
+        """
+        found: List[Tuple[Path, str]] = []
+        for cache_dir, kind in (("build_cache", 'build'), ("output_blobs", 'blob')):
+            root = self.workspace / cache_dir
+            if root.is_dir():
+                found += [(entry, kind) for shard in root.iterdir() if shard.is_dir() for entry in shard.iterdir()]
+        for folder, kind in (("feedback", 'report'), ("performance_inputs", 'generated')):
+            if (self.workspace / folder).is_dir():
+                found.append((self.workspace / folder, kind))
+        if (self.workspace / "archives").is_dir():
+            found += [(path, 'run_archive') for path in (self.workspace / "archives").glob("run_*.zip")]
+        submissions = self.workspace / "submissions"
+        if submissions.is_dir():
+            for root, _, files in os.walk(submissions):
+                found += [(Path(root) / name, 'archive') for name in files if name.endswith('.zip')]
+
+        known = {row[0]: row[1] for row in self.conn.execute("SELECT path, last_access FROM artifacts")}
+        now = time.time()
+        records = []
+        for path, kind in found:
+            key = str(path.absolute())
+            try:
+                last_access = known.pop(key, None) or path.stat().st_atime
+            except OSError:
+                continue
+            records.append((key, kind, path_size(path), min(last_access, now)))
+        conn = self.conn
+        with self.lock, conn:
+            conn.executemany("INSERT OR REPLACE INTO artifacts (path, kind, size, last_access) VALUES (?, ?, ?, ?)",
+                             records)
+            # Whatever is left in `known` is gone or no longer an artifact location
+            conn.executemany("DELETE FROM artifacts WHERE path = ?",
+                             [(path,) for path in known if not os.path.exists(path)])
+        return len(records)
+
+    def describe(self) -> List[str]:
+        usage = self.usage()
+        lines = [f"{kind}: {usage[kind][0]} artifact(s), {format_size(usage[kind][1])}" for kind in KINDS if kind in usage]
+        lines.append(f"total: {format_size(sum(size for _, size in usage.values()))}")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the RPAL grader's workspace storage")
+    parser.add_argument('workspace', help="Path to grading_workspace")
+    parser.add_argument('--reindex', action='store_true', help="Index artifacts already in the workspace first")
+    parser.add_argument('--clean', help=f"Comma-separated kinds to delete entirely ({', '.join(KINDS)})")
+    parser.add_argument('--budget', help="Evict least recently used artifacts until the total fits, e.g. 2G")
+    parser.add_argument('--evict-kinds', default=','.join(DEFAULT_EVICTABLE),
+                        help=f"Kinds the budget may evict (default: {','.join(DEFAULT_EVICTABLE)})")
+    args = parser.parse_args()
+
+    manager = StorageManager(Path(args.workspace))
+    try:
+        if args.reindex or not manager.index_path.exists():
+            print(f"Indexed {manager.reindex()} artifacts")
+        if args.clean:
+            count, freed = manager.clean(args.clean.split(','))
+            print(f"Deleted {count} artifacts ({format_size(freed)})")
+        if args.budget:
+            count, freed = manager.evict(parse_size(args.budget), args.evict_kinds.split(','))
+            print(f"Evicted {count} artifacts ({format_size(freed)})")
+        for line in manager.describe():
+            print(f"  {line}")
+    finally:
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
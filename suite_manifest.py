@@ -0,0 +1,236 @@
+"""
+Test-suite manifests for the RPAL grader
+A manifest (JSON, or TOML on Python 3.11+) lists the test cases with their
+modes, points, timeouts and expected-output files. Without one the grader
+uses the built-in five-test suite. Suites are loaded lazily and can be
+narrowed by name or split into shards.
+
+Example test_cases/manifest.json:
+
+    {
+      "defaults": {"points": 14, "timeout": 30, "modes": ["run", "ast", "st"]},
+      "tests": [
+        {"name": "t9", "input": "t9input.txt",
+         "expected": {"run": "t9inputfinaloutput.txt", "ast": "t9inputast.txt"}},
+        {"name": "towers", "input": "towersinput.txt", "timeout": 60,
+         "expected": {"run": "towerfinaloutput.txt", "ast": "towerast.txt"}}
+      ]
+    }
+
+Paths are relative to the manifest's folder. A mode without its own
+expected file reuses the AST expectation for "st", as the grader always has.
+An optional top-level "normalization" object overrides the output
+normalization rules (see output_normalizer.DEFAULT_RULES), and an optional
+"performance" object configures the performance tier (see performance_tier).
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAMES = ('manifest.json', 'manifest.toml')
+
+# The original hard-coded suite: name -> (input, expected run output, expected AST)
+DEFAULT_TESTS = [
+    ("t9", "t9input.txt", "t9inputfinaloutput.txt", "t9inputast.txt"),
+    ("t2", "t2input.txt", "t2inputfinaloutput.txt", "t2inputast.txt"),
+    ("wsum1", "wsum1input.txt", "wsum1inputfinaloutput.txt", "wsum1inputast.txt"),
+    ("vectorsum", "vectorsumintput.txt", "vectorsumintputfinaloutput.txt", "vectorsumintputast.txt"),
+    ("towers", "towersinput.txt", "towerfinaloutput.txt", "towerast.txt"),
+]
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class TestCaseSpec:
+    """One test case: an input program and the expected output per mode"""
+    __slots__ = ('name', 'input_path', 'expected', 'modes', 'points', 'timeout')
+    __test__ = False  # not a pytest class
+
+    def __init__(self, name: str, input_path: Path, expected: Dict[str, Path],
+                 modes: Tuple[str, ...] = ('run', 'ast', 'st'), points: float = 14.0, timeout: float = 30):
+        self.name = name
+        self.input_path = input_path
+        self.expected = expected
+        self.modes = modes
+        self.points = points
+        self.timeout = timeout
+
+    @property
+    def points_per_mode(self) -> float:
+        return self.points / len(self.modes) if self.modes else 0.0
+
+    def expected_path(self, mode: str) -> Optional[Path]:
+        """Expected-output file for a mode; ST falls back to the AST expectation"""
+        if mode in self.expected:
+            return self.expected[mode]
+        if mode == 'st':
+            return self.expected.get('ast')
+        return None
+
+    def files(self) -> List[Path]:
+        return [self.input_path] + list(self.expected.values())
+
+
+class TestSuite:
+    __test__ = False  # not a pytest class
+
+    def __init__(self, test_cases_path: Path, manifest_path: Optional[Path] = None,
+                 cases: Optional[List[TestCaseSpec]] = None):
+        """
+        Args:
+            test_cases_path: Folder holding the test inputs and expected outputs
+            manifest_path: Manifest file; None uses test_cases/manifest.{json,toml} if present,
+                           otherwise the built-in suite
+            cases: Pre-built cases (used by select/shard); skips loading
+        """
+        self.test_cases_path = Path(test_cases_path)
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self._cases = cases
+        self._normalization: Dict = {}
+        self._performance: Dict = {}
+        self._expected_cache: Dict[Path, str] = {}
+
+    @property
+    def cases(self) -> List[TestCaseSpec]:
+        if self._cases is None:
+            self._cases = self._load()
+        return self._cases
+
+    def __iter__(self):
+        return iter(self.cases)
+
+    def __len__(self):
+        return len(self.cases)
+
+    @property
+    def normalization(self) -> Dict:
+        """The manifest's "normalization" rule overrides (empty for the defaults)"""
+        self.cases
+        return self._normalization
+
+    @property
+    def performance(self) -> Dict:
+        """The manifest's "performance" tier settings (empty for the defaults)"""
+        self.cases
+        return self._performance
+
+    @property
+    def names(self) -> List[str]:
+        return [case.name for case in self.cases]
+
+    @property
+    def total_points(self) -> float:
+        return sum(case.points for case in self.cases)
+
+    def _load(self) -> List[TestCaseSpec]:
+        manifest_path = self.manifest_path
+        if manifest_path is None:
+            for name in MANIFEST_NAMES:
+                if (self.test_cases_path / name).exists():
+                    manifest_path = self.test_cases_path / name
+                    break
+        if manifest_path is None:
+            return [
+                TestCaseSpec(name, self.test_cases_path / input_file,
+                             {'run': self.test_cases_path / run_file, 'ast': self.test_cases_path / ast_file})
+                for name, input_file, run_file, ast_file in DEFAULT_TESTS
+            ]
+        return self._parse(manifest_path)
+
+    def _parse(self, manifest_path: Path) -> List[TestCaseSpec]:
+        try:
+            if manifest_path.suffix == '.toml':
+                try:
+                    import tomllib
+                except ImportError:
+                    raise ManifestError("TOML manifests need Python 3.11+; use manifest.json instead")
+                with open(manifest_path, 'rb') as f:
+                    data = tomllib.load(f)
+            else:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ManifestError(f"Cannot read manifest {manifest_path}: {e}")
+
+        base = manifest_path.parent
+        defaults = data.get('defaults', {})
+        self._normalization = data.get('normalization', {})
+        self._performance = data.get('performance', {})
+        cases = []
+        seen = set()
+        for i, entry in enumerate(data.get('tests', [])):
+            if 'input' not in entry:
+                raise ManifestError(f"Test #{i + 1} in {manifest_path} has no 'input'")
+            name = entry.get('name') or Path(entry['input']).stem
+            if name in seen:
+                raise ManifestError(f"Duplicate test name '{name}' in {manifest_path}")
+            seen.add(name)
+            modes = tuple(entry.get('modes', defaults.get('modes', ('run', 'ast', 'st'))))
+            unknown = set(modes) - {'run', 'ast', 'st'}
+            if unknown:
+                raise ManifestError(f"Test '{name}' has unknown modes: {sorted(unknown)}")
+            cases.append(TestCaseSpec(
+                name,
+                base / entry['input'],
+                {mode: base / path for mode, path in entry.get('expected', {}).items()},
+                modes=modes,
+                points=float(entry.get('points', defaults.get('points', 14.0))),
+                timeout=float(entry.get('timeout', defaults.get('timeout', 30)))
+            ))
+        if not cases:
+            raise ManifestError(f"Manifest {manifest_path} defines no tests")
+        return cases
+
+    def _derive(self, cases: List[TestCaseSpec]) -> 'TestSuite':
+        suite = TestSuite(self.test_cases_path, self.manifest_path, cases)
+        suite._normalization = self._normalization
+        suite._performance = self._performance
+        suite._expected_cache = self._expected_cache
+        return suite
+
+    def select(self, names: List[str]) -> 'TestSuite':
+        """Keep only the named tests, in suite order"""
+        unknown = set(names) - set(self.names)
+        if unknown:
+            raise ManifestError(f"Unknown tests: {', '.join(sorted(unknown))} (available: {', '.join(self.names)})")
+        return self._derive([case for case in self.cases if case.name in names])
+
+    def shard(self, index: int, count: int) -> 'TestSuite':
+        """Round-robin shard `index` (1-based) of `count`"""
+        if count < 1 or not 1 <= index <= count:
+            raise ManifestError(f"Invalid shard {index}/{count}")
+        return self._derive(self.cases[index - 1::count])
+
+    def expected_output(self, case: TestCaseSpec, mode: str) -> Optional[str]:
+        """Expected output text for a mode, read once and cached"""
+        path = case.expected_path(mode)
+        if path is None or not path.exists():
+            return None
+        text = self._expected_cache.get(path)
+        if text is None:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                text = self._expected_cache[path] = f.read()
+        return text
+
+    def missing_files(self) -> List[str]:
+        missing = []
+        for case in self.cases:
+            for path in case.files():
+                if not path.exists():
+                    try:
+                        missing.append(str(path.relative_to(self.test_cases_path)))
+                    except ValueError:
+                        missing.append(str(path))
+        return missing
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse a "2/4" shard spec"""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ManifestError(f"Shard must look like INDEX/COUNT, got '{spec}'")
+    return index, count
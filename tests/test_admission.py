@@ -0,0 +1,118 @@
+"""Resource-failure detection and the admission controller's limit adjustments"""
+
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from admission import AdmissionController, is_resource_failure  # noqa: E402
+
+GB = 1 << 30
+
+
+@pytest.mark.parametrize('stderr', [
+    "BlockingIOError: [Errno 11] Resource temporarily unavailable",
+    "OSError: [Errno 12] Cannot allocate memory",
+    "OSError: [Errno 24] Too many open files",
+    "OSError: [Errno 23] Too many open files in system",
+    "bash: fork: retry: Resource temporarily unavailable",
+    "java.lang.OutOfMemoryError: unable to create new native thread",
+    "Error occurred during initialization of VM\nCould not reserve enough space for object heap",
+    "There is insufficient memory for the Java Runtime Environment to continue.",
+])
+def test_resource_failures(stderr):
+    assert is_resource_failure(stderr, 1)
+
+
+@pytest.mark.parametrize('stderr', [
+    "Traceback (most recent call last):\nZeroDivisionError: division by zero",
+    "RecursionError: maximum recursion depth exceeded",
+    "[Errno 2] No such file or directory: 'input.txt'",
+    "Exception in thread \"main\" java.lang.OutOfMemoryError: Java heap space",
+    "",
+])
+def test_program_failures(stderr):
+    assert not is_resource_failure(stderr, 1)
+
+
+@pytest.mark.parametrize('return_code', [-9, 137])
+def test_sigkill_counts_only_under_pressure(return_code):
+    assert not is_resource_failure('', return_code)
+    assert is_resource_failure('', return_code, under_pressure=True)
+    assert not is_resource_failure('', -15, under_pressure=True)
+
+
+def sample(load=0.0, free=8 * GB, children=0, cores=0.0, rss=0):
+    return {'load': load, 'free_memory': free, 'children': children, 'child_cores': cores, 'child_rss': rss}
+
+
+@pytest.fixture
+def controller():
+    controller = AdmissionController(8, 16, min_free_memory=GB)
+    controller.cpus = 4
+    return controller
+
+
+def saturate(controller: AdmissionController, stack: ExitStack):
+    for _ in range(controller.limit):
+        stack.enter_context(controller.slot())
+
+
+def test_low_memory_cuts_a_quarter(controller):
+    controller.adjust(sample(free=GB // 2))
+    assert controller.limit == 6
+    assert controller.under_pressure()
+
+
+def test_high_load_cuts_a_quarter(controller):
+    controller.adjust(sample(load=4 * 1.25 + 1))
+    assert controller.limit == 6
+    assert controller.under_pressure()
+
+
+def test_cuts_stop_at_the_floor():
+    controller = AdmissionController(2, 16, min_limit=2, min_free_memory=GB)
+    controller.adjust(sample(free=0))
+    assert controller.limit == 2
+
+
+def test_saturated_with_headroom_grows_by_one(controller):
+    with ExitStack() as stack:
+        saturate(controller, stack)
+        controller.adjust(sample(children=8, cores=1.0, rss=8 * (64 << 20)))
+    assert controller.limit == 9
+    assert controller.peak_limit == 9
+    assert not controller.under_pressure()
+
+
+def test_saturated_without_spare_cpu_or_memory_holds(controller):
+    with ExitStack() as stack:
+        saturate(controller, stack)
+        controller.adjust(sample(children=8, cores=3.9))
+        assert controller.limit == 8
+        # An extra child of the current average size (512 MB) would leave less than 1 GB free
+        controller.adjust(sample(free=GB + (256 << 20), children=8, cores=1.0, rss=8 * (512 << 20)))
+    assert controller.limit == 8
+
+
+def test_idle_slots_hold(controller):
+    controller.adjust(sample())
+    assert controller.limit == 8
+
+
+def test_growth_stops_at_the_ceiling():
+    controller = AdmissionController(2, 2, min_free_memory=GB)
+    with ExitStack() as stack:
+        saturate(controller, stack)
+        controller.adjust(sample())
+    assert controller.limit == 2
+
+
+def test_resource_failure_halves(controller):
+    controller.resource_failure()
+    assert controller.limit == 4
+    assert controller.resource_failures == 1
+    assert controller.under_pressure()
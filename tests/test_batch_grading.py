@@ -0,0 +1,58 @@
+"""Two workspaces graded on one batch: shared pool, caches and admission, separate reports and runs"""
+
+import csv
+import shutil
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_grading import BatchGrader  # noqa: E402
+
+SUBMISSION = """import sys
+print("abcdefghijklmnopqrstuvwxyz" if len(sys.argv) == 2 else "let")
+"""
+
+
+def make_workspace(path: Path, students) -> Path:
+    shutil.copytree(ROOT / "test_cases", path / "test_cases")
+    for student in students:
+        (path / "submissions" / student).mkdir(parents=True)
+        (path / "submissions" / student / "myrpal.py").write_text(SUBMISSION)
+    return path
+
+
+def test_two_workspaces_share_one_batch(tmp_path):
+    first = make_workspace(tmp_path / "sec1", ["ana", "ben"])
+    second = make_workspace(tmp_path / "sec2", ["cy"])
+    batch = BatchGrader([{'path': str(first), 'tests': ['t9']}, {'path': str(second), 'tests': ['t9', 't2']}],
+                        tmp_path / "shared", workers=2)
+    slots = []
+    slot = batch.admission.slot
+
+    def counting_slot():
+        slots.append(1)
+        return slot()
+
+    batch.admission.slot = counting_slot
+    try:
+        graders = [entry.grader for entry in batch.entries]
+        for name in ('storage', 'builder', 'blobs', 'toolchains', 'entry_points', 'admission'):
+            assert getattr(graders[0], name) is getattr(graders[1], name) is getattr(batch, name)
+
+        batch.run()
+
+        # One run and one AST launch per test and submission (st reuses the AST), all through the shared controller
+        assert len(slots) == 2 * 2 + 1 * 4
+        for grader, students, tests in ((graders[0], ['ana', 'ben'], ['t9']), (graders[1], ['cy'], ['t9', 't2'])):
+            with open(grader.workspace_path / "grading_results_strict.csv", newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            assert [row['Submission'] for row in rows] == students
+            results = list(grader.store.iter_results(grader.run_id))
+            assert sorted(r.submission for r in results) == students
+            assert all(sorted(r.tests) == sorted(tests) for r in results)
+            assert all(r.tests['t9'].modes['run'].score > 0 for r in results)
+        assert graders[0].results_db != graders[1].results_db
+    finally:
+        batch.close()
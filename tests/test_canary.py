@@ -0,0 +1,41 @@
+"""An unknown --canary test name is reported before any grading run is opened"""
+
+import shutil
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_grading import BatchGrader  # noqa: E402
+from rpal_grader import RPALGrader  # noqa: E402
+
+
+def make_workspace(path: Path) -> Path:
+    shutil.copytree(ROOT / "test_cases", path / "test_cases")
+    (path / "submissions" / "dana").mkdir(parents=True)
+    (path / "submissions" / "dana" / "myrpal.py").write_text("print('x')\n")
+    return path
+
+
+def test_unknown_canary_stops_before_the_store(tmp_path, capsys):
+    workspace = make_workspace(tmp_path / "ws")
+    grader = RPALGrader(str(workspace), canary='nope')
+    try:
+        grader.run_grading()
+    finally:
+        grader.storage.close()
+    assert "Error: Unknown canary test 'nope'" in capsys.readouterr().out
+    assert grader.store is None
+    assert not (workspace / "grading_results.sqlite3").exists()
+
+
+def test_unknown_canary_skips_the_batch_workspace(tmp_path, capsys):
+    workspace = make_workspace(tmp_path / "ws")
+    batch = BatchGrader([{'path': str(workspace)}], tmp_path / "shared", grader_options={'canary': 'nope'})
+    try:
+        assert batch.prepare() == []
+    finally:
+        batch.close()
+    assert "Skipped: Unknown canary test 'nope'" in capsys.readouterr().out
+    assert batch.entries[0].grader.store is None
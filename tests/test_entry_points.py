@@ -0,0 +1,71 @@
+"""Entry-point probing inside a staged submission"""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from rpal_grader import RPALGrader, current_workspace  # noqa: E402
+
+PROGRAM = """#include <stdio.h>
+int main(int argc, char **argv) {
+    if (argc < 2) return 1;
+    puts("%s");
+    return 0;
+}
+"""
+
+
+@pytest.fixture
+def grader(tmp_path):
+    shutil.copytree(ROOT / "test_cases", tmp_path / "test_cases")
+    submission = tmp_path / "submissions" / "dana"
+    submission.mkdir(parents=True)
+    (submission / "interp.c").write_text(PROGRAM % "abcdefghijklmnopqrstuvwxyz")
+    (submission / "scratch_main.c").write_text(PROGRAM % "wrong")
+    grader = RPALGrader(str(tmp_path), tests=['t9'], stage_root=str(tmp_path / "stage"), build_cache=False)
+    yield grader
+    grader.storage.close()
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="needs gcc")
+def test_probes_build_in_the_staged_workspace_once(grader):
+    builds = []
+    build = grader.builder.build
+
+    def recording_build(program_file, output_dir, timeout):
+        builds.append((program_file.name, output_dir))
+        return build(program_file, output_dir, timeout)
+
+    grader.builder.build = recording_build
+    with grader.staged(grader.submissions_path / "dana") as folder:
+        workspace = current_workspace.get()
+        notes = []
+        chosen = grader.choose_entry_point(folder, sorted(folder.glob('*.c')), notes)
+        assert chosen.name == 'interp.c'
+        assert 'probe' in notes[0]
+        assert sorted(name for name, _ in builds) == ['interp.c', 'scratch_main.c']
+        assert all(output_dir == workspace.scratch for _, output_dir in builds)
+
+        # Grading the winner reuses the probe's build
+        target, _ = grader.build_program(chosen)
+        assert target is not None
+        assert len(builds) == 2
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="needs gcc")
+def test_static_pick_does_not_stand_in_for_a_probe(grader):
+    folder = grader.submissions_path / "dana"
+    files = sorted(folder.glob('*.c'))
+    notes = []
+    grader.choose_entry_point(folder, files, notes, probe=False)
+    assert 'static' in notes[0]
+    notes = []
+    with grader.staged(folder) as staged:
+        chosen = grader.choose_entry_point(staged, sorted(staged.glob('*.c')), notes)
+    assert chosen.name == 'interp.c'
+    assert 'probe' in notes[0]
@@ -0,0 +1,55 @@
+"""A full event queue drops progress events but never terminal ones"""
+
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from grading_events import EventBus  # noqa: E402
+
+
+class SlowConsumer:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.runs = 0
+        self.graded = []
+        self.done = []
+
+    def on_run_complete(self, submission, test, mode, mode_result):
+        self.gate.wait()
+        self.runs += 1
+
+    def on_submission_graded(self, result):
+        self.graded.append(result)
+
+    def on_batch_done(self, graded, run_id):
+        self.done.append((graded, run_id))
+
+
+def test_terminal_events_survive_a_full_queue():
+    bus = EventBus(max_queued=4)
+    consumer = SlowConsumer()
+    bus.subscribe(consumer)
+
+    def grade():
+        for submission in range(10):
+            for run in range(20):
+                bus.emit('on_run_complete', submission, 't9', 'run', None)
+            bus.emit('on_submission_graded', submission)
+        bus.emit('on_batch_done', 10, 1)
+
+    grader = threading.Thread(target=grade)
+    grader.start()
+    # The consumer is stuck, so the grader fills the queue and then waits on the first terminal event
+    grader.join(timeout=0.5)
+    assert grader.is_alive()
+    consumer.gate.set()
+    grader.join(timeout=10)
+    assert not grader.is_alive()
+    bus.close()
+
+    assert consumer.graded == list(range(10))
+    assert consumer.done == [(10, 1)]
+    assert bus.dropped > 0
+    assert consumer.runs + bus.dropped == 200
@@ -0,0 +1,87 @@
+"""fit_growth on timings of known complexity, with start-up offsets and measurement noise"""
+
+import math
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from performance_tier import (CLASS_DEGREE, DEFAULT_WEIGHTS, SUPER_POLYNOMIAL, ProgramProfile,  # noqa: E402
+                              adjusted_score, apply_weights, fit_growth)
+
+SIZES = (25, 50, 100, 200)
+STARTUP = 0.05
+
+
+def timings(work, startup=STARTUP, jitter=0.03, seed=0, sizes=SIZES):
+    """(size, seconds) for a program doing work(n) seconds after a fixed start-up, with relative noise"""
+    rng = random.Random(seed)
+    return [(n, (startup + work(n)) * (1 + rng.uniform(-jitter, jitter))) for n in sizes]
+
+
+# Noisy timings can't always tell a log factor apart, so these check the polynomial degree (what scoring uses)
+@pytest.mark.parametrize('work, degree', [
+    (lambda n: 0.0, 0),
+    (lambda n: 0.05 * math.log(n), 0),
+    (lambda n: 0.001 * n, 1),
+    (lambda n: 2e-4 * n * math.log(n), 1),
+    (lambda n: 2e-5 * n * n, 2),
+    (lambda n: 1e-7 * n ** 3, 3),
+], ids=['constant', 'log', 'linear', 'n-log-n', 'quadratic', 'cubic'])
+@pytest.mark.parametrize('startup, jitter', [(STARTUP, 0.03), (0.5, 0.01)], ids=['interpreter', 'jvm'])
+@pytest.mark.parametrize('seed', range(20))
+def test_noisy_timings_with_startup(work, degree, startup, jitter, seed):
+    assert CLASS_DEGREE[fit_growth(timings(work, startup, jitter, seed))] == degree
+
+
+def test_constant_and_linear_are_not_logarithmic():
+    for seed in range(20):
+        assert fit_growth(timings(lambda n: 0.0, 0.5, 0.03, seed)) == 'O(1)'
+    assert fit_growth(timings(lambda n: 0.001 * n, seed=1)) == 'O(n)'
+
+
+def test_exact_counts():
+    assert fit_growth([(n, 7.0) for n in SIZES], noise=0) == 'O(1)'
+    assert fit_growth([(n, 100 + 3 * math.log(n)) for n in SIZES], noise=0) == 'O(log n)'
+    assert fit_growth([(n, 100 + 3 * n) for n in SIZES], noise=0) == 'O(n)'
+    assert fit_growth([(n, 100 + 3 * n * math.log(n)) for n in SIZES], noise=0) == 'O(n log n)'
+    assert fit_growth([(n, 100 + 3 * n * n) for n in SIZES], noise=0) == 'O(n^2)'
+
+
+def test_exponential_is_super_polynomial():
+    assert fit_growth(timings(lambda n: 1e-3 * 2 ** n, sizes=(6, 8, 10, 12), jitter=0)) == SUPER_POLYNOMIAL
+
+
+def test_too_few_points():
+    assert fit_growth([(10, 1.0)]) == ''
+
+
+def profile(complexity='', failure=''):
+    result = ProgramProfile('towers')
+    result.complexity = complexity
+    result.failure = failure
+    return result
+
+
+@pytest.mark.parametrize('complexity, adjustment', [
+    ('O(1)', DEFAULT_WEIGHTS['bonus']),
+    ('O(n)', 0.0),
+    ('O(n log n)', 0.0),
+    ('O(n^2)', DEFAULT_WEIGHTS['penalty']),
+    ('O(n^3)', 2 * DEFAULT_WEIGHTS['penalty']),
+])
+def test_weights_against_a_linear_reference(complexity, adjustment):
+    assert apply_weights(profile(complexity), 'O(n)', DEFAULT_WEIGHTS) == adjustment
+
+
+def test_failure_weight():
+    assert apply_weights(profile(failure="towers 12: timeout"), 'O(n)', DEFAULT_WEIGHTS) == DEFAULT_WEIGHTS['failure']
+
+
+def test_adjusted_score_stays_within_the_points():
+    assert adjusted_score(70.0, 3.0, 70) == 70.0
+    assert adjusted_score(1.0, -4.0, 70) == 0.0
+    assert adjusted_score(50.0, -2.0, 70) == 48.0
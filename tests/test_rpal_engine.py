@@ -0,0 +1,29 @@
+"""The reference engine against the bundled expected outputs, up to trailing whitespace"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import rpal_engine  # noqa: E402
+from suite_manifest import TestSuite  # noqa: E402
+
+SUITE = TestSuite(ROOT / "test_cases")
+
+
+def lines(text: str):
+    """Lines without trailing whitespace or trailing blank lines (the bundled files vary in both)"""
+    return [line.rstrip() for line in text.rstrip().splitlines()]
+
+
+@pytest.mark.parametrize('mode', ['run', 'ast'])
+@pytest.mark.parametrize('case', SUITE.cases, ids=lambda case: case.name)
+def test_matches_bundled_expected(case, mode):
+    expected = SUITE.expected_output(case, mode)
+    if expected is None:
+        pytest.skip(f"no bundled {mode} output for {case.name}")
+    source = case.input_path.read_text(encoding='utf-8')
+    assert lines(rpal_engine.run(source, mode)) == lines(expected)
@@ -0,0 +1,56 @@
+"""Run archives: the same run yields the same bytes, and one student's outputs read back alone"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from grading_records import ModeResult, SubmissionResult, TestResult  # noqa: E402
+from run_archive import RunArchive, RunArchiveWriter  # noqa: E402
+
+MANIFEST = {'grader_version': 'test', 'run_id': 7, 'label': 'fall'}
+# Large enough to be stored with LZMA
+TOWERS = ''.join(f"Move {i % 3} to {(i + 1) % 3}\n" for i in range(4000))
+
+OUTPUTS = {
+    'ana': {('t9', 'run'): ("abcdefghijklmnopqrstuvwxyz\n", ''), ('towers', 'run'): (TOWERS, '')},
+    'ben': {('t9', 'run'): ('', "Traceback (most recent call last):\n  boom\n"), ('towers', 'run'): (TOWERS, '')},
+}
+
+
+def archive_run(path: Path, order) -> Path:
+    writer = RunArchiveWriter(path, MANIFEST)
+    for student in order:
+        result = SubmissionResult(student, algorithm_score=4.67, execution_method='Direct Python',
+                                  program_file_location='myrpal.py')
+        for (test, mode), (stdout, stderr) in OUTPUTS[student].items():
+            writer.add_output(student, test, mode, stdout, stderr)
+            result.tests.setdefault(test, TestResult(test)).modes[mode] = ModeResult(
+                score=4.67 if not stderr else 0, error_class='pass' if not stderr else 'runtime_error',
+                return_code=0 if not stderr else 1, duration=0.25)
+        writer.add_submission(result)
+    return writer.close()
+
+
+def test_same_run_same_bytes(tmp_path):
+    first = archive_run(tmp_path / "a" / "run_7.zip", ['ana', 'ben'])
+    # Grading order differs between runs with several workers
+    second = archive_run(tmp_path / "b" / "run_7.zip", ['ben', 'ana'])
+    assert first.read_bytes() == second.read_bytes()
+    assert not (tmp_path / "a" / ".run_7.staging").exists()
+
+
+def test_reads_one_student_back(tmp_path):
+    path = archive_run(tmp_path / "run_7.zip", ['ana', 'ben'])
+    with RunArchive(path) as archive:
+        assert archive.students() == ['ana', 'ben']
+        assert archive.manifest['submissions'] == 2
+        # Identical outputs are stored once
+        assert archive.manifest['blobs'] == 4
+        assert archive.outputs('ana', 't9', 'run') == ("abcdefghijklmnopqrstuvwxyz\n", '')
+        assert archive.outputs('ben', 'towers', 'run') == (TOWERS, '')
+        record = archive.record('ben')
+        assert record['tests']['t9']['run']['error_class'] == 'runtime_error'
+        assert archive.output(record['tests']['t9']['run']['stderr']).endswith("boom\n")
+    assert path.stat().st_size < len(TOWERS)
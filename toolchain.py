@@ -0,0 +1,140 @@
+"""
+Toolchain preflight for the RPAL grader
+Probes the interpreters and compilers submissions need (python3, make, javac,
+java, gcc, g++) once, and caches the capability map per host in the
+workspace. Cached entries are revalidated by the tool's resolved path and
+modification time, so version probes only rerun when a toolchain changes.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+TOOLS = ('python3', 'make', 'javac', 'java', 'gcc', 'g++')
+
+# JVM flags of AppCDS runs (see RPALGrader.run_java_with_cds); JVMs older than 13 reject
+# -XX:ArchiveClassesAtExit and JDK 8 rejects -Xlog
+CDS_FLAGS = ('-Xshare:auto', '-Xlog:disable')
+
+# Tools the direct (non-Makefile) runner needs, by program file suffix
+RUNNER_TOOLS = {
+    '.py': ('python3',),
+    '.java': ('javac', 'java'),
+    '.cpp': ('g++',),
+    '.cxx': ('g++',),
+    '.cc': ('g++',),
+    '.c': ('gcc',),
+}
+
+
+def probe_tool(tool: str, timeout: float = 30) -> Optional[Dict]:
+    """Resolved path, mtime and version line of a tool, or None if it isn't usable"""
+    path = shutil.which(tool)
+    if path is None:
+        return None
+    try:
+        result = subprocess.run([path, '-version' if tool in ('java', 'javac') else '--version'],
+                                capture_output=True, text=True, timeout=timeout, errors='ignore')
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    # java/javac print their version on stderr
+    output = (result.stdout.strip() or result.stderr.strip()).splitlines()
+    entry = {'path': path, 'mtime_ns': os.stat(path).st_mtime_ns, 'version': output[0] if output else ''}
+    if tool == 'java':
+        entry['cds'] = probe_cds(path, timeout)
+    return entry
+
+
+def probe_cds(java_path: str, timeout: float = 30) -> bool:
+    """Whether this JVM starts with the AppCDS flags, dynamic archiving included"""
+    with tempfile.TemporaryDirectory() as tmp:
+        flags = list(CDS_FLAGS) + [f'-XX:ArchiveClassesAtExit={os.path.join(tmp, "probe.jsa")}']
+        try:
+            result = subprocess.run([java_path] + flags + ['-version'], capture_output=True, text=True,
+                                    timeout=timeout, errors='ignore')
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+    return result.returncode == 0
+
+
+class Toolchains:
+    def __init__(self, cache_path: Optional[Path] = None, tools=TOOLS):
+        """
+        Args:
+            cache_path: JSON file holding the capability map of each host (None = don't cache)
+            tools: Tools to probe
+        """
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.tools = tuple(tools)
+        self.host = socket.gethostname()
+        self._capabilities: Optional[Dict[str, Optional[Dict]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def capabilities(self) -> Dict[str, Optional[Dict]]:
+        """tool -> {'path', 'mtime_ns', 'version'} or None, probed on first use (by one thread)"""
+        if self._capabilities is None:
+            with self._lock:
+                if self._capabilities is None:
+                    self._capabilities = self.probe()
+        return self._capabilities
+
+    def _is_current(self, entry: Optional[Dict], tool: str) -> bool:
+        path = shutil.which(tool)
+        if entry is None:
+            return path is None
+        if tool == 'java' and 'cds' not in entry:
+            # Cached before CDS support was probed
+            return False
+        try:
+            return path == entry['path'] and os.stat(path).st_mtime_ns == entry['mtime_ns']
+        except (OSError, TypeError):
+            return False
+
+    def probe(self) -> Dict[str, Optional[Dict]]:
+        """Capability map, reusing this host's cached entries that are still current"""
+        hosts = {}
+        if self.cache_path and self.cache_path.exists():
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    hosts = json.load(f)
+            except (OSError, ValueError):
+                hosts = {}
+        cached = hosts.get(self.host, {})
+
+        capabilities = {tool: cached[tool] for tool in self.tools
+                        if tool in cached and self._is_current(cached[tool], tool)}
+        stale = [tool for tool in self.tools if tool not in capabilities]
+        if stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                capabilities.update(zip(stale, pool.map(probe_tool, stale)))
+            if self.cache_path:
+                hosts[self.host] = capabilities
+                tmp_path = self.cache_path.with_suffix(f'.tmp{os.getpid()}_{threading.get_ident()}')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(hosts, f, indent=2)
+                os.replace(tmp_path, self.cache_path)
+        return capabilities
+
+    def available(self, tool: str) -> bool:
+        return self.capabilities.get(tool) is not None
+
+    def java_cds(self) -> bool:
+        """Whether java accepts the AppCDS flags (probed once per JVM)"""
+        entry = self.capabilities.get('java')
+        return bool(entry and entry.get('cds'))
+
+    def missing_for(self, program_file: Path) -> List[str]:
+        """Tools the direct runner for program_file needs but this host lacks"""
+        return [tool for tool in RUNNER_TOOLS.get(program_file.suffix, ()) if not self.available(tool)]
+
+    def describe(self) -> List[str]:
+        return [f"{tool}: {entry['version'] or entry['path']}" if entry else f"{tool}: NOT FOUND"
+                for tool, entry in ((tool, self.capabilities.get(tool)) for tool in self.tools)]